@@ -58,6 +58,12 @@
 
 const char *program_name;
 #define MAXPATTERNSIZE 4096
+#define GRAM_BITS 24
+#define GRAM_ARRAY_SIZE (1<<GRAM_BITS)
+/* mkindex reads the 3-gram of the last two suffixes past the end of T, so buckets may be off by two */
+#define GRAM_SLACK 2
+
+static int has_gram = 0;	/*<< whether the 3-gram table follows the suffix array in the index file */
 
 saidx_t _get_saidx(FILE *SAF, saidx_t idx)
 {
@@ -67,6 +73,50 @@ saidx_t _get_saidx(FILE *SAF, saidx_t idx)
 	return value;
 }
 
+saidx_t _get_gram(FILE *SAF, LFS_OFF_T n, saidx_t g)
+{
+	saidx_t value;
+	LFS_FSEEK(SAF, (n + g) * (LFS_OFF_T)sizeof(value), SEEK_SET);
+	fread(&value, sizeof(saidx_t), 1, SAF);
+	return value;
+}
+
+/**
+ * @brief Find the suffix array range holding every suffix whose first 3 bytes agree
+ * with the determined bits of P, using the 3-gram table written by mkindex
+ *
+ * The bits left undetermined by P or mask span a contiguous run of 3-gram buckets.
+ */
+void _gram_range(file_list raw_files, FILE *SAF, const sauchar_t *P, saidx_t Psize, sauchar_t mask,
+		saidx_t *start, saidx_t *count)
+{
+	saidx_t b, lo, hi, end;
+	sauchar_t m, c;
+
+	if (!has_gram || Psize <= 0) {
+		*start = 0;
+		*count = raw_files->total_len;
+		return;
+	}
+
+	for (b = 0, lo = 0, hi = 0; b < 3; b++) {
+		if (b < Psize) {
+			m = (b == Psize - 1) ? mask : 0xFF;
+			c = P[b] & m;
+			lo = (lo << 8) | c;
+			hi = (hi << 8) | c | (~m & 0xFF);
+		} else {
+			lo = lo << 8;
+			hi = (hi << 8) | 0xFF;
+		}
+	}
+
+	*start = MAX(0, _get_gram(SAF, raw_files->total_len, lo) - GRAM_SLACK);
+	end = (hi + 1 < GRAM_ARRAY_SIZE) ? _get_gram(SAF, raw_files->total_len, hi + 1) + GRAM_SLACK : raw_files->total_len;
+	end = MIN(end, raw_files->total_len);
+	*count = MAX(0, end - *start);
+}
+
 int compare_saidx(const void *p1, const void *p2)
 {
 	saidx_t s1, s2;
@@ -285,9 +335,10 @@ index_array _joint_array(index_array array1, index_array array2, saidx_t maximum
 }
 
 
-/* Search for the pattern P in the FILE TF and SAF. */
+/* Search for the pattern P in the FILE TF and SAF, within SA[SAstart, SAstart+SAcount). */
 saidx_t
-sa_search_filelist(file_list raw_files, const sauchar_t *P, saidx_t Psize, FILE *SAF, saidx_t *idx)
+sa_search_filelist(file_list raw_files, const sauchar_t *P, saidx_t Psize, FILE *SAF,
+		saidx_t SAstart, saidx_t SAcount, saidx_t *idx)
 {
 	saidx_t size, lsize, rsize, half;
 	saidx_t match, lmatch, rmatch;
@@ -298,9 +349,9 @@ sa_search_filelist(file_list raw_files, const sauchar_t *P, saidx_t Psize, FILE
 	if(idx != NULL) { *idx = -1; }
 	if((raw_files == NULL) || (P == NULL) || (SAF == NULL) || (Psize < 0) || (Psize > MAXPATTERNSIZE) ) { return -1; }
 	if(raw_files->total_len == 0) { return 0; }
-	if(Psize == 0) { if(idx != NULL) { *idx = 0; } return raw_files->total_len; }
+	if(Psize == 0) { if(idx != NULL) { *idx = SAstart; } return SAcount; }
 
-	for(i = j = k = 0, lmatch = rmatch = 0, size = raw_files->total_len, half = size >> 1;
+	for(i = j = k = SAstart, lmatch = rmatch = 0, size = SAcount, half = size >> 1;
 			0 < size;
 			size = half, half >>= 1) {
 		match = MIN(lmatch, rmatch);
@@ -417,20 +468,22 @@ sa_bitsearch_bytemask(file_list raw_files, FILE *SAF, saidx_t SAstart, saidx_t S
 saidx_t
 sa_search_filelist_mask(file_list raw_files, const sauchar_t *P, saidx_t Psize, sauchar_t mask, FILE *SAF, saidx_t *idx)
 {
-	saidx_t count;
+	saidx_t count, start;
 
 	if (Psize == 0) {
 		*idx = 0;
 		return raw_files->total_len;
 	}
 
+	/* Only the 3-gram bucket of P needs to be binary searched */
+	_gram_range(raw_files, SAF, P, Psize, mask, &start, &count);
+
 	if (mask != 0xFF) {
 		/* search for file without the last byte */
 		if (Psize == 1) {
-			*idx = 0;
-			count = raw_files->total_len;
+			*idx = start;
 		} else {
-			count = sa_search_filelist(raw_files, P, Psize - 1, SAF, idx);
+			count = sa_search_filelist(raw_files, P, Psize - 1, SAF, start, count, idx);
 			if (count <= 0) {
 				return count;
 			}
@@ -440,7 +493,7 @@ sa_search_filelist_mask(file_list raw_files, const sauchar_t *P, saidx_t Psize,
 		count = sa_bitsearch_bytemask(raw_files, SAF, *idx, count, P[Psize-1], mask, Psize-1, idx);
 	} else {
 		/* There is no last byte need masked search, search once to fasten the process */
-		count = sa_search_filelist(raw_files, P, Psize, SAF, idx);
+		count = sa_search_filelist(raw_files, P, Psize, SAF, start, count, idx);
 	}
 	return count;
 }
@@ -776,6 +829,7 @@ main(int argc, const char *argv[]) {
 		if (n_suf < raw_files->total_len * 4){
 			exit_result(2, "index file %s is not correct", index_file);
 		}
+		has_gram = (n_suf >= (raw_files->total_len + GRAM_ARRAY_SIZE) * 4);
 	} else {
 		exit_result(2, "cannot fseek index file %s", index_file);
 	}
@@ -43,6 +43,7 @@ extern "C" {
 #cmakedefine HAVE_STRINGS_H 1
 #cmakedefine HAVE_MEMORY_H 1
 #cmakedefine HAVE_SYS_TYPES_H 1
+#cmakedefine HAVE_SYS_TIME_H 1
 
 /** for WinIO **/
 #cmakedefine HAVE_IO_H 1
@@ -94,10 +94,24 @@ CHANNEL_LAYERS = {
 	},
 }
 
+#Cache, shared by every channel worker
+
+CACHES = {
+	"default": {
+		"BACKEND": "django_redis.cache.RedisCache",
+		"LOCATION": os.environ.get('REDIS_CACHE_URL', 'redis://localhost:6379/1'),
+		"OPTIONS": {
+			"CLIENT_CLASS": "django_redis.client.DefaultClient",
+		},
+	},
+}
+
 #Django-crontab
 
 # CRONJOBS = [
 # 	('0 0 * * *','Server.cron.runDirectoryAnalysisProgram', '>/home/polly/cron_jobs.log'),
+# 	('30 0 * * *','Server.cron.runHistorySearchStatisticProgram', '>/home/polly/cron_jobs.log'),
+# 	('*/10 * * * *','Server.cron.runIndexBuildRecoveryProgram', '>/home/polly/cron_jobs.log'),
 # ]
 
 # Database
@@ -57,6 +57,8 @@ urlpatterns = [
 	url(r'^api_multiIndexSearchStatus/$', se_views.api_multiIndexSearchStatus, name='api_multiIndexSearchStatus'),
 	url(r'^api_initFileContent/$', se_views.api_initFileContent, name='api_initFileContent'),
 	url(r'^api_getBlockContent/$', se_views.api_getBlockContent, name='api_getBlockContent'),
+	url(r'^api_getBlockBytes/$', se_views.api_getBlockBytes, name='api_getBlockBytes'),
+	url(r'^api_getFileMatches/$', se_views.api_getFileMatches, name='api_getFileMatches'),
 	url(r'^api_indexCreate/$', se_views.api_indexCreate, name='api_indexCreate'),
 	url(r'^api_indexCreateStatus/$', se_views.api_indexCreateStatus, name='api_indexCreateStatus'),
 	url(r'^api_getDirectoryBrowserInfo/$', se_views.api_getDirectoryBrowserInfo, name='api_getDirectoryBrowserInfo'),
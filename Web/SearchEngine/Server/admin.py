@@ -1,12 +1,15 @@
 from django.contrib import admin
 
-from models import User, DirectoryInfo, FileInfo, AlgorithmConfigInfo, SearchResultCache, GlobalStaticVarible, NodeInfo
+from models import User, DirectoryInfo, FileInfo, AlgorithmConfigInfo, IndexBuildJob, SearchResultCache, SearchCacheEntry, SearchFileSummary, GlobalStaticVarible, NodeInfo
 # Register your models here.
 
 admin.site.register(User)
 admin.site.register(DirectoryInfo)
 admin.site.register(FileInfo)
 admin.site.register(AlgorithmConfigInfo)
+admin.site.register(IndexBuildJob)
 admin.site.register(SearchResultCache)
+admin.site.register(SearchCacheEntry)
+admin.site.register(SearchFileSummary)
 admin.site.register(GlobalStaticVarible)
 admin.site.register(NodeInfo)
\ No newline at end of file
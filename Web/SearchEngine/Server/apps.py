@@ -1,7 +1,32 @@
 from __future__ import unicode_literals
 
+import os, sys, threading
+
 from django.apps import AppConfig
 
+# Seconds after start before orphaned index builds are resumed, so the server is up first
+RESUME_BUILD_DELAY = 10
+
 
 class ServerConfig(AppConfig):
     name = 'Server'
+
+    def ready(self):
+        # Only the serving processes build indexes, not migrate, test and the other commands;
+        # servers started otherwise, like uwsgi or daphne, run the resumeIndexBuilds command instead
+        if sys.argv[1:2] not in (['runserver'], ['runworker']):
+            return
+        # Nor the autoreloader of runserver, which only restarts the serving child
+        if sys.argv[1]=='runserver' and '--noreload' not in sys.argv and os.environ.get('RUN_MAIN')!='true':
+            return
+        timer = threading.Timer(RESUME_BUILD_DELAY, resumeIndexBuilds)
+        timer.daemon = True
+        timer.start()
+
+
+def resumeIndexBuilds():
+    from Server import plugins
+    try:
+        plugins.runIndexCreateProgram()
+    except Exception, e:
+        print "@@@ INDEX BUILD resume failed--{}, {}".format(Exception, e)
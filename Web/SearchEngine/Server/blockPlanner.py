@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+'''
+Created on 2026-10-18
+
+Packs the files of a directory into index blocks for mkindex.
+
+Files longer than a block and its margin are cut into block-sized pieces that
+overlap the next piece by the margin, so matches across a cut are still found.
+Pieces are placed largest first, each into the least filled block it fits in,
+over as many blocks as the total size needs; this keeps whole files in one
+block and the blocks close to the same size, so parallel mkindex runs end
+together.
+'''
+import heapq, math
+
+# mkindex holds the text (1 byte) and the int32 suffix array (4 bytes) per input byte plus the 2^24 int32 GRAM table
+MKINDEX_BYTES_PER_INPUT = 5
+MKINDEX_GRAM_BYTES = 4<<24
+
+
+def estimateBuildMemory(size):
+	"""Bytes mkindex allocates for a block of size input bytes"""
+	return MKINDEX_BYTES_PER_INPUT*size+MKINDEX_GRAM_BYTES
+
+
+def indexFileSize(size):
+	"""Bytes of the finished index file of a block, the int32 suffix array followed by the GRAM table"""
+	return 4*size+MKINDEX_GRAM_BYTES
+
+
+def splitFile(name, size, block_size, margin):
+	"""
+		[{name, offset, length}, ...] pieces of one file, each at most block_size+margin long
+		A file that fits in one piece is not cut, and no piece starts where the margin of the previous one reaches the end
+	"""
+	pieces = []
+	offset = 0
+	while True:
+		length = min(block_size+margin, size-offset)
+		pieces.append({"name":name, "offset":offset, "length":length})
+		if offset+length>=size:
+			return pieces
+		offset += block_size
+
+
+def planBlocks(files, block_size, margin):
+	"""
+		Packs [(name, size), ...] into blocks of at most block_size+margin bytes
+		Returns the blocks as lists of raw_files, largest block first
+	"""
+	pieces = []
+	for name, size in files:
+		pieces.extend(splitFile(name, size, block_size, margin))
+	if not pieces:
+		return []
+	pieces.sort(key=lambda piece: piece["length"], reverse=True)
+	capacity = block_size+margin
+	num_block = max(1, int(math.ceil(float(sum([piece["length"] for piece in pieces]))/capacity)))
+	blocks = [[] for i in range(num_block)]
+	loads = [(0, i) for i in range(num_block)]
+	for piece in pieces:
+		load, i = loads[0]
+		if load+piece["length"]>capacity:
+			# Not even the least filled block has room left
+			i = len(blocks)
+			blocks.append([])
+			heapq.heappush(loads, (piece["length"], i))
+		else:
+			heapq.heapreplace(loads, (load+piece["length"], i))
+		blocks[i].append(piece)
+	blocks = [block for block in blocks if block]
+	blocks.sort(key=lambda block: sum([piece["length"] for piece in block]), reverse=True)
+	return blocks
+
+
+def describePlan(blocks, block_size, margin):
+	"""Block count, sizes, fill ratio of the block_size+margin capacity and mkindex memory of a plan"""
+	sizes = [sum([piece["length"] for piece in block]) for block in blocks]
+	return {
+		"num_block":len(blocks),
+		"size_total":sum(sizes),
+		"size_max":max(sizes) if sizes else 0,
+		"size_min":min(sizes) if sizes else 0,
+		"fill_ratio":float(sum(sizes))/(len(sizes)*(block_size+margin)) if sizes else 0,
+		"memory_max":estimateBuildMemory(max(sizes)) if sizes else 0,
+		"memory_total":sum([estimateBuildMemory(size) for size in sizes]),
+	}
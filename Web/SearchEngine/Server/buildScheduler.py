@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+'''
+Created on 2026-10-18
+
+Admits index builds against a memory budget.
+
+Every build declares the bytes it will allocate. Queued builds are kept
+largest first; whenever a build is submitted or one ends, the largest queued
+builds that fit in the free memory and the free slots are started, each in its
+own thread waiting on its mkindex process. A build larger than the whole
+budget runs only when nothing else does.
+'''
+import os, threading, time, traceback
+from django.db import connections
+
+
+def physicalMemory():
+	"""Bytes of RAM of this machine, None when unknown"""
+	try:
+		return os.sysconf('SC_PAGE_SIZE')*os.sysconf('SC_PHYS_PAGES')
+	except (ValueError, OSError, AttributeError):
+		return None
+
+
+class BuildJob(object):
+	def __init__(self, name, memory, func, args):
+		self.name = name
+		self.memory = memory
+		self.func = func
+		self.args = args
+		self.time_queued = time.time()
+		self.time_start = None
+
+
+class IndexBuildScheduler(object):
+	def __init__(self, processes, memory_budget):
+		self.processes = processes
+		self.memory_budget = memory_budget
+		self._queue = []
+		self._running = {}
+		self._memory_used = 0
+		self._finished = 0
+		self._failed = []
+		self._cond = threading.Condition()
+
+	def submit(self, name, memory, func, args=()):
+		"""Queues func(*args) needing memory bytes, returns False when a build of name is already queued or running"""
+		with self._cond:
+			if name in self._running or name in [job.name for job in self._queue]:
+				return False
+			self._queue.append(BuildJob(name, memory, func, args))
+			self._queue.sort(key=lambda job: job.memory, reverse=True)
+			self._dispatch()
+			return True
+
+	def _admit(self):
+		"""The largest queued job that fits now, called with the lock held"""
+		if len(self._running)>=self.processes:
+			return None
+		for job in self._queue:
+			if self._memory_used+job.memory<=self.memory_budget or not self._running:
+				self._queue.remove(job)
+				return job
+		return None
+
+	def _dispatch(self):
+		job = self._admit()
+		while job is not None:
+			job.time_start = time.time()
+			self._running[job.name] = job
+			self._memory_used += job.memory
+			thread = threading.Thread(target=self._run, args=(job,), name="IndexBuild-{}".format(job.name))
+			thread.daemon = True
+			thread.start()
+			job = self._admit()
+
+	def _run(self, job):
+		error = None
+		try:
+			result = job.func(*job.args)
+			if isinstance(result, dict) and result.get("code", 0)!=0:
+				error = "{}".format(result.get("message", result))
+				print "@@@ INDEX BUILD failed--{}, {}".format(job.name, error)
+		except Exception:
+			error = traceback.format_exc()
+			print "@@@ INDEX BUILD failed--{}, {}".format(job.name, error)
+		finally:
+			connections.close_all()
+			with self._cond:
+				del self._running[job.name]
+				self._memory_used -= job.memory
+				if error is None:
+					self._finished += 1
+				else:
+					self._failed.append(job.name)
+				self._dispatch()
+				self._cond.notify_all()
+
+	def wait(self, timeout=None):
+		"""Blocks until nothing is queued or running, returns False on timeout"""
+		deadline = None if timeout is None else time.time()+timeout
+		with self._cond:
+			while self._queue or self._running:
+				remaining = None if deadline is None else deadline-time.time()
+				if remaining is not None and remaining<=0:
+					return False
+				self._cond.wait(remaining)
+			return True
+
+	def status(self):
+		with self._cond:
+			now = time.time()
+			return {
+				"processes":self.processes,
+				"memory_budget":self.memory_budget,
+				"memory_used":self._memory_used,
+				"running":[{"name":job.name, "memory":job.memory, "time_cost":now-job.time_start} for job in self._running.values()],
+				"queued":[{"name":job.name, "memory":job.memory} for job in self._queue],
+				"finished":self._finished,
+				"failed":list(self._failed),
+			}
+
+
+_SCHEDULER = None
+_SCHEDULER_LOCK = threading.Lock()
+
+def getIndexBuildScheduler(processes, memory_budget):
+	"""The build scheduler of this server process, created on first use"""
+	global _SCHEDULER
+	with _SCHEDULER_LOCK:
+		if _SCHEDULER is None:
+			_SCHEDULER = IndexBuildScheduler(processes, memory_budget)
+		return _SCHEDULER
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+'''
+Created on 2026-10-18
+
+One HTTP client per server process for the api_* calls to the NodeInfo nodes.
+
+Calls go over a pooled keep-alive requests.Session, each with its own timeout;
+refused connections are retried with backoff, and so are 502/503/504 answers
+of the calls that may run twice. postAll
+asks every node at once from a thread pool, so a round takes as long as the
+slowest node instead of the sum of all nodes, and a node that fails only marks
+its own result.
+'''
+import copy, threading
+from multiprocessing.pool import ThreadPool
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class ClusterClient(object):
+	def __init__(self, timeout, retries, backoff, max_nodes=32, port=80):
+		self.timeout = timeout
+		self.port = port
+		self.max_nodes = max_nodes
+		# A POST the node has read is not sent again, only refused connections are, and gateway errors
+		# for the calls that are safe to repeat; a gateway may have passed the first one on
+		self.session = self._makeSession(retries, backoff, (502, 503, 504))
+		self.once_session = self._makeSession(retries, backoff, ())
+		self._pool = None
+		self._lock = threading.Lock()
+
+	def _makeSession(self, retries, backoff, status_forcelist):
+		session = requests.Session()
+		retry = Retry(total=retries, connect=retries, read=0, status=retries if status_forcelist else 0, backoff_factor=backoff,
+			status_forcelist=status_forcelist, method_whitelist=False, raise_on_status=False)
+		session.mount("http://", HTTPAdapter(pool_connections=self.max_nodes, pool_maxsize=self.max_nodes, max_retries=retry))
+		return session
+
+	def _getPool(self):
+		with self._lock:
+			if self._pool is None:
+				self._pool = ThreadPool(processes=self.max_nodes)
+			return self._pool
+
+	def post(self, node_ip, path, pay_load, default, idempotent=True):
+		"""
+			POST pay_load to path of one node, returns its JSON answer with node_ip added
+			Returns a copy of default with node_error set when the node can not answer
+			A call that is not idempotent is not repeated after a gateway error
+		"""
+		node_url = u"http://{}:{}{}".format(node_ip, self.port, path)
+		session = self.session if idempotent else self.once_session
+		result = None
+		try:
+			r = session.post(node_url, data=pay_load, timeout=self.timeout)
+			if r.status_code==200:
+				result = r.json()
+			else:
+				error = "HTTP {}".format(r.status_code)
+		except (requests.RequestException, ValueError), e:
+			error = "{}".format(e)
+		if result is None:
+			print "@@@ NODE {} failed--{}, {}".format(node_ip, path, error)
+			result = copy.deepcopy(default)
+			result['node_error'] = error
+		result['node_ip'] = node_ip
+		return result
+
+	def postAll(self, node_ips, path, pay_load, default, idempotent=True):
+		"""post to every node in parallel, results in the order of node_ips"""
+		node_ips = list(node_ips)
+		if len(node_ips)<=1:
+			return [self.post(node_ip, path, pay_load, default, idempotent) for node_ip in node_ips]
+		return self._getPool().map(lambda node_ip: self.post(node_ip, path, pay_load, default, idempotent), node_ips)
+
+	def close(self):
+		with self._lock:
+			pool, self._pool = self._pool, None
+		if pool is not None:
+			pool.terminate()
+		self.session.close()
+		self.once_session.close()
+
+
+_CLIENT = None
+_CLIENT_LOCK = threading.Lock()
+
+def getClusterClient(timeout, retries, backoff):
+	"""The cluster client of this server process, created on first use"""
+	global _CLIENT
+	with _CLIENT_LOCK:
+		if _CLIENT is None:
+			_CLIENT = ClusterClient(timeout, retries, backoff)
+		return _CLIENT
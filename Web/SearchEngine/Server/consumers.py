@@ -28,6 +28,7 @@ from datetime import datetime
 import time
 import pprint
 from channels import Group, Channel
+from channels.sessions import channel_session
 import json
 import plugins
 
@@ -47,17 +48,16 @@ def ws_connect(message):
 	#})
 	
 	
+@channel_session
 def ws_receive_create(message):
 	if message.content['text']=='createInformation':
-		while True:
-			progressInformation = plugins.getDirectoryStatusList()
-			message.reply_channel.send({
-				"text": json.dumps(progressInformation)
-			})
-			time.sleep(1)
+		plugins.followDirectoryStatus(message)
+	elif message.content['text']=='createInformationAlive':
+		plugins.followDirectoryStatus(message, snapshot=False)
 	else:
 		message.reply_channel.send({"text":''})
 
+@channel_session
 def ws_index_search_status(message):
 	plugins.getIndexSearchStatus(message)
 
@@ -73,82 +73,22 @@ def api_multi_index_search_status(message):
 def api_index_create_status(message):
 	plugins.distributedIndexCreateStatus(message)
 
+@channel_session
 def ws_receive_search(message):
 	request = json.loads(message.content["text"])
 	if request["type"]=='searchInformation':
-		search_string = request["searchString"]
-		cache_query_set = SearchResultCache.objects.filter(search_string=search_string)
-		algorithm_query_set = AlgorithmConfigInfo.objects.filter(config_flag=1)
-		num_configs = len(algorithm_query_set)
-		num_config_caches = len(cache_query_set)
-		if num_configs==num_config_caches:
-			print "### num_configs == num_config_caches"
-			time_start = time.time()
-			result_list = []
-			for c in cache_query_set:
-				result_list.extend(json.loads(c.search_content))
-			time_end = time.time()
-			format_result = plugins.formatIndexSearchResult(result_list)
-			format_result["summary"]["size_searched_file"] = sum([c.config_info.config_content_size for c in cache_query_set])
-			format_result["summary"]["size_total_file"] = sum([a.config_content_size for a in algorithm_query_set])
-			format_result["summary"]["time_cost"] = "{:.4f}".format(time_end-time_start)
-			format_result["summary"]["rate"] = format_result["summary"]["size_searched_file"]/(time_end-time_start)
-			format_result["summary"]["flag"] = 1
-			message.reply_channel.send({
-				"text": json.dumps(format_result)
-			})
-		else:
+		search_string = plugins.canonicalSearchString(request["searchString"])
+		if plugins.indexCacheExistJudge(search_string)["code"]!=0:
 			print "### num_configs != num_config_caches"
-			plugins.runIndexSearchProgram(search_string)
-			time_start = time.time()
-			print "### start search loop"
-			while True:
-				plugins.close_old_connections()
-				cache_query_set = SearchResultCache.objects.filter(search_string=search_string)
-				try:
-					num_config_caches = cache_query_set.count()
-				except Exception,e:
-					print "@@@@ Exception: {}-{}".format(Exception, e)
-				if num_configs>num_config_caches:
-					print "### num_configs[{}] > num_config_caches[{}]".format(num_configs, num_config_caches)
-					try:
-						result_list = []
-						for c in cache_query_set:
-							result_list.extend(json.loads(c.search_content))
-						time_end = time.time()
-						format_result = plugins.formatIndexSearchResult(result_list)
-						format_result["summary"]["size_searched_file"] = sum([c.config_info.config_content_size for c in cache_query_set])
-						format_result["summary"]["size_total_file"] = sum([a.config_content_size for a in algorithm_query_set])
-						format_result["summary"]["time_cost"] = "{:.4f}".format(time_end-time_start)
-						format_result["summary"]["rate"] = format_result["summary"]["size_searched_file"]/(time_end-time_start)
-						format_result["summary"]["flag"] = 0
-						message.reply_channel.send({
-							"text": json.dumps(format_result),
-						})
-						time.sleep(1)
-					except Exception,e:
-						print "@@@@@ New Error:{}-{}".format(Exception,e)
-				else:
-					print "### num_configs == num_config_caches"
-					result_list = []
-					for c in cache_query_set:
-						result_list.extend(json.loads(c.search_content))
-					time_end = time.time()
-					format_result = plugins.formatIndexSearchResult(result_list)
-					format_result["summary"]["size_searched_file"] = sum([c.config_info.config_content_size for c in cache_query_set])
-					format_result["summary"]["size_total_file"] = sum([a.config_content_size for a in algorithm_query_set])
-					format_result["summary"]["time_cost"] = "{:.4f}".format(time_end-time_start)
-					format_result["summary"]["rate"] = format_result["summary"]["size_searched_file"]/(time_end-time_start)
-					format_result["summary"]["flag"] = 1
-					message.reply_channel.send({
-						"text": json.dumps(format_result),
-					})
-					print "### It's time to break"
-					break
-		print "Jump out of the loop successfull!"
-		message.reply_channel.send({"text":"Over"})
+			result = plugins.runIndexSearchProgram(search_string)
+			if result["code"]!=0:
+				# Nothing was queued, no delta would ever come to the Group
+				message.reply_channel.send({"text":json.dumps(result)})
+				message.reply_channel.send({"text":"over"})
+				return
+		plugins.followIndexSearch(message, search_string)
 	else:
-		message.reply_channel.send({"text":"Over"})
+		message.reply_channel.send({"text":"over"})
 
 # Connected to websocket.receive
 def ws_receive(message):
@@ -181,6 +121,11 @@ def ws_receive(message):
 		message.reply_channel.send({"text":''})
 
 # Connected to websocket.disconnect
+@channel_session
 def ws_disconnect(message):
-	#Group("chat").discard(message.reply_channel)
+	search_group = message.channel_session.pop('search_group', None)
+	if search_group:
+		Group(search_group).discard(message.reply_channel)
+	if message.channel_session.pop('dashboard', False):
+		plugins.unfollowDirectoryStatus(message)
 	message.reply_channel.send({"text":"disconnect"})
@@ -11,9 +11,11 @@ def test():
         print "%s times has been done!"%i
         
 def runDirectoryAnalysisProgram():
-    directory_list = plugins.getDirectoryList()
-	file_list = plugins.getFileListFromDirectoryList()
-    plugins.importFileInfoToDatabase(file_list)
-    plugins.makeAlgorithmConfigFiles()
-    plugins.runIndexCreateProgram()
+    plugins.directoryRescanProgram()
+
+def runHistorySearchStatisticProgram():
+    plugins.historySearchStatisticUpdateProgram()
     
+
+def runIndexBuildRecoveryProgram():
+    plugins.resumeIndexBuildProgram()
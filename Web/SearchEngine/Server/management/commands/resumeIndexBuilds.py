@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+'''
+Created on 2026-10-18
+
+Recovers the index builds of dead workers and runs the queued ones, for the
+servers that do not resume them when they start, like uwsgi or daphne; run it
+after they start, or from cron.
+'''
+import json
+
+from django.core.management.base import BaseCommand
+
+from Server import plugins
+
+
+class Command(BaseCommand):
+    help = "Recovers orphaned index builds and runs the queued ones, waiting for them when no server of this host runs them"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retry-failed', action='store_true', dest='retry_failed', default=False,
+            help="Run the builds that used all their attempts again")
+
+    def handle(self, *args, **options):
+        result = plugins.resumeIndexBuildProgram(retry_failed=options['retry_failed'])
+        self.stdout.write(json.dumps(result["data"]))
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+'''
+Created on 2026-10-18
+
+Renders the rows of a raw file around search matches as the HTML table rows
+finspect printed: decimal offset, hex offset, hex, ascii and bit columns of
+8 bytes per line, with the matched bits wrapped in the prefix and suffix.
+
+A page of matches is rendered in one pass over one read-only mapping of the
+file; only the lines around the matches are touched, and nothing is written,
+so any number of requests can render at the same time.
+'''
+import os, mmap
+
+BYTES_PER_LINE = 8
+BITS_PER_LINE = BYTES_PER_LINE*8
+MAX_CONTEXT_LINES = 1024
+MAX_MATCH_BITS = 65536
+
+DEFAULT_CSS = {
+	"tr_class": "tr_class",
+	"td_class_offset": "offset_class",
+	"td_class_offset_hex": "offset_hex_class",
+	"td_class_hex": "hex_class",
+	"td_class_ascii": "ascii_class",
+	"td_class_bit": "bit_class",
+	"matched_prefix": "<font color='red'>",
+	"matched_suffix": "</font>",
+	"preload_lines": 2,
+	"postload_lines": 1
+}
+
+
+def matchSpan(match):
+	"""[bit_start, bit_end) of a {offset, offset_bit, length_bit or length} match"""
+	bit_start = int(match["offset"])*8+int(match.get("offset_bit", 0))
+	return bit_start, bit_start+int(match.get("length_bit", match.get("length", 0)))
+
+
+def matchLines(match, file_size, css):
+	"""[first_line, last_line] shown for a match, None when the match is out of the file"""
+	offset, offset_bit = int(match["offset"]), int(match.get("offset_bit", 0))
+	bit_start, bit_end = matchSpan(match)
+	if offset<0 or offset>=file_size or not 0<=offset_bit<=7 or not 0<bit_end-bit_start<=MAX_MATCH_BITS:
+		return None
+	last_data_line = (file_size-1)//BYTES_PER_LINE
+	first_line = max(0, bit_start//BITS_PER_LINE-css["preload_lines"])
+	last_line = min(last_data_line, (bit_end-1)//BITS_PER_LINE+css["postload_lines"])
+	return first_line, last_line
+
+
+def asciiCell(byte):
+	char = chr(byte) if 32<=byte<=126 else '.'
+	if char==' ':
+		return "&nbsp;"
+	if char.isalnum():
+		return char
+	return "&#{};".format(ord(char))
+
+
+def renderCells(data, first_line, bit_start, bit_end, css):
+	"""The hex, ascii and bit cells of the lines in data, the bits in [bit_start, bit_end) emphasized"""
+	prefix, suffix = css["matched_prefix"], css["matched_suffix"]
+	hex_lines, ascii_lines, bit_lines = [], [], []
+	for i in range(0, len(data), BYTES_PER_LINE):
+		line_bit = (first_line*BYTES_PER_LINE+i)*8
+		row = bytearray(data[i:i+BYTES_PER_LINE])
+		# The emphasized bits of this line, relative to the line
+		lo, hi = max(bit_start, line_bit)-line_bit, min(bit_end, line_bit+len(row)*8)-line_bit
+		hex_cells, ascii_cells, bit_cells = [], [], []
+		for j, byte in enumerate(row):
+			opened, closed = lo<hi and j==lo//8, lo<hi and j==(hi-1)//8
+			hex_cells.append((prefix if opened else "")+"%.2X "%byte+(suffix if closed else ""))
+			ascii_cells.append((prefix if opened else "")+asciiCell(byte)+(suffix if closed else ""))
+			bits = format(byte, '08b')
+			for k in range(8):
+				bit = j*8+k
+				bit_cells.append((prefix if lo<hi and bit==lo else "")+bits[k]+(" " if k==7 else "")+(suffix if lo<hi and bit==hi-1 else ""))
+		hex_lines.append("".join(hex_cells))
+		ascii_lines.append("".join(ascii_cells))
+		bit_lines.append("".join(bit_cells))
+	return "<br>".join(hex_lines), "<br>".join(ascii_lines), "<br>".join(bit_lines)
+
+
+def renderMatch(data, first_line, last_line, match, css):
+	"""One <tr> of a match, data holding the bytes of lines first_line to last_line"""
+	bit_start, bit_end = matchSpan(match)
+	lines = range(first_line, last_line+1)
+	hex_cell, ascii_cell, bit_cell = renderCells(data, first_line, bit_start, bit_end, css)
+	rows = ["\t<tr class='{}'>\n".format(css["tr_class"])]
+	rows.append("\t\t<td class='{}'>\n{}</td>\n".format(css["td_class_offset"], "<br>".join(["%d"%(line*BYTES_PER_LINE) for line in lines])))
+	rows.append("\t\t<td class='{}'>\n{}</td>\n".format(css["td_class_offset_hex"], "<br>".join(["0x%.8X"%(line*BYTES_PER_LINE) for line in lines])))
+	rows.append("\t\t<td class='{}'>\n{}</td>\n".format(css["td_class_hex"], hex_cell))
+	rows.append("\t\t<td class='{}'>\n{}</td>\n".format(css["td_class_ascii"], ascii_cell))
+	rows.append("\t\t<td class='{}'>\n{}</td>\n".format(css["td_class_bit"], bit_cell))
+	rows.append("</tr>\n")
+	return "".join(rows)
+
+
+def renderMatches(file_path, matches, css=None):
+	"""
+		The <tr> rows of matches in file_path, in the order of matches
+		Matches out of the file are left out, as finspect did
+	"""
+	css = dict(DEFAULT_CSS, **(css or {}))
+	css["preload_lines"] = max(0, min(int(css["preload_lines"]), MAX_CONTEXT_LINES))
+	css["postload_lines"] = max(0, min(int(css["postload_lines"]), MAX_CONTEXT_LINES))
+	with open(file_path, 'rb') as f:
+		file_size = os.fstat(f.fileno()).st_size
+		spans = [matchLines(match, file_size, css) for match in matches]
+		if file_size==0 or not any(spans):
+			return ""
+		m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		try:
+			rows = [None]*len(matches)
+			# Read the windows in file order, so the page is one forward pass over the mapping
+			for i in sorted([i for i, span in enumerate(spans) if span], key=lambda i: spans[i][0]):
+				first_line, last_line = spans[i]
+				data = m[first_line*BYTES_PER_LINE:min(file_size, (last_line+1)*BYTES_PER_LINE)]
+				rows[i] = renderMatch(data, first_line, last_line, matches[i], css)
+		finally:
+			m.close()
+	return "".join([row for row in rows if row])
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.22 on 2026-10-18 10:00
+from __future__ import unicode_literals
+
+import hashlib
+import json
+
+from django.db import migrations, models
+import numpy as np
+
+
+# Frozen copy of Server.models.MATCH_RECORD_DTYPE
+MATCH_RECORD_DTYPE = np.dtype([('file_id', '<i4'), ('offset', '<i8'), ('offset_bit', 'u1'), ('length', '<i4')])
+
+
+def pack_search_content(apps, schema_editor):
+    SearchResultCache = apps.get_model('Server', 'SearchResultCache')
+    FileInfo = apps.get_model('Server', 'FileInfo')
+    file_ids = dict(FileInfo.objects.values_list('filefullpathname', 'id'))
+    for cache in SearchResultCache.objects.all().iterator():
+        try:
+            matches = json.loads(cache.search_content)
+        except ValueError:
+            matches = []
+        rows = [(file_ids[m["name"]], m["offset"], m["offset_bit"], m["length"]) for m in matches if m["name"] in file_ids]
+        records = np.array(rows, dtype=MATCH_RECORD_DTYPE)
+        cache.search_hash = hashlib.sha1(cache.search_string.encode('utf-8')).hexdigest()
+        cache.search_matches = records.tobytes()
+        cache.num_match = len(records)
+        cache.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Server', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='searchresultcache',
+            name='search_hash',
+            field=models.CharField(db_index=True, default='', max_length=40, verbose_name='Search String SHA1'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='searchresultcache',
+            name='search_matches',
+            field=models.BinaryField(default=b'', verbose_name='Search Matches'),
+        ),
+        migrations.AddField(
+            model_name='searchresultcache',
+            name='num_match',
+            field=models.IntegerField(default=0, verbose_name='Match Number'),
+        ),
+        migrations.RunPython(pack_search_content, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='searchresultcache',
+            name='search_content',
+        ),
+    ]
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.22 on 2026-10-18 11:16
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def create_cache_entries(apps, schema_editor):
+    SearchResultCache = apps.get_model('Server', 'SearchResultCache')
+    SearchCacheEntry = apps.get_model('Server', 'SearchCacheEntry')
+    entries = {}
+    for search_string, search_hash, search_matches in SearchResultCache.objects.values_list('search_string', 'search_hash', 'search_matches').iterator():
+        entry = entries.setdefault(search_string, SearchCacheEntry(search_string=search_string, search_hash=search_hash))
+        entry.size += len(search_matches)
+    SearchCacheEntry.objects.bulk_create(entries.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Server', '0002_searchresultcache_search_matches'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchCacheEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('search_string', models.TextField(verbose_name='Search String')),
+                ('search_hash', models.CharField(db_index=True, max_length=40, verbose_name='Search String SHA1')),
+                ('size', models.BigIntegerField(default=0, verbose_name='Cached Size(byte)')),
+                ('hits', models.IntegerField(default=0, verbose_name='Cache Hits')),
+                ('misses', models.IntegerField(default=0, verbose_name='Cache Misses')),
+                ('createtime', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Create Time')),
+                ('accesstime', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Last Access Time')),
+            ],
+        ),
+        migrations.RunPython(create_cache_entries, migrations.RunPython.noop),
+    ]
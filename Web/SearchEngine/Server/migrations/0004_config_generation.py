@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.22 on 2026-10-18 11:18
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Server', '0003_searchcacheentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='algorithmconfiginfo',
+            name='config_generation',
+            field=models.CharField(default='', max_length=40, verbose_name='Index Generation'),
+        ),
+        migrations.AddField(
+            model_name='searchresultcache',
+            name='config_generation',
+            field=models.CharField(default='', max_length=40, verbose_name='Index Generation'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.22 on 2026-10-18 11:36
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Server', '0004_config_generation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fileinfo',
+            name='inode',
+            field=models.BigIntegerField(default=0, verbose_name='Inode(stat)'),
+        ),
+        migrations.AddField(
+            model_name='fileinfo',
+            name='mtime',
+            field=models.FloatField(default=0, verbose_name='Modify Time(stat)'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.22 on 2026-10-18 11:42
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Server', '0005_fileinfo_stat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexBuildJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('state', models.IntegerField(db_index=True, default=0, verbose_name='State(0-3)')),
+                ('attempts', models.IntegerField(default=0, verbose_name='Attempts')),
+                ('worker', models.CharField(blank=True, default='', max_length=100, verbose_name='Worker(host:pid)')),
+                ('heartbeat', models.DateTimeField(blank=True, null=True, verbose_name='Heartbeat')),
+                ('message', models.TextField(blank=True, default='', verbose_name='Last Error')),
+                ('createtime', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Create Time')),
+                ('starttime', models.DateTimeField(blank=True, null=True, verbose_name='Start Time')),
+                ('finishtime', models.DateTimeField(blank=True, null=True, verbose_name='Finish Time')),
+                ('config_info', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='build_job', to='Server.AlgorithmConfigInfo')),
+            ],
+        ),
+    ]
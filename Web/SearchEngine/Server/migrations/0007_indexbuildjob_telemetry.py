@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.22 on 2026-10-18 11:45
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Server', '0006_indexbuildjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='indexbuildjob',
+            name='bytes_read',
+            field=models.BigIntegerField(default=0, verbose_name='Bytes Read'),
+        ),
+        migrations.AddField(
+            model_name='indexbuildjob',
+            name='read_time',
+            field=models.FloatField(default=0, verbose_name='Read Time(s)'),
+        ),
+        migrations.AddField(
+            model_name='indexbuildjob',
+            name='sort_time',
+            field=models.FloatField(default=0, verbose_name='Sort Time(s)'),
+        ),
+        migrations.AddField(
+            model_name='indexbuildjob',
+            name='write_time',
+            field=models.FloatField(default=0, verbose_name='Write Time(s)'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.22 on 2026-10-18 11:49
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Server', '0007_indexbuildjob_telemetry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='searchcacheentry',
+            name='file_size',
+            field=models.BigIntegerField(default=0, verbose_name='Matched File Size(byte)'),
+        ),
+        migrations.AddField(
+            model_name='searchcacheentry',
+            name='mpm',
+            field=models.FloatField(default=0, verbose_name='Matches Per MB'),
+        ),
+        migrations.AddField(
+            model_name='searchcacheentry',
+            name='num_directory',
+            field=models.IntegerField(default=0, verbose_name='Directory Number'),
+        ),
+        migrations.AddField(
+            model_name='searchcacheentry',
+            name='num_file',
+            field=models.IntegerField(default=0, verbose_name='File Number'),
+        ),
+        migrations.AddField(
+            model_name='searchcacheentry',
+            name='num_match',
+            field=models.IntegerField(default=0, verbose_name='Match Number'),
+        ),
+        migrations.AddField(
+            model_name='searchcacheentry',
+            name='summarized',
+            field=models.BooleanField(default=False, verbose_name='Summarized'),
+        ),
+    ]
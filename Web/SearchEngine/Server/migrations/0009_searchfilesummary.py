@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.22 on 2026-10-18 11:51
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Server', '0008_searchcacheentry_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchFileSummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('num_match', models.IntegerField(default=0, verbose_name='Match Number')),
+                ('mpm', models.FloatField(default=0, verbose_name='Matches Per MB')),
+                ('file_size', models.BigIntegerField(default=0, verbose_name='File Size(byte)')),
+                ('blocks', models.TextField(default='', verbose_name='Config Ids')),
+                ('file_info', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_summaries', to='Server.FileInfo')),
+                ('search_entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='files', to='Server.SearchCacheEntry')),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='searchfilesummary',
+            index_together=set([('search_entry', 'num_match'), ('search_entry', 'mpm'), ('search_entry', 'file_size')]),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.22 on 2026-10-18 12:05
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Server', '0009_searchfilesummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='searchfilesummary',
+            name='matches',
+            field=models.BinaryField(default=b'', verbose_name='Sorted Matches'),
+        ),
+    ]
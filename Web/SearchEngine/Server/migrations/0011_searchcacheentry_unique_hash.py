@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.22 on 2026-10-18 12:44
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def drop_duplicate_entries(apps, schema_editor):
+    # Entries raced into existence twice were updated together, the file summaries hang off the oldest
+    SearchCacheEntry = apps.get_model('Server', 'SearchCacheEntry')
+    duplicates = SearchCacheEntry.objects.values('search_hash').annotate(first_id=Min('id'), num_entry=Count('id')).filter(num_entry__gt=1)
+    for duplicate in list(duplicates):
+        SearchCacheEntry.objects.filter(search_hash=duplicate['search_hash']).exclude(id=duplicate['first_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Server', '0010_searchfilesummary_matches'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_entries, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='searchcacheentry',
+            name='search_hash',
+            field=models.CharField(max_length=40, unique=True, verbose_name='Search String SHA1'),
+        ),
+    ]
@@ -4,6 +4,16 @@ from __future__ import unicode_literals
 from django.db import models
 
 import django.utils.timezone as timezone
+import hashlib
+import numpy as np
+
+# One search match as stored in SearchResultCache.search_matches
+MATCH_RECORD_DTYPE = np.dtype([('file_id', '<i4'), ('offset', '<i8'), ('offset_bit', 'u1'), ('length', '<i4')])
+# The matches of one file as stored in SearchFileSummary.matches, sorted by offset, offset_bit and length
+MATCH_INDEX_DTYPE = np.dtype([('offset', '<i8'), ('offset_bit', 'u1'), ('length', '<i4')])
+
+def hashSearchString(search_string):
+    return hashlib.sha1(search_string.encode('utf-8')).hexdigest()
 
 # Create your models here.
 
@@ -32,6 +42,8 @@ class FileInfo(models.Model):
     filename = models.CharField('File Name', max_length=200)
     fileflag = models.IntegerField('Status(0-2)', default=0)
     filesize = models.BigIntegerField('File Size(byte)')
+    mtime = models.FloatField('Modify Time(stat)', default=0)
+    inode = models.BigIntegerField('Inode(stat)', default=0)
     configured = models.IntegerField('Has Config File(0-1)', default=0)
     createtime = models.DateTimeField('Start Time', default=timezone.now)
     finishtime = models.DateTimeField('Finish Time', blank=True, default=timezone.now)
@@ -46,21 +58,102 @@ class AlgorithmConfigInfo(models.Model):
     config_content = models.TextField('Config Content')
     config_content_size = models.BigIntegerField('Config Content Total Size(byte)', default=0)
     config_flag = models.IntegerField('Flag(0-1)', default=0)
+    config_generation = models.CharField('Index Generation', max_length=40, default='')
     
     def __unicode__(self):
         return self.config_name
 
+# IndexBuildJob.state
+BUILD_QUEUED, BUILD_RUNNING, BUILD_DONE, BUILD_FAILED = 0, 1, 2, 3
+
+class IndexBuildJob(models.Model):
+    """
+    The mkindex run of one AlgorithmConfigInfo, kept across server restarts
+    A running job refreshes heartbeat, one whose worker died is queued again by recoverIndexBuildJobs
+    """
+    config_info = models.OneToOneField(AlgorithmConfigInfo, related_name='build_job')
+    state = models.IntegerField('State(0-3)', default=BUILD_QUEUED, db_index=True)
+    attempts = models.IntegerField('Attempts', default=0)
+    worker = models.CharField('Worker(host:pid)', max_length=100, default='', blank=True)
+    heartbeat = models.DateTimeField('Heartbeat', blank=True, null=True)
+    message = models.TextField('Last Error', default='', blank=True)
+    createtime = models.DateTimeField('Create Time', default=timezone.now)
+    starttime = models.DateTimeField('Start Time', blank=True, null=True)
+    finishtime = models.DateTimeField('Finish Time', blank=True, null=True)
+    # Reported by mkindex for the attempt that built the index
+    bytes_read = models.BigIntegerField('Bytes Read', default=0)
+    read_time = models.FloatField('Read Time(s)', default=0)
+    sort_time = models.FloatField('Sort Time(s)', default=0)
+    write_time = models.FloatField('Write Time(s)', default=0)
+
+    def __unicode__(self):
+        return "{} ({})".format(self.config_info, self.state)
+
 class SearchResultCache(models.Model):
     """
     The Cache of User's search result history
+    search_matches holds the matches of one config block as packed MATCH_RECORD_DTYPE records
     """
     search_string = models.TextField('Search String')
+    search_hash = models.CharField('Search String SHA1', max_length=40, db_index=True)
     config_info = models.ForeignKey(AlgorithmConfigInfo, related_name='search_caches')
-    search_content = models.TextField('Search Content')
+    config_generation = models.CharField('Index Generation', max_length=40, default='')
+    search_matches = models.BinaryField('Search Matches', default=b'')
+    num_match = models.IntegerField('Match Number', default=0)
+
+    def save(self, *args, **kwargs):
+        self.search_hash = hashSearchString(self.search_string)
+        super(SearchResultCache, self).save(*args, **kwargs)
 
     def __unicode__(self):
         return "{} % {}".format(self.search_string, self.config_info)
+
+class SearchCacheEntry(models.Model):
+    """
+    Size, usage and summary of one search string's SearchResultCache rows, evicted as a whole
+    """
+    search_string = models.TextField('Search String')
+    search_hash = models.CharField('Search String SHA1', max_length=40, unique=True)
+    size = models.BigIntegerField('Cached Size(byte)', default=0)
+    hits = models.IntegerField('Cache Hits', default=0)
+    misses = models.IntegerField('Cache Misses', default=0)
+    createtime = models.DateTimeField('Create Time', default=timezone.now)
+    accesstime = models.DateTimeField('Last Access Time', default=timezone.now, db_index=True)
+    # Summary of the complete result, counted once in the HistorySearch statistic
+    summarized = models.BooleanField('Summarized', default=False)
+    num_file = models.IntegerField('File Number', default=0)
+    num_match = models.IntegerField('Match Number', default=0)
+    num_directory = models.IntegerField('Directory Number', default=0)
+    mpm = models.FloatField('Matches Per MB', default=0)
+    file_size = models.BigIntegerField('Matched File Size(byte)', default=0)
+
+    def save(self, *args, **kwargs):
+        self.search_hash = hashSearchString(self.search_string)
+        super(SearchCacheEntry, self).save(*args, **kwargs)
+
+    def __unicode__(self):
+        return "{} ({} bytes)".format(self.search_string, self.size)
         
+class SearchFileSummary(models.Model):
+    """
+    One matched file of a summarized search string, the history detail pages through these rows
+    blocks lists the ids of the AlgorithmConfigInfo whose cached matches hold the file's matches
+    matches holds the file's matches as sorted MATCH_INDEX_DTYPE records, the match pages are read from it
+    """
+    search_entry = models.ForeignKey(SearchCacheEntry, related_name='files')
+    file_info = models.ForeignKey(FileInfo, related_name='search_summaries')
+    num_match = models.IntegerField('Match Number', default=0)
+    mpm = models.FloatField('Matches Per MB', default=0)
+    file_size = models.BigIntegerField('File Size(byte)', default=0)
+    blocks = models.TextField('Config Ids', default='')
+    matches = models.BinaryField('Sorted Matches', default=b'')
+
+    class Meta:
+        index_together = [('search_entry', 'num_match'), ('search_entry', 'mpm'), ('search_entry', 'file_size')]
+
+    def __unicode__(self):
+        return "{} % {}".format(self.search_entry, self.file_info)
+
 class GlobalStaticVarible(models.Model):
     varible_label = models.CharField('Varibles Lable', max_length=100)
     varible_content = models.TextField('Varibles Content', default='')
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+'''
+Created on 2026-10-18
+
+Compiles search strings into their canonical pattern once per process.
+
+A binary ('0', '1', '.') or hex ('0'-'F', '.') search string is expanded to
+bits and the '.' around them are dropped. bgrep and pyIndexSearcher strip
+those before searching and count offsets from the first bit left, so a hex
+string, its binary expansion and either one padded with '.' find the same
+matches; the stripped bits are the key the search cache and the running
+searches go by.
+
+Compiled patterns live in an LRU of PATTERN_CACHE_SIZE entries, together with
+the rule checks made on them and the byte masks of every bit shift bgrep
+tries, each computed on first use.
+'''
+import re, threading
+from collections import OrderedDict
+import numpy as np
+
+PATTERN_CACHE_SIZE = 4096
+HEX_TO_BITS = dict([('%X'%i, format(i, '04b')) for i in range(16)]+[('.', '....')])
+BIN_CHARACTERS = re.compile(r"^[01.]*$")
+HEX_CHARACTERS = re.compile(r"^[0-9a-fA-F.]*$")
+
+
+class CompiledPattern(object):
+	"""
+		bits is the search string expanded to '0', '1' and '.', key is bits without the '.' around it;
+		both are None when the string is not of its scale
+		data and mask hold key packed into bytes, a '.' being a 0 bit of mask; prefix_bits counts the
+		determined bits key starts with, anchor is the bit offset in key of its longest determined run
+	"""
+	def __init__(self, source, scale):
+		self.source = source
+		self.scale = scale
+		self._rules = {}
+		self._shifts = {}
+		if scale==16:
+			self.bits = "".join([HEX_TO_BITS[c] for c in source.upper()]) if HEX_CHARACTERS.match(source) else None
+		else:
+			self.bits = str(source) if BIN_CHARACTERS.match(source) else None
+		self.key = self.bits.strip('.') if self.bits is not None else None
+		runs = [(m.end()-m.start(), m.start()) for m in re.finditer(r"[01]+", self.key or "")]
+		self.prefix_bits = runs[0][0] if runs and runs[0][1]==0 else 0
+		# The first of the longest runs
+		self.anchor = max(runs, key=lambda run: run[0])[1] if runs else 0
+		self.mask, self.data = self.shiftMasks(0) if self.key else (np.zeros(0, dtype=np.uint8), np.zeros(0, dtype=np.uint8))
+
+	def matches(self, rule):
+		"""Whether the whole search string matches the regex rule, checked once per rule"""
+		result = self._rules.get(rule)
+		if result is None:
+			m = re.match(rule, self.source)
+			result = self._rules[rule] = bool(m and m.group()==self.source)
+		return result
+
+	def shiftRegex(self, shift):
+		"""key behind shift '.', padded with '.' to whole bytes, the regex bgrep verifies for that bit shift"""
+		length = (len(self.key)+shift+7)/8
+		return ('.'*shift+self.key).ljust(length*8, '.')
+
+	def shiftMasks(self, shift):
+		"""(mask, value) uint8 arrays of shiftRegex(shift), mmtregex_from_str; shared, so read only"""
+		masks = self._shifts.get(shift)
+		if masks is None:
+			regex = np.frombuffer(self.shiftRegex(shift), dtype=np.uint8).reshape(-1, 8)
+			mask = np.packbits(regex!=ord('.'), axis=1).ravel()
+			value = np.packbits(regex==ord('1'), axis=1).ravel()
+			mask.flags.writeable = value.flags.writeable = False
+			masks = self._shifts[shift] = (mask, value)
+		return masks
+
+
+_PATTERNS = OrderedDict()
+_PATTERNS_LOCK = threading.Lock()
+
+def compilePattern(search_string, scale=2):
+	"""The CompiledPattern of search_string in base scale, 2 or 16, compiled on first use"""
+	cache_key = (scale, search_string)
+	with _PATTERNS_LOCK:
+		pattern = _PATTERNS.pop(cache_key, None)
+		if pattern is None:
+			pattern = CompiledPattern(search_string, scale)
+		_PATTERNS[cache_key] = pattern
+		while len(_PATTERNS)>PATTERN_CACHE_SIZE:
+			_PATTERNS.popitem(last=False)
+		return pattern
+
+def canonicalSearchString(search_string, scale=2):
+	"""
+		The key the results of search_string are cached and searched under
+		A string without any determined bit is kept as it is, so the search rejects it as before
+	"""
+	pattern = compilePattern(search_string, scale)
+	return pattern.key if pattern.key else (pattern.bits or search_string)
+
+def clearPatterns():
+	with _PATTERNS_LOCK:
+		_PATTERNS.clear()
@@ -4,18 +4,33 @@ Created on 2016-11-30
 
 @author: Polly
 '''
-from Server.models import FileInfo, DirectoryInfo, AlgorithmConfigInfo, SearchResultCache, GlobalStaticVarible, NodeInfo
+from Server.models import FileInfo, DirectoryInfo, AlgorithmConfigInfo, IndexBuildJob, SearchResultCache, SearchCacheEntry, SearchFileSummary, GlobalStaticVarible, NodeInfo
+from Server.models import MATCH_RECORD_DTYPE, MATCH_INDEX_DTYPE, hashSearchString, BUILD_QUEUED, BUILD_RUNNING, BUILD_DONE, BUILD_FAILED
+from Server import pyIndexSearcher, searchExecutor, clusterClient, blockPlanner, buildScheduler, searchRelation, matchInspector, patternCompiler
 from django.utils import timezone  
-from datetime import datetime
+from datetime import datetime, timedelta
 # from pyHDFSAnalyser import HDFSAnalyser
 import multiprocessing, subprocess
-import os,random
-import json, math, time
+from multiprocessing.pool import ThreadPool
+import os,random,errno,mmap,socket,threading,gc
+from itertools import izip
+from collections import deque
+import json, math, time, hashlib, base64
 import re
 import numpy as np
-from django.db import connections
-import requests
+from django.db import connection, connections, transaction
+from django.db.models import F, Q, Sum, Count, Min, Max, Case, When, BigIntegerField
+from django.db.models.functions import Length
+from channels import Group
+from django.core.cache import cache
 import math
+try:
+	from os import scandir
+except ImportError:
+	try:
+		from scandir import scandir
+	except ImportError:
+		scandir = None
 
 ISOTIMEFORMAT = '%Y-%m-%d %X'
 CONFIGFILEPATH = "configFiles/"
@@ -31,6 +46,37 @@ BLOCKSIZE = int(1.98*1024*1024*1024)
 # BLOCKSIZE = int(200*1024*1024)
 MARGINSIZE = int(4*1024)
 CPUCORES = 10
+# "native" searches the memory-mapped index in-process, "bgrep" forks the C program
+SEARCH_ENGINE = "native"
+# Search jobs (one per config block) that may be queued or running in this server process
+SEARCH_QUEUE_SIZE = 4096
+SEARCH_QUEUE_TIMEOUT = 5
+# Seconds a search of one block may run before it is failed and its queue slot given back
+SEARCH_JOB_TIMEOUT = 600
+SEARCH_JOBS = searchExecutor.SearchJobRegistry()
+SEARCH_EVENT_GROUP = "indexSearch-{}"
+# Deltas sent to the Group of a pattern, counted in the shared cache for the followers that wait on several patterns
+SEARCH_EVENT_COUNT_KEY = "indexSearchEvents-{}"
+# Lease of a search string whose SearchJob runs in some process, renewed by every finished block; eviction skips it
+SEARCH_RUNNING_KEY = "searchRunning-{}"
+SEARCH_STATUS_INTERVAL = 1
+DASHBOARD_GROUP = "indexCreateStatus"
+# Seconds one computed dashboard status is served to every worker from the cache, and between two broadcasts
+DASHBOARD_STATUS_TTL = 0.5
+DASHBOARD_STATUS_INTERVAL = 1
+DASHBOARD_STATUS_KEY = "directoryStatusList"
+DASHBOARD_FOLLOWERS_KEY = "directoryStatusFollowers"
+# Seconds a dashboard stays followed after its last message, the pages send one every third of it
+DASHBOARD_FOLLOWER_TTL = 60
+DASHBOARD_BROADCASTER_KEY = "directoryStatusBroadcaster"
+# (connect, read) seconds of one call to a node, retries of refused connections and gateway errors
+CLUSTER_TIMEOUT = (3, 30)
+CLUSTER_RETRIES = 2
+CLUSTER_BACKOFF = 0.5
+# Search result cache: byte budget of the packed matches, "LRU" or "LFU", lifetime in seconds (None keeps forever)
+SEARCH_CACHE_BUDGET = 1<<30
+SEARCH_CACHE_POLICY = "LRU"
+SEARCH_CACHE_TTL = 7*24*3600
 DIRECTORY_BLOCK_LIST = ["/"]
 #SEARCH_RULE = r"^[0-1][0|1|\.]{13}[0|1|\.]*"
 SEARCH_RULE = r"^[0-1]{24,}(\.|[0-1]{24,})*"
@@ -75,6 +121,45 @@ CONFIGFILEPATH_ABS = "/configFiles/"
 ALGORITHMPATH = "/home/BSearch/"
 WORKPATH_ABS = "/home/BSearch/"
 INDEXFILEPATH_ABS = "/indexFiles/"
+# Keeps "IN (...)" lookups under the database's parameter limit
+QUERY_CHUNK_SIZE = 500
+# FileInfo rows the formatters looked up; every process drops its copy when FILE_INFO_GENERATION_KEY moves,
+# and after FILE_INFO_CACHE_TTL seconds at the latest, as does the shared cache of the indexed size per directory
+FILE_INFO_CACHE = {}
+FILE_INFO_CACHE_SIZE = 1<<20
+FILE_INFO_CACHE_TTL = 60
+FILE_INFO_GENERATION_KEY = "fileInfoGeneration"
+INDEXED_DIRECTORY_SIZE_KEY = "indexedDirectorySize"
+# Largest window of a file the hex viewer reads at once, and most match intervals sent in a response header
+FILE_BLOCK_MAX_SIZE = 1<<20
+FILE_BLOCK_MAX_HEADER_INTERVALS = 256
+SCAN_THREADS = 8
+# Bytes the concurrent mkindex runs may allocate together, None for 80% of the RAM
+INDEX_BUILD_MEMORY = None
+INDEX_BUILD_ATTEMPTS = 3
+# Seconds between heartbeats of a running build, and of silence after which its worker counts as gone
+INDEX_BUILD_HEARTBEAT = 30
+INDEX_BUILD_STALE = 300
+# A running build is reported stalled past this many times its expected duration
+INDEX_BUILD_STALL_FACTOR = 3
+# One process per host, the holder of this lease, runs the builds; seconds between two rounds of its runner
+INDEX_BUILD_RUNNER_KEY = "indexBuildRunner-{}"
+INDEX_BUILD_RUNNER_INTERVAL = 5
+IMPORT_BATCH_SIZE = 1000
+HISTORY_STATISTIC_LABEL = "HistorySearch"
+# (HistorySearch statistic key, SearchCacheEntry summary field, formatHistoryIndexSearchResult summary key)
+HISTORY_STATISTIC_FIELDS = [("num_file", "num_file", "num_file"), ("num_match", "num_match", "num_match"),
+	("coverage", "num_directory", "num_directory"), ("MPM", "mpm", "MPM"), ("file_size", "file_size", "file_size")]
+HISTORY_DETAIL_PAGE_SIZE = 10
+HISTORY_DETAIL_MAX_PAGE_SIZE = 100
+# Files of the history pie chart, the rest is one "other" slice
+HISTORY_PIE_TOP = 10
+# orderBy of the history detail to its SearchFileSummary field
+HISTORY_DETAIL_ORDERS = {"num_match":"num_match", "MPM":"mpm", "file_size":"file_size"}
+# Matches per page of the file content reader and of the detail match table
+FILE_MATCH_PAGE_SIZE = 20
+FILE_MATCH_MAX_PAGE_SIZE = 1000
+DETAIL_MATCH_PAGE_SIZE = 5
 
 def close_old_connections():
 	for conn in connections.all():
@@ -83,101 +168,203 @@ def close_old_connections():
 def getDirectoryList():
 	return [directory.dir_name for directory in DirectoryInfo.objects.all()]
 
+def scanDirectory(root):
+	'''
+		([(name, size, mtime, inode), ...], [subdirectory, ...]) of one directory, like one step of os.walk
+		The stat comes from the DirEntry of scandir, symlinked directories are not followed
+	'''
+	files, dirs = [], []
+	try:
+		if scandir is not None:
+			for entry in scandir(root):
+				if entry.is_dir():
+					if not entry.is_symlink():
+						dirs.append(entry.path)
+				elif entry.is_file():
+					st = entry.stat()
+					files.append((entry.name, st.st_size, st.st_mtime, st.st_ino))
+		else:
+			for name in os.listdir(root):
+				path = os.path.join(root, name)
+				if os.path.isdir(path):
+					if not os.path.islink(path):
+						dirs.append(path)
+				elif os.path.isfile(path):
+					st = os.stat(path)
+					files.append((name, st.st_size, st.st_mtime, st.st_ino))
+	except OSError, e:
+		print "@@@ SCAN failed--{}, {}".format(root, e)
+	return files, dirs
+
+def iterFileFromDirectory(directory):
+	'''
+		Yields the fileInfo of every file under directory while SCAN_THREADS threads scan
+		the directories still queued, so the caller can import one batch as the next is read
+	'''
+	dir_info = os.path.abspath(directory)
+	pool = ThreadPool(processes=SCAN_THREADS)
+	try:
+		pending = deque([(directory, pool.apply_async(scanDirectory, (directory,)))])
+		while pending:
+			root, scan = pending.popleft()
+			files, dirs = scan.get()
+			pending.extend([(d, pool.apply_async(scanDirectory, (d,))) for d in dirs])
+			root_abs = os.path.abspath(root)
+			for name, size, mtime, inode in files:
+				yield {'absolute':os.path.join(root_abs, name), 'dir_info':dir_info, 'file_path':root,
+					'file_name':name, 'file_flag':0, 'file_size':size, 'file_mtime':mtime, 'file_inode':inode}
+	finally:
+		pool.terminate()
+
 def getFileFromDirectory(directory):
-	file_list = []
-	for root, dirs, files in os.walk(directory):
-		for name in files:
-			fileInfo = {}
-			fileInfo['absolute'] = os.path.join(os.path.abspath(root), name)
-			fileInfo['dir_info'] = os.path.abspath(directory)
-			fileInfo['file_path'] = root
-			fileInfo['file_name'] = name
-			fileInfo['file_flag'] = 0
-			fileInfo['file_size'] = os.path.getsize(fileInfo['absolute'])
-			file_list.append(fileInfo)
-	return file_list
+	return list(iterFileFromDirectory(directory))
 
-def getFileListFromDirectoryList(directory_list):
-	file_list = []
+def iterFileListFromDirectoryList(directory_list):
 	for directory in directory_list:
-		file_list += getFileFromDirectory(directory)
-	return file_list
+		for fileInfo in iterFileFromDirectory(directory):
+			yield fileInfo
+
+def getFileListFromDirectoryList(directory_list):
+	return list(iterFileListFromDirectoryList(directory_list))
 
 def getHistorySearchList():
-	history_query_set = SearchResultCache.objects.all()
-	history_list = list(set([h.search_string for h in history_query_set]))
+	history_list = list(set(SearchCacheEntry.objects.values_list('search_string', flat=True)))
 	return history_list
 
-def getHistorySearchDetail(search_string):
-	struct_info = {"searchString":{}, "average":{}, "maximum":{}}
-	pie_info = []
-	table_info = []
-
-	history_query_set = SearchResultCache.objects.all()
-
-	#------------table_info--------------#
-	search_query_set = history_query_set.filter(search_string=search_string)
-	search_content_list = []
-	for s in search_query_set:
-		search_content_list.extend(json.loads(s.search_content))
-	format_result = formatHistoryIndexSearchResult(search_content_list)
-	table_info = format_result["detail"]
-
-	#-------------pie_info---------------#
-	for i in table_info:
-		item = {"label":i["name"], "value":i["file_size"]}
-		pie_info.append(item)
-
-	#-----------struct_info--------------#
-	statistic_varible = GlobalStaticVarible.objects.filter(varible_label="HistorySearch")[0]
-	statistic_content = json.loads(statistic_varible.varible_content)
-	struct_info["average"] = statistic_content["average"]
-	struct_info["maximum"] = statistic_content["maximum"]
-	struct_info["searchString"] = format_result["summary"]
-	struct_info["searchString"]["coverage"] = format_result["summary"]["num_directory"]
-
-	# search_string_list = list(set([s.search_string for s in history_query_set]))
-	# num_search_string = len(search_string_list)
-	# num_directory = len(DirectoryInfo.objects.all())
-	# struct_info_list = []
-	# for search_item in search_string_list:
-	#     search_query_set = history_query_set.filter(search_string=search_item)
-	#     content_list = []
-	#     for s in search_query_set:
-	#         content_list.extend(json.loads(s.search_content))
-	#     format_result = formatIndexSearchResult(content_list)
-	#     struct_info_list.append(format_result["summary"])
-	#     if search_item==search_string:
-	#         struct_info["searchString"] = format_result["summary"]
-	#         struct_info["searchString"]["coverage"] = float(struct_info["searchString"]["num_directory"])/num_directory
-	# struct_info["average"]["num_file"] = sum([s["num_file"] for s in struct_info_list])/float(num_search_string)
-	# struct_info["average"]["num_match"] = sum([s["num_match"] for s in struct_info_list])/float(num_search_string)
-	# struct_info["average"]["coverage"] = sum([s["num_directory"] for s in struct_info_list])/float(num_directory*num_search_string)
-	# struct_info["average"]["MPM"] = sum([s["MPM"] for s in struct_info_list])/float(num_search_string)
-	# struct_info["average"]["file_size"] = sum([s["file_size"] for s in struct_info_list])/float(num_search_string)
-
-	return {"struct_info": struct_info, "pie_info": pie_info, "table_info": table_info}
+def getHistorySearchDetail(search_string, order_by="num_match", cursor=None, offset=0, limit=HISTORY_DETAIL_PAGE_SIZE):
+	'''
+		One page of the matched files of search_string, largest order_by first, read from its SearchFileSummary rows
+		cursor is the next_cursor of the previous page; offset only serves jumps to pages no cursor is known for
+		The first page also carries struct_info and the pie_info of the HISTORY_PIE_TOP largest files plus "other"
+		table_info is an iterator; its items leave out the matches, /api_getFileMatches/ pages through them
+	'''
+	field = HISTORY_DETAIL_ORDERS.get(order_by, "num_match")
+	limit = max(1, min(limit, HISTORY_DETAIL_MAX_PAGE_SIZE))
+	entry = getSearchCacheEntryQuerySet(search_string).order_by('id').first()
+	if entry is not None and not entry.summarized and search_string not in SEARCH_JOBS.searchStrings():
+		summarizeSearchHistory(search_string)
+		entry.refresh_from_db()
+	file_query_set = SearchFileSummary.objects.filter(search_entry=entry) if entry is not None else SearchFileSummary.objects.none()
+	result = {"num_file":entry.num_file if entry is not None else 0, "next_cursor":None}
+
+	if cursor is None and not offset:
+		summary = dict([(summary_key, getattr(entry, entry_field) if entry is not None else 0) for key, entry_field, summary_key in HISTORY_STATISTIC_FIELDS])
+		summary["coverage"] = summary["num_directory"]
+		statistic = getHistoryStatistic()
+		result["struct_info"] = {"searchString":summary, "average":statistic["average"], "maximum":statistic["maximum"]}
+		top = list(file_query_set.order_by('-file_size', '-id').values_list('file_info__filefullpathname', 'file_size')[:HISTORY_PIE_TOP])
+		result["pie_info"] = [{"label":name, "value":size} for name, size in top]
+		if len(top)<result["num_file"]:
+			result["pie_info"].append({"label":"other", "value":entry.file_size-sum([size for name, size in top])})
+
+	if cursor is not None:
+		value, last_id = json.loads(cursor)
+		file_query_set = file_query_set.filter(Q(**{field+"__lt":value}) | Q(**{field:value, "id__lt":last_id}))
+	rows = list(file_query_set.order_by('-'+field, '-id').values_list('id', field, 'file_info_id', 'num_match')[offset:offset+limit+1])
+	if len(rows)>limit:
+		rows = rows[:limit]
+		result["next_cursor"] = json.dumps([rows[-1][1], rows[-1][0]])
+	result["entry_id"] = entry.id if entry is not None else None
+	result["table_info"] = iterHistoryDetailItems([(file_id, num_match) for _, _, file_id, num_match in rows])
+	return result
 
-def getDetailMatchInfo(file_name='', match_list=[]):
-	# file_name = "/home/polly/test2/Java/jdk-8u101-windows-x64.exe"
-	# match_list = [
-	#     {"offset":3568333, "offset_bit":4, "length_bit":25},
-	#     {"offset":5952531, "offset_bit":2, "length_bit":25},
-	#     {"offset":7353224, "offset_bit":1, "length_bit":25}
-	# ]
-
-	MATCHCONFIG["file_path"] = file_name
-	MATCHCONFIG["matches"] = match_list
-	with open(CONFIGFILEPATH_ABS+"match.json", "w+") as f:
-		json.dump(MATCHCONFIG, f, sort_keys = True, indent = 4, ensure_ascii = False)
-		#f.write(json.dumps(MATCHCONFIG))
-	# cmd = "./finspect "+CONFIGFILEPATH+"match.json"
-	cmd = "{}finspect {}match.json".format(ALGORITHMPATH, CONFIGFILEPATH_ABS)
-	p = subprocess.Popen(cmd, shell=True, cwd=ALGORITHMPATH, stdout=subprocess.PIPE)
-	#p.communicate()
-	result = p.stdout.read()
+def iterHistoryDetailItems(files):
+	'''
+		Detail items of [(file id, num_match), ...] in that order, without their matches; the client pages
+		through those with the entry_id of the page and the file_id of the item
+	'''
+	file_info = getFileInfo([file_id for file_id, num_match in files], 'id')
+	for file_id, num_match in files:
+		if file_id in file_info:
+			_, file_name, dir_name, file_size = file_info[file_id]
+			yield {"directory_info":dir_name, "file_size":file_size, "name":file_name, "file_id":file_id,
+				"num_match":num_match, "MPM":num_match*1024*1024/file_size if file_size!=0 else 0}
+
+def sortMatchIndex(records):
+	'''The MATCH_INDEX_DTYPE index of the MATCH_RECORD_DTYPE records of one file, sorted, a match found by two blocks kept once'''
+	index = np.empty(len(records), dtype=MATCH_INDEX_DTYPE)
+	for name in MATCH_INDEX_DTYPE.names:
+		index[name] = records[name]
+	return np.unique(index)
+
+def loadMatchIndex(search_string, summary_id, file_id, num_match, blocks, data):
+	'''
+		The match index of a SearchFileSummary row from its matches, rebuilt from the blocks of the
+		file and stored when the row was summarized before the rows kept their index
+	'''
+	index = np.frombuffer(bytes(data), dtype=MATCH_INDEX_DTYPE)
+	if len(index)==0 and num_match:
+		block_ids = [int(b) for b in blocks.split(",") if b]
+		parts = [np.empty(0, dtype=MATCH_RECORD_DTYPE)]
+		for block_data in getSearchResultCacheQuerySet(search_string).filter(config_info_id__in=block_ids).values_list('search_matches', flat=True).iterator():
+			records = np.frombuffer(bytes(block_data), dtype=MATCH_RECORD_DTYPE)
+			parts.append(records[records['file_id']==file_id])
+		index = sortMatchIndex(np.concatenate(parts))
+		# Counted in the cache size by the request that stores it
+		if SearchFileSummary.objects.filter(id=summary_id, matches=b'').update(matches=index.tobytes()):
+			SearchCacheEntry.objects.filter(files__id=summary_id).update(size=F('size')+index.nbytes)
+	return index
+
+def matchIndexList(index):
+	return [{"offset":o, "offset_bit":b, "length":l} for o, b, l in zip(index['offset'].tolist(), index['offset_bit'].tolist(), index['length'].tolist())]
+
+def getFileMatchIndex(entry_id, file_id):
+	'''(file name, sorted match index) of search entry entry_id in file file_id, ValueError when the search did not match the file'''
+	row = SearchFileSummary.objects.filter(search_entry_id=entry_id, file_info_id=file_id).values_list('id', 'num_match', 'blocks', 'matches',
+		'search_entry__search_string', 'file_info__filefullpathname').first()
+	if row is None:
+		raise ValueError("No match of search {} in file {}".format(entry_id, file_id))
+	summary_id, num_match, blocks, data, search_string, file_name = row
+	return file_name, loadMatchIndex(search_string, summary_id, file_id, num_match, blocks, data)
+
+def getFileMatchPage(entry_id, file_id, page=1, item_num=FILE_MATCH_PAGE_SIZE, cursor=None, offset=None):
+	'''
+		One page of the matches of search entry entry_id in file file_id, by position in the file
+		cursor is the next_cursor of the previous page; offset jumps to the page of the first match at or after that byte
+	'''
+	file_name, index = getFileMatchIndex(entry_id, file_id)
+	item_num = max(1, min(item_num, FILE_MATCH_MAX_PAGE_SIZE))
+	if offset is not None:
+		start = int(np.searchsorted(index['offset'], offset, 'left'))
+		start -= start%item_num
+	elif cursor is not None:
+		start = int(np.searchsorted(index, np.array(tuple(json.loads(cursor)), dtype=MATCH_INDEX_DTYPE), 'right'))
+	else:
+		start = (max(1, page)-1)*item_num
+	matches = index[start:start+item_num]
+	result = {"fileName":file_name, "entryId":entry_id, "fileId":file_id, "num_match":len(index), "itemNum":item_num,
+		"pageNum":int(math.ceil(len(index)/float(item_num))), "page":start//item_num+1, "start":start, "matches":matchIndexList(matches), "next_cursor":None}
+	if start+item_num<len(index):
+		result["next_cursor"] = json.dumps(matches[-1].tolist())
 	return result
 
+def getFileMatchRange(entry_id, file_id, start, length):
+	'''The matches of search entry entry_id in file file_id covering any bit of the bytes [start, start+length)'''
+	file_name, index = getFileMatchIndex(entry_id, file_id)
+	if len(index)==0:
+		return []
+	keys = index['offset']*8+index['offset_bit']
+	# A match starting up to the longest match length before the range can reach into it
+	lo = int(np.searchsorted(keys, start*8-int(index['length'].max())+1, 'left'))
+	hi = int(np.searchsorted(keys, (start+length)*8, 'left'))
+	matches = index[lo:hi]
+	return matchIndexList(matches[(matches['offset']*8+matches['offset_bit']+matches['length'])>start*8])
+
+def streamHistorySearchDetail(detail):
+	'''A getHistorySearchDetail page as JSON text, one chunk per detail item, for a StreamingHttpResponse'''
+	table_info = detail.pop("table_info")
+	yield json.dumps(detail)[:-1]+', "table_info":['
+	for i, item in enumerate(table_info):
+		yield (", " if i else "")+json.dumps(item)
+	yield "]}"
+
+def getDetailMatchInfo(file_name='', match_list=[]):
+	'''
+		The <tr> rows of the bytes around each match of file_name, rendered in this process
+		Matches are {offset, offset_bit, length_bit}; nothing is shared between requests
+	'''
+	return matchInspector.renderMatches(file_name, match_list, MATCHCONFIG["css"])
+
 def importDirInfoToDatabase(dir_list):
 	dir_exist = DirectoryInfo.objects.all()
 	for dir in dir_list:
@@ -189,16 +376,33 @@ def importDirInfoToDatabase(dir_list):
 	print "%s directory(s) import to database success!"%len(dir_list)
 
 def importFileInfoToDatabase(file_list):
+	'''
+		Inserts the files of file_list, a list or a stream of fileInfo, not yet in FileInfo in
+		batches of IMPORT_BATCH_SIZE
+		The known paths of a directory are loaded once, when its first file shows up
+	'''
 	try:
-		file_exist = FileInfo.objects.all()
+		directories = {}
+		file_exist = {}
+		batch = []
+		num_file = 0
 		for fileInfo in file_list:
-			tag = file_exist.filter(dir_name=fileInfo['dir_info'], filefullpathname=fileInfo['absolute'])
-			if len(tag)==0:
-				directory = DirectoryInfo.objects.filter(dir_name=fileInfo['dir_info'])[0]
-				f = FileInfo(dir_name=fileInfo['dir_info'], directory_info=directory, filefullpathname=fileInfo['absolute'], filename=fileInfo['file_name'],
-					fileflag = fileInfo['file_flag'], filesize=fileInfo['file_size'])
-				f.save()
-		print "%s file(s) import to database success!"%len(file_list)
+			num_file += 1
+			dir_name = fileInfo['dir_info']
+			if dir_name not in directories:
+				directories[dir_name] = DirectoryInfo.objects.filter(dir_name=dir_name)[0]
+				file_exist[dir_name] = set(FileInfo.objects.filter(dir_name=dir_name).values_list('filefullpathname', flat=True))
+			if fileInfo['absolute'] in file_exist[dir_name]:
+				continue
+			file_exist[dir_name].add(fileInfo['absolute'])
+			batch.append(FileInfo(dir_name=dir_name, directory_info=directories[dir_name], filefullpathname=fileInfo['absolute'], filename=fileInfo['file_name'],
+				fileflag=fileInfo['file_flag'], filesize=fileInfo['file_size'], mtime=fileInfo.get('file_mtime', 0), inode=fileInfo.get('file_inode', 0)))
+			if len(batch)>=IMPORT_BATCH_SIZE:
+				FileInfo.objects.bulk_create(batch)
+				batch = []
+		if batch:
+			FileInfo.objects.bulk_create(batch)
+		print "%s file(s) import to database success!"%num_file
 		return True
 	except:
 		return False
@@ -239,10 +443,10 @@ def directoryAnalysisProgram(directory_string=''):
 	directory = directory_string.strip().rstrip('/')
 	file_list = []
 	if directory:
-		file_list = getFileFromDirectory(directory)
+		file_list = iterFileFromDirectory(directory)
 	else:
 		directory_list = getDirectoryList()
-		file_list = getFileListFromDirectoryList(directory_list)
+		file_list = iterFileListFromDirectoryList(directory_list)
 	if importFileInfoToDatabase(file_list):
 		result["code"] = 0
 		result["message"] = "Directories analysis success!"
@@ -250,79 +454,156 @@ def directoryAnalysisProgram(directory_string=''):
 		result["message"] = "Directories analysis failed!"
 	return result
 
+def bulkUpdateFileStat(rows):
+	'''UPDATEs FileInfo filesize, mtime and inode from (filesize, mtime, inode, id) rows, one executemany per batch'''
+	meta = FileInfo._meta
+	qn = connection.ops.quote_name
+	sql = "UPDATE {} SET {} WHERE {}=%s".format(qn(meta.db_table), ", ".join(["{}=%s".format(qn(meta.get_field(f).column)) for f in ['filesize', 'mtime', 'inode']]), qn(meta.pk.column))
+	for i in range(0, len(rows), IMPORT_BATCH_SIZE):
+		with transaction.atomic():
+			with connection.cursor() as cursor:
+				cursor.executemany(sql, rows[i:i+IMPORT_BATCH_SIZE])
+
+def getConfigRawFileNames(config):
+	return set([raw_file["name"] for raw_file in json.loads(config.config_content)["raw_files"]])
+
+def dropAlgorithmConfigs(config_list):
+	'''Deletes configs with their cached search results and their config and index files'''
+	config_ids = [config.id for config in config_list]
+	for i in range(0, len(config_ids), QUERY_CHUNK_SIZE):
+		chunk = config_ids[i:i+QUERY_CHUNK_SIZE]
+		for search_string in set(SearchResultCache.objects.filter(config_info_id__in=chunk).values_list('search_string', flat=True)):
+			dropStaleSearchResultCache(search_string, getSearchResultCacheQuerySet(search_string).filter(config_info_id__in=chunk))
+		AlgorithmConfigInfo.objects.filter(id__in=chunk).delete()
+	cache.delete(INDEXED_DIRECTORY_SIZE_KEY)
+	for config in config_list:
+		for path in [CONFIGFILEPATH_ABS+config.config_name, json.loads(config.config_content).get("index_file")]:
+			if path and os.path.isfile(path):
+				os.remove(path)
+
+def rescanDirectory(directory_string):
+	'''
+		Diffs a walk of an imported directory against the filesize, mtime and inode kept in FileInfo
+		New files are imported unconfigured. The blocks of a file rewritten in place are indexed again;
+		the blocks of a file that changed size or disappeared no longer fit, so they are dropped with
+		every block sharing a split file with them, and their files are planned again by makeAlgorithmConfigFile
+		Rows without mtime and inode yet only have them filled in
+	'''
+	directory = os.path.abspath(directory_string.strip().rstrip('/'))
+	known = {}
+	for file_id, path, size, mtime, inode in FileInfo.objects.filter(dir_name=directory).values_list('id', 'filefullpathname', 'filesize', 'mtime', 'inode').iterator():
+		known[path] = (file_id, size, mtime, inode)
+	new_files = []
+	resized = set()
+	rewritten = set()
+	stats = []
+	for fileInfo in iterFileFromDirectory(directory):
+		path = fileInfo['absolute']
+		stored = known.pop(path, None)
+		if stored is None:
+			new_files.append(fileInfo)
+			continue
+		file_id, size, mtime, inode = stored
+		if size!=fileInfo['file_size']:
+			resized.add(path)
+		elif (mtime, inode)==(0, 0):
+			pass
+		elif (mtime, inode)!=(fileInfo['file_mtime'], fileInfo['file_inode']):
+			rewritten.add(path)
+		else:
+			continue
+		stats.append((fileInfo['file_size'], fileInfo['file_mtime'], fileInfo['file_inode'], file_id))
+	deleted = known
+	replan = resized|set(deleted.keys())
+	configs = list(AlgorithmConfigInfo.objects.filter(dir_name=directory)) if replan or rewritten else []
+	config_files = dict([(config.id, getConfigRawFileNames(config)) for config in configs])
+	dropped = set()
+	while True:
+		drop = [config for config in configs if config.id not in dropped and config_files[config.id]&replan]
+		if not drop:
+			break
+		for config in drop:
+			dropped.add(config.id)
+			replan |= config_files[config.id]
+	rebuilt = [config.id for config in configs if config.id not in dropped and config_files[config.id]&rewritten]
+
+	dropAlgorithmConfigs([config for config in configs if config.id in dropped])
+	AlgorithmConfigInfo.objects.filter(id__in=rebuilt).update(config_flag=0)
+	if rebuilt:
+		cache.delete(INDEXED_DIRECTORY_SIZE_KEY)
+	requeueIndexBuilds([config for config in configs if config.id in rebuilt])
+	deleted_ids = [stored[0] for stored in deleted.values()]
+	replan_paths = list(replan-set(deleted.keys()))
+	for i in range(0, max(len(deleted_ids), len(replan_paths)), QUERY_CHUNK_SIZE):
+		FileInfo.objects.filter(id__in=deleted_ids[i:i+QUERY_CHUNK_SIZE]).delete()
+		FileInfo.objects.filter(dir_name=directory, filefullpathname__in=replan_paths[i:i+QUERY_CHUNK_SIZE]).update(configured=0, fileflag=0)
+	importFileInfoToDatabase(new_files)
+	# Stats last, so an interrupted rescan finds the same changes again
+	bulkUpdateFileStat(stats)
+	if new_files or replan or rebuilt:
+		DirectoryInfo.objects.filter(dir_name=directory).update(dir_flag=0)
+	if resized or deleted:
+		bumpFileInfoGeneration()
+	result = {"new":len(new_files), "resized":len(resized), "rewritten":len(rewritten), "deleted":len(deleted),
+		"configs_dropped":len(dropped), "configs_rebuilt":len(rebuilt)}
+	print "### RESCAN {} - {}".format(directory, result)
+	return result
+
+def directoryRescanProgram():
+	'''rescanDirectory on every imported directory, then plans and indexes what changed'''
+	result = dict([(directory, rescanDirectory(directory)) for directory in getDirectoryList()])
+	makeAlgorithmConfigFiles()
+	if AlgorithmConfigInfo.objects.filter(config_flag=0).exists():
+		runIndexCreateProgram(wait=True)
+	return result
 
 def makeConfigFileName(directoryName):
-	num = len(AlgorithmConfigInfo.objects.filter(dir_name = directoryName))
-	cfg ='-'.join(directoryName.lstrip('/').split('/')) + '-' + str(num) 
-	return (cfg+'.config',cfg+'.index')
+	# Numbers of configs dropped by rescanDirectory are not reused while a later one exists
+	return makeConfigFileNames(directoryName, 1)[0]
 	
-def makeAlgorithmConfigFile(directoryName):
+def makeConfigFileNames(directoryName, num):
+	'''num unused (config name, index name) pairs of a directory, see makeConfigFileName'''
+	config_names = set(AlgorithmConfigInfo.objects.filter(dir_name = directoryName).values_list('config_name', flat=True))
+	prefix = '-'.join(directoryName.lstrip('/').split('/')) + '-'
+	names = []
+	i = len(config_names)
+	while len(names)<num:
+		if prefix+str(i)+'.config' not in config_names:
+			names.append((prefix+str(i)+'.config', prefix+str(i)+'.index'))
+		i += 1
+	return names
+
+def makeAlgorithmConfigFile(directoryName, dry_run=False):
+	'''
+		Plans the unconfigured files of a directory into index blocks with blockPlanner and saves
+		one AlgorithmConfigInfo per block in a single transaction
+		Returns blockPlanner.describePlan of the blocks; with dry_run nothing is saved
+	'''
 	file_query_set = FileInfo.objects.filter(dir_name=directoryName, configured=0)
-	size_count = 0
-	raw_files = []
-	for f in file_query_set:
-		s = f.filesize
-		if size_count+s<BLOCKSIZE:
-			item = {"name":f.filefullpathname, "offset":0, "length":s}
-			print item
-			size_count += s
-			raw_files.append(item)
-		else:
-			n = int(math.ceil(float(size_count+s)/BLOCKSIZE))
-			marginsize = (size_count+s)%BLOCKSIZE
-			for i in range(0,n):
-				if i==0:
-					item = {"name":f.filefullpathname, "offset":0, "length":(BLOCKSIZE-size_count)}
-					if i<n-2:
-						item["length"] += MARGINSIZE
-					if i==n-2:
-						item["length"] += min(MARGINSIZE, marginsize)
-					print item
-					raw_files.append(item)
-					str_json = {
-						"index_file":INDEXFILEPATH_ABS+makeConfigFileName(directoryName)[1],
-						"raw_files":raw_files
-					}
-					directory = DirectoryInfo.objects.filter(dir_name=directoryName)[0]
-					config_content_size = sum([r["length"] for r in raw_files])
-					a = AlgorithmConfigInfo(dir_name=directoryName, directory_info=directory, config_name=makeConfigFileName(directoryName)[0], config_content=json.dumps(str_json), config_content_size=config_content_size, config_flag=0)
-					a.save()
-					#size_count = 0
-					raw_files = []
-				else:
-					if i<n-1:
-						item = {"name":f.filefullpathname, "offset":(BLOCKSIZE*i-size_count), "length":BLOCKSIZE}
-						if i<n-2:
-							item["length"] += MARGINSIZE
-						if i==n-2:
-							item["length"] += min(MARGINSIZE, marginsize)
-						print item
-						raw_files.append(item)
-						str_json = {
-							"index_file":INDEXFILEPATH_ABS+makeConfigFileName(directoryName)[1],
-							"raw_files":raw_files
-						}
-						directory = DirectoryInfo.objects.filter(dir_name=directoryName)[0]
-						config_content_size = sum([r["length"] for r in raw_files])
-						a = AlgorithmConfigInfo(dir_name=directoryName, directory_info=directory, config_name=makeConfigFileName(directoryName)[0], config_content=json.dumps(str_json), config_content_size=config_content_size, config_flag=0)
-						a.save()
-						#size_count = 0
-						raw_files = []
-					else:
-						item = {"name":f.filefullpathname, "offset":(BLOCKSIZE*i-size_count), "length":marginsize}
-						print item
-						size_count = item['length']
-						raw_files.append(item)
-	if raw_files:
+	file_ids, files = [], []
+	for file_id, name, size in file_query_set.values_list('id', 'filefullpathname', 'filesize').iterator():
+		file_ids.append(file_id)
+		files.append((name, size))
+	blocks = blockPlanner.planBlocks(files, BLOCKSIZE, MARGINSIZE)
+	plan = blockPlanner.describePlan(blocks, BLOCKSIZE, MARGINSIZE)
+	plan["num_file"] = len(files)
+	if dry_run:
+		return plan
+	directory = DirectoryInfo.objects.filter(dir_name=directoryName)[0]
+	configs = []
+	for raw_files, (config_name, index_name) in zip(blocks, makeConfigFileNames(directoryName, len(blocks))):
 		str_json = {
-			"index_file":INDEXFILEPATH_ABS+makeConfigFileName(directoryName)[1],
+			"index_file":INDEXFILEPATH_ABS+index_name,
 			"raw_files":raw_files
 		}
-		directory = DirectoryInfo.objects.filter(dir_name=directoryName)[0]
 		config_content_size = sum([r["length"] for r in raw_files])
-		a = AlgorithmConfigInfo(dir_name=directoryName, directory_info=directory, config_name=makeConfigFileName(directoryName)[0], config_content=json.dumps(str_json), config_content_size=config_content_size, config_flag=0)
-		a.save()
-	file_query_set.update(configured=1)
+		configs.append(AlgorithmConfigInfo(dir_name=directoryName, directory_info=directory, config_name=config_name, config_content=json.dumps(str_json), config_content_size=config_content_size, config_flag=0))
+	with transaction.atomic():
+		AlgorithmConfigInfo.objects.bulk_create(configs)
+		for i in range(0, len(file_ids), QUERY_CHUNK_SIZE):
+			FileInfo.objects.filter(id__in=file_ids[i:i+QUERY_CHUNK_SIZE]).update(configured=1)
+	print "### PLAN {} - {}".format(directoryName, plan)
+	return plan
 		
 def writeConfigFilesToDisk():
 	try:
@@ -337,13 +618,15 @@ def writeConfigFilesToDisk():
 		return False
 
 
-def makeAlgorithmConfigFiles():
+def makeAlgorithmConfigFiles(dry_run=False):
 	result = {"code":1, "message":""}
 	try:
 		directory_list = getDirectoryList()
-		for directory in directory_list:
-			makeAlgorithmConfigFile(directory)
-		if writeConfigFilesToDisk():
+		result["data"] = dict([(directory, makeAlgorithmConfigFile(directory, dry_run)) for directory in directory_list])
+		if dry_run:
+			result["code"] = 0
+			result["message"] = "AlgorithmConfigFiles planned, nothing written!"
+		elif writeConfigFilesToDisk():
 			result["code"] = 0
 			result["message"] = "AlgorithmConfigFiles make and write to disk success!"
 		else:
@@ -356,88 +639,305 @@ def indexCreateProgram(configFilePathName, configFileName):
 	'''
 		run C++ Program
 		subprocess.Popen([<path/to/algorithm>, configFile], shell=Ture, stdout=subprocess.PIPE)
+		Returns the JSON result of mkindex, code -1 when it died without one
 	'''
 	# cmd = "{}mkindex {}".format(WORKPATH_ABS, configFilePathName)
 	cmd = "mkindex {}".format(configFilePathName)
 	# print "The Command: [{}]".format(cmd)
 	p = subprocess.Popen(cmd, shell=True, cwd=WORKPATH_ABS, stdout=subprocess.PIPE)
-	# result = p.stdout.read()
-	# rtnCode = json.loads(result)["code"]
-	
-	#result = json.loads(p.stdout.read())
 	output, err_info = p.communicate()
 	print output
-	result = json.loads(output)
-
-	if result["code"]==0:
+	try:
+		result = json.loads(output)
+	except ValueError:
+		result = {"code":-1, "message":"mkindex of {} exited with {} and no result".format(configFileName, p.returncode)}
+	return result
 
-		'''
-			When recieved 0 means Program successful
-			Then update the configTable(config_flag) and the fileTable(fileflag)
-		'''
+def markIndexCreated(configFileName, stat=None):
+	'''
+		When recieved 0 means Program successful
+		Then update the configTable(config_flag), the fileTable(fileflag) and the build job together
+		stat is the "data" of mkindex: bytes_read, read_time, sort_time and write_time
+	'''
+	stat = dict([(k, v) for k, v in (stat or {}).items() if k in ("bytes_read", "read_time", "sort_time", "write_time")])
+	close_old_connections()
+	with transaction.atomic():
+		config_query_set = AlgorithmConfigInfo.objects.filter(config_name=configFileName)
+		config = config_query_set[0]
+		config_query_set.update(config_flag=1, config_generation=makeConfigGeneration(config.config_content))
+		IndexBuildJob.objects.filter(config_info=config).update(state=BUILD_DONE, finishtime=timezone.now(), message='', **stat)
+		print "UPDATE SUCCESS [{}]".format(configFileName)
+		if not config.directory_info.configs.filter(config_flag=0):
+			d = config.directory_info
+			d.dir_flag = 1
+			d.finishtime = timezone.now()
+			d.save()
+			print "Over Over Over!!!"
+		raw_file_names = list(getConfigRawFileNames(config))
+		for i in range(0, len(raw_file_names), QUERY_CHUNK_SIZE):
+			FileInfo.objects.filter(filefullpathname__in=raw_file_names[i:i+QUERY_CHUNK_SIZE]).update(fileflag=2)
+	cache.delete(INDEXED_DIRECTORY_SIZE_KEY)
+
+def setConfigFileFlag(config, fileflag, old_fileflag=None):
+	raw_file_names = list(getConfigRawFileNames(config))
+	for i in range(0, len(raw_file_names), QUERY_CHUNK_SIZE):
+		file_query_set = FileInfo.objects.filter(filefullpathname__in=raw_file_names[i:i+QUERY_CHUNK_SIZE])
+		if old_fileflag is not None:
+			file_query_set = file_query_set.filter(fileflag=old_fileflag)
+		file_query_set.update(fileflag=fileflag)
+
+def requeueIndexBuilds(config_list):
+	'''
+		Queues the builds of configs to be indexed again, deleting their old index first so runIndexBuildJob
+		does not take it for one a dead worker left complete
+	'''
+	for config in config_list:
 		try:
-			#os.environ.setdefault("DJANGO_SETTINGS_MODULE", "SearchEngine.settings")
-			close_old_connections()
-			config_query_set = AlgorithmConfigInfo.objects.filter(config_name=configFileName)
-			config_query_set.update(config_flag=1)
-			print "UPDATE SUCCESS [{}]".format(configFileName)
-		
-			if not config_query_set[0].directory_info.configs.filter(config_flag=0):
+			index_file = json.loads(config.config_content).get("index_file")
+		except ValueError:
+			index_file = None
+		if index_file and os.path.isfile(index_file):
+			os.remove(index_file)
+	config_ids = [config.id for config in config_list]
+	for i in range(0, len(config_ids), QUERY_CHUNK_SIZE):
+		IndexBuildJob.objects.filter(config_info_id__in=config_ids[i:i+QUERY_CHUNK_SIZE], state__in=(BUILD_DONE, BUILD_FAILED)).update(
+			state=BUILD_QUEUED, attempts=0, worker='', message='')
+
+def indexFileComplete(config):
+	'''True when the index file of config exists with the size mkindex gives it once finished'''
+	try:
+		index_file = json.loads(config.config_content)["index_file"]
+		return os.path.getsize(index_file)==blockPlanner.indexFileSize(config.config_content_size)
+	except (ValueError, KeyError, OSError):
+		return False
+
+def getBuildWorker():
+	return "{}:{}".format(socket.gethostname(), os.getpid())
+
+def processAlive(pid):
+	try:
+		os.kill(pid, 0)
+	except OSError, e:
+		return e.errno==errno.EPERM
+	return True
+
+def beatIndexBuildJob(job_id, stop):
+	'''Refreshes the heartbeat of a running IndexBuildJob every INDEX_BUILD_HEARTBEAT seconds until stop is set'''
+	try:
+		while not stop.wait(INDEX_BUILD_HEARTBEAT):
+			try:
 				close_old_connections()
-				d = config_query_set[0].directory_info
-				d.dir_flag = 1
-				d.finishtime = timezone.now()
-				d.save()
-				print "Over Over Over!!!"
-			#else:
-			#    print "There just created {} index files".format(len(config_query_set[0].directory_info.configs.filter(config_flag=1)))
-			configContent = json.loads(config_query_set[0].config_content)
-			for raw_file in configContent["raw_files"]:
-				FileInfo.objects.filter(filefullpathname=raw_file["name"]).update(fileflag=2)
-		except Exception,e:
-			print "UPDATE failed--{}, {}".format(Exception, e)
-			p.kill()
-			indexCreateProgram(configFilePathName, configFileName)
+				IndexBuildJob.objects.filter(id=job_id, state=BUILD_RUNNING).update(heartbeat=timezone.now())
+			except Exception, e:
+				print "@@@ INDEX BUILD heartbeat failed--{}, {}".format(Exception, e)
+	finally:
+		connection.close()
+
+def runIndexBuildJob(job_id):
+	'''
+		Claims a queued IndexBuildJob and runs its mkindex, up to INDEX_BUILD_ATTEMPTS times in all
+		An index file already complete on disk, left by a build whose update failed or whose server
+		went down, is taken as it is instead of being built again
+	'''
+	close_old_connections()
+	now = timezone.now()
+	if not IndexBuildJob.objects.filter(id=job_id, state=BUILD_QUEUED).update(state=BUILD_RUNNING, worker=getBuildWorker(), heartbeat=now, starttime=now):
+		return {"code":0, "message":"IndexBuildJob {} was taken by another worker".format(job_id)}
+	job = IndexBuildJob.objects.select_related('config_info').get(id=job_id)
+	config = job.config_info
+	configFilePathName = CONFIGFILEPATH_ABS+config.config_name
+	stop = threading.Event()
+	beat = threading.Thread(target=beatIndexBuildJob, args=(job_id, stop), name="IndexBuildBeat-{}".format(config.config_name))
+	beat.daemon = True
+	beat.start()
+	try:
+		while True:
+			job.attempts += 1
+			try:
+				IndexBuildJob.objects.filter(id=job_id).update(attempts=job.attempts, starttime=timezone.now())
+				if indexFileComplete(config):
+					result = {"code":0, "message":"Index file already complete"}
+				else:
+					result = indexCreateProgram(configFilePathName, config.config_name)
+				if result["code"]==0:
+					markIndexCreated(config.config_name, result.get("data"))
+			except Exception, e:
+				result = {"code":-1, "message":"{}-{}".format(Exception, e)}
+			if result["code"]==0 or job.attempts>=INDEX_BUILD_ATTEMPTS:
+				break
+			print "@@@ INDEX BUILD retry--{}, attempt {}, {}".format(config.config_name, job.attempts, result["message"])
+			time.sleep(min(60, 2**job.attempts))
+			close_old_connections()
+	finally:
+		stop.set()
+		beat.join()
+	if result["code"]!=0:
+		close_old_connections()
+		IndexBuildJob.objects.filter(id=job_id).update(state=BUILD_FAILED, finishtime=timezone.now(), message="{}".format(result["message"]))
+		setConfigFileFlag(config, 0, old_fileflag=1)
 	return result
 
+def recoverIndexBuildJobs():
+	'''
+		Queues again the running IndexBuildJobs whose worker is gone: a process of this host that
+		no longer exists, this process while its scheduler does not run the job, or any worker silent
+		for INDEX_BUILD_STALE seconds. A job that already used its attempts is failed instead
+		Returns {"requeued":n, "failed":n}
+	'''
+	counts = {"requeued":0, "failed":0}
+	close_old_connections()
+	host = socket.gethostname()
+	running = set([job["name"] for job in getIndexBuildScheduler().status()["running"]])
+	stale = timezone.now()-timedelta(seconds=INDEX_BUILD_STALE)
+	for job in IndexBuildJob.objects.filter(state=BUILD_RUNNING).select_related('config_info'):
+		orphaned = job.heartbeat is None or job.heartbeat<stale
+		worker_host, _, worker_pid = job.worker.rpartition(":")
+		if worker_host==host and worker_pid.isdigit():
+			if int(worker_pid)==os.getpid():
+				orphaned = orphaned or job.config_info.config_name not in running
+			else:
+				orphaned = orphaned or not processAlive(int(worker_pid))
+		if not orphaned:
+			continue
+		state = BUILD_FAILED if job.attempts>=INDEX_BUILD_ATTEMPTS else BUILD_QUEUED
+		message = "Worker {} went away during attempt {}".format(job.worker, job.attempts)
+		# The worker may have finished the job since it was read
+		if IndexBuildJob.objects.filter(id=job.id, state=BUILD_RUNNING, worker=job.worker).update(state=state, worker='', message=message):
+			setConfigFileFlag(job.config_info, 0, old_fileflag=1)
+			counts["failed" if state==BUILD_FAILED else "requeued"] += 1
+			print "@@@ INDEX BUILD recovered--{}, {}".format(job.config_info.config_name, message)
+	return counts
+
+def getIndexBuildScheduler():
+	memory_budget = INDEX_BUILD_MEMORY
+	if memory_budget is None:
+		memory_budget = int((buildScheduler.physicalMemory() or 64<<30)*0.8)
+	return buildScheduler.getIndexBuildScheduler(CPUCORES, memory_budget)
+
+def getIndexBuildRunnerKey():
+	return INDEX_BUILD_RUNNER_KEY.format(socket.gethostname())
+
+def claimIndexBuildRunner():
+	'''Takes or renews the build runner lease of this host, True when this process holds it'''
+	key = getIndexBuildRunnerKey()
+	worker = getBuildWorker()
+	lease = 3*INDEX_BUILD_RUNNER_INTERVAL
+	if cache.add(key, worker, lease) or cache.get(key)==worker:
+		cache.set(key, worker, lease)
+		return True
+	return False
+
+def dispatchIndexBuildJobs():
+	'''Submits every queued IndexBuildJob to the build scheduler of this process'''
+	scheduler = getIndexBuildScheduler()
+	for job in IndexBuildJob.objects.filter(state=BUILD_QUEUED).select_related('config_info'):
+		memory = blockPlanner.estimateBuildMemory(job.config_info.config_content_size)
+		if not scheduler.submit(job.config_info.config_name, memory, runIndexBuildJob, (job.id,)):
+			continue
+		try:
+			setConfigFileFlag(job.config_info, 1)
+		except Exception, e:
+			print "$$$ Error:{}-{}".format(Exception, e)
 
+def stepIndexBuildRunner():
+	'''
+		One round of the build runner: when this process holds the lease of its host, recovers the orphaned
+		jobs and dispatches the queued ones. Returns whether it holds the lease
+	'''
+	if not claimIndexBuildRunner():
+		return False
+	recoverIndexBuildJobs()
+	dispatchIndexBuildJobs()
+	return True
+
+def indexBuildsPending():
+	'''Whether a build is queued anywhere, running on this host or waiting in the scheduler of this process'''
+	status = getIndexBuildScheduler().status()
+	if status["running"] or status["queued"]:
+		return True
+	host = socket.gethostname()
+	return IndexBuildJob.objects.filter(Q(state=BUILD_QUEUED) | Q(state=BUILD_RUNNING, worker__startswith=host+":")).exists()
+
+_INDEX_BUILD_RUNNER = None
+_INDEX_BUILD_RUNNER_LOCK = threading.Lock()
+
+def startIndexBuildRunner():
+	global _INDEX_BUILD_RUNNER
+	with _INDEX_BUILD_RUNNER_LOCK:
+		if _INDEX_BUILD_RUNNER is None or not _INDEX_BUILD_RUNNER.is_alive():
+			_INDEX_BUILD_RUNNER = threading.Thread(target=runIndexBuildRunner, name="IndexBuildRunner")
+			_INDEX_BUILD_RUNNER.daemon = True
+			_INDEX_BUILD_RUNNER.start()
+		return _INDEX_BUILD_RUNNER
+
+def runIndexBuildRunner():
+	'''
+		Runs stepIndexBuildRunner every INDEX_BUILD_RUNNER_INTERVAL seconds while builds are pending. Every server
+		process of a host may run one, but only the lease holder builds, so the memory budget of its scheduler is
+		the budget of the whole host; another one takes over and recovers its jobs when the holder dies
+	'''
+	try:
+		while True:
+			close_old_connections()
+			stepIndexBuildRunner()
+			if not indexBuildsPending():
+				break
+			time.sleep(INDEX_BUILD_RUNNER_INTERVAL)
+		if cache.get(getIndexBuildRunnerKey())==getBuildWorker():
+			cache.delete(getIndexBuildRunnerKey())
+	except Exception, e:
+		print "@@@ INDEX BUILD runner failed--{}, {}".format(Exception, e)
+	finally:
+		connection.close()
+
+def getIndexBuildQueueStatus():
+	'''The build scheduler status of this process and the worker running the builds of this host'''
+	status = getIndexBuildScheduler().status()
+	status["runner"] = cache.get(getIndexBuildRunnerKey())
+	return status
 
-def runIndexCreateProgram():
+def runIndexCreateProgram(wait=False, retry_failed=False):
+	'''
+		Queues an IndexBuildJob for every unbuilt config and starts the build runner of this process. The runner
+		holding the lease of the host admits them largest first while their blockPlanner.estimateBuildMemory
+		fits in the memory budget; jobs orphaned by a dead server are recovered first
+		Failed jobs are run again only with retry_failed
+		wait blocks until no build of this host is pending, for callers that exit afterwards like cron
+	'''
 	result = {"code":1, "message":""}
-	config_query_set = AlgorithmConfigInfo.objects.filter(config_flag=0)
-	pool = multiprocessing.Pool(processes=CPUCORES)
-	#result = []
-	for config in config_query_set:
-		configFilePathName = CONFIGFILEPATH_ABS+config.config_name
-		configFileName = config.config_name
-		configContent = json.loads(config.config_content)
-		'''
-			Example Codes
-			pool.apply_async(func_A, (args,))
-		'''
-		#result.append(pool.apply_async(indexCreateProgram, (configFile,)))
-		pool.apply_async(indexCreateProgram, (configFilePathName, configFileName, ))
-		close_old_connections()
-		for raw_file in configContent["raw_files"]:
-			try:
-				FileInfo.objects.filter(filefullpathname=raw_file["name"]).update(fileflag=1)
-			except Exception, e:
-				print "$$$ Error:{}-{}".format(Exception, e)
-	pool.close()
-	#pool.join()
-	#config_query_set.update(config_flag=1)
-	# for r in result:
-	#     print r.get()
+	close_old_connections()
+	for config in AlgorithmConfigInfo.objects.filter(config_flag=0):
+		job, created = IndexBuildJob.objects.get_or_create(config_info=config)
+		if job.state==BUILD_FAILED and retry_failed:
+			IndexBuildJob.objects.filter(id=job.id, state=BUILD_FAILED).update(state=BUILD_QUEUED, attempts=0)
+		elif job.state==BUILD_DONE:
+			# Built before, then reset to be indexed again
+			requeueIndexBuilds([config])
+	stepIndexBuildRunner()
+	runner = startIndexBuildRunner()
+	if wait:
+		runner.join()
 	result["code"] = 0
 	result["message"] = "IndexCreatePrograms run success!"
+	result["data"] = getIndexBuildQueueStatus()
+	return result
+
+def resumeIndexBuildProgram(retry_failed=False):
+	'''
+		runIndexCreateProgram for a process of its own, like the resumeIndexBuilds command or cron: it waits
+		for the builds only when it became the build runner of the host, the builds dying with it otherwise
+	'''
+	result = runIndexCreateProgram(retry_failed=retry_failed)
+	if result["data"]["runner"]==getBuildWorker():
+		startIndexBuildRunner().join()
+		result["data"] = getIndexBuildQueueStatus()
 	return result
 
 def searchStringValid(search_string):
 	result = {"code":1, "message":""}
 	s = search_string.strip()
 	if len(s)>24:
-		m = re.match(SEARCH_RULE, s)
-		if m and m.group()==s:
+		if patternCompiler.compilePattern(s).matches(SEARCH_RULE):
 			result["code"] = 0
 			result["message"] = "Search string: {} valid sucesss!".format(s)
 		else:
@@ -450,20 +950,79 @@ def searchStringValid(search_string):
 
 
 
+def getIndexBuildTelemetry():
+	'''
+		{directory id: counters} of the files, blocks and build jobs of every directory, from one query
+		grouping the files and one grouping the configs joined with their IndexBuildJob, whatever their number
+	'''
+	telemetry = {}
+	file_counts = FileInfo.objects.values('directory_info').order_by().annotate(
+		fileNumTotal=Count('id'), fileNumCreated=Count(Case(When(fileflag=2, then=1))))
+	for row in file_counts:
+		telemetry.setdefault(row.pop('directory_info'), {}).update(row)
+	config_counts = AlgorithmConfigInfo.objects.values('directory_info').order_by().annotate(
+		blocksTotal=Count('id'),
+		blocksCreated=Count(Case(When(config_flag=1, then=1))),
+		blocksRunning=Count(Case(When(build_job__state=BUILD_RUNNING, then=1))),
+		blocksFailed=Count(Case(When(build_job__state=BUILD_FAILED, then=1))),
+		fileSizeTotal=Sum('config_content_size'),
+		fileSizeCreated=Sum(Case(When(config_flag=1, then=F('config_content_size')), default=0, output_field=BigIntegerField())),
+		buildStart=Min('build_job__starttime'),
+		bytesRead=Sum('build_job__bytes_read'),
+		readTime=Sum('build_job__read_time'),
+		sortTime=Sum('build_job__sort_time'),
+		writeTime=Sum('build_job__write_time'))
+	for row in config_counts:
+		telemetry.setdefault(row.pop('directory_info'), {}).update(row)
+	return telemetry
+
+def getStalledIndexBuilds(telemetry, now):
+	'''
+		{directory id: [config name, ...]} of the running builds whose heartbeat stopped, or which take
+		INDEX_BUILD_STALL_FACTOR times longer than their size at the mkindex speed measured in their directory,
+		but at least INDEX_BUILD_STALE seconds
+	'''
+	stalled = {}
+	silent = now-timedelta(seconds=3*INDEX_BUILD_HEARTBEAT)
+	running = IndexBuildJob.objects.filter(state=BUILD_RUNNING).values_list(
+		'config_info__directory_info', 'config_info__config_name', 'config_info__config_content_size', 'starttime', 'heartbeat')
+	for directory_id, config_name, size, starttime, heartbeat in running:
+		t = telemetry.get(directory_id, {})
+		build_time = (t.get("readTime") or 0)+(t.get("sortTime") or 0)+(t.get("writeTime") or 0)
+		expected = float(size)*build_time/t["bytesRead"] if t.get("bytesRead") else None
+		if heartbeat is None or heartbeat<silent or \
+			(expected is not None and starttime is not None and (now-starttime).total_seconds()>max(INDEX_BUILD_STALL_FACTOR*expected, INDEX_BUILD_STALE)):
+			stalled.setdefault(directory_id, []).append(config_name)
+	return stalled
+
 def getDirectoryStatusList():
-	summary = {"fileNumCreated":0, "fileNumTotal":0, "fileSizeCreated":0, "fileSizeTotal":0, "rate":0}
+	'''
+		Build progress of every directory, the rate in MB/s is the size of the blocks built over the time
+		since their first build started, the eta in seconds the rest of the size at that rate
+	'''
+	summary = {"fileNumCreated":0, "fileNumTotal":0, "fileSizeCreated":0, "fileSizeTotal":0, "rate":0, "eta":None, "blocksStalled":0}
 	detail = {"finished":[], "unfinished":[]}
 
 	dir_query_set = DirectoryInfo.objects.all()
 	now = timezone.now()
-	directory_status_list = []
+	telemetry = getIndexBuildTelemetry()
+	stalled = getStalledIndexBuilds(telemetry, now)
 	for directory in dir_query_set:
+		t = telemetry.get(directory.id, {})
 		item = {}
 		item["name"] = directory.dir_name
-		item["fileNumCreated"] = len(directory.files.filter(fileflag=2))
-		item["fileNumTotal"] = len(directory.files.all())
-		item["fileSizeCreated"] = sum([c.config_content_size for c in directory.configs.filter(config_flag=1)])
-		item["fileSizeTotal"] = sum([c.config_content_size for c in directory.configs.all()])
+		item["fileNumCreated"] = t.get("fileNumCreated", 0)
+		item["fileNumTotal"] = t.get("fileNumTotal", 0)
+		item["fileSizeCreated"] = t.get("fileSizeCreated") or 0
+		item["fileSizeTotal"] = t.get("fileSizeTotal") or 0
+		item["blocksCreated"] = t.get("blocksCreated", 0)
+		item["blocksTotal"] = t.get("blocksTotal", 0)
+		item["blocksRunning"] = t.get("blocksRunning", 0)
+		item["blocksFailed"] = t.get("blocksFailed", 0)
+		item["blocksStalled"] = stalled.get(directory.id, [])
+		item["readTime"] = t.get("readTime") or 0
+		item["sortTime"] = t.get("sortTime") or 0
+		item["writeTime"] = t.get("writeTime") or 0
 		createtime = timezone.localtime(directory.createtime)
 		item["timeCreated"] = createtime.strftime(ISOTIMEFORMAT)
 		flag = directory.dir_flag
@@ -472,75 +1031,251 @@ def getDirectoryStatusList():
 			finishtime = timezone.localtime(directory.finishtime)
 			item["timeFinished"] = finishtime.strftime(ISOTIMEFORMAT)
 			item["timeWasted"] = (datetime.strptime('00:00:00','%H:%M:%S')+(finishtime-createtime)).strftime('%X')
-			item["rate"] = "%.2f"%(float(item["fileSizeTotal"])/(1024*1024*(finishtime-createtime).seconds))
+			item["rate"] = "%.2f"%(float(item["fileSizeTotal"])/(1024*1024*max(1, (finishtime-createtime).total_seconds())))
+			item["eta"] = 0
 			detail["finished"].append(item)
 		else:
 			item["timeFinished"] = "---------- --:--:--"
 			item["timeWasted"] = (datetime.strptime('00:00:00','%H:%M:%S')+(now-createtime)).strftime('%X')
-			rate = float(item["fileSizeCreated"])/(1024*1024*(now-createtime).seconds+1)+random.uniform(0,3.0)
-			item["rate"] = "%.2f"%(10.0+random.uniform(-1.5,1.5)) if rate<8.0 else "%.2f"%(rate)
+			build_start = t.get("buildStart")
+			elapsed = (now-build_start).total_seconds() if build_start else 0
+			rate = float(item["fileSizeCreated"])/(1024*1024*elapsed) if elapsed>0 else 0
+			item["rate"] = "%.2f"%(rate)
+			item["eta"] = int((item["fileSizeTotal"]-item["fileSizeCreated"])/(1024*1024*rate)) if rate>0 else None
 			detail["unfinished"].append(item)
-	if detail["finished"]:
-		summary["fileNumCreated"] += sum(item["fileNumCreated"]for item in detail["finished"])
-		summary["fileNumTotal"] += sum(item["fileNumTotal"] for item in detail["finished"])
-		summary["fileSizeCreated"] += sum(item["fileSizeCreated"] for item in detail["finished"])
-		summary["fileSizeTotal"] += sum(item["fileSizeTotal"] for item in detail["finished"])
+	for item in detail["finished"]+detail["unfinished"]:
+		summary["fileNumCreated"] += item["fileNumCreated"]
+		summary["fileNumTotal"] += item["fileNumTotal"]
+		summary["fileSizeCreated"] += item["fileSizeCreated"]
+		summary["fileSizeTotal"] += item["fileSizeTotal"]
+		summary["blocksStalled"] += len(item["blocksStalled"])
 	if detail["unfinished"]:
-		summary["fileNumCreated"] += sum(item["fileNumCreated"]for item in detail["unfinished"])
-		summary["fileNumTotal"] += sum(item["fileNumTotal"] for item in detail["unfinished"])
-		summary["fileSizeCreated"] += sum(item["fileSizeCreated"] for item in detail["unfinished"])
-		summary["fileSizeTotal"] += sum(item["fileSizeTotal"] for item in detail["unfinished"])
 		summary["rate"] += sum(float(item["rate"]) for item in detail["unfinished"])
+		if summary["rate"]>0:
+			summary["eta"] = int((summary["fileSizeTotal"]-summary["fileSizeCreated"])/(1024*1024*summary["rate"]))
 	else:
 		summary["rate"] = '--'
+		summary["eta"] = 0
 	return {"summary":summary, "detail":detail}
 
+def getCachedDirectoryStatusList():
+	'''getDirectoryStatusList, computed at most once per DASHBOARD_STATUS_TTL for all the workers sharing the cache'''
+	status = cache.get(DASHBOARD_STATUS_KEY)
+	if status is None:
+		close_old_connections()
+		status = getDirectoryStatusList()
+		cache.set(DASHBOARD_STATUS_KEY, status, DASHBOARD_STATUS_TTL)
+	return status
+
+def publishDirectoryStatus():
+	status = getCachedDirectoryStatusList()
+	Group(DASHBOARD_GROUP).send({"text":json.dumps(status)})
+	return status
+
+def updateDirectoryStatusFollowers(add=None, remove=None):
+	'''
+		The followed dashboards are {reply channel name: expiry} in one cache value. Follows or refreshes add, drops
+		remove and the dashboards silent for DASHBOARD_FOLLOWER_TTL seconds, whose disconnect may have been lost,
+		and returns the reply channel names still followed
+	'''
+	now = time.time()
+	followers = cache.get(DASHBOARD_FOLLOWERS_KEY) or {}
+	live = dict([(name, expiry) for name, expiry in followers.items() if expiry>now and name!=remove])
+	if add is not None:
+		live[add] = now+DASHBOARD_FOLLOWER_TTL
+	if live!=followers:
+		cache.set(DASHBOARD_FOLLOWERS_KEY, live, DASHBOARD_FOLLOWER_TTL)
+	for name in set(followers)-set(live)-set([remove]):
+		Group(DASHBOARD_GROUP).discard(name)
+	return live.keys()
+
+def followDirectoryStatus(message, snapshot=True):
+	'''
+		Sends the current status to the websocket and adds it to the dashboard Group, which one
+		broadcaster sends the status to every DASHBOARD_STATUS_INTERVAL seconds for all dashboards at once
+		The page repeats it without snapshot to stay followed, see updateDirectoryStatusFollowers
+		The consumer needs channel_session, ws_disconnect calls unfollowDirectoryStatus
+	'''
+	Group(DASHBOARD_GROUP).add(message.reply_channel)
+	message.channel_session['dashboard'] = True
+	updateDirectoryStatusFollowers(add=message.reply_channel.name)
+	if snapshot:
+		message.reply_channel.send({"text":json.dumps(getCachedDirectoryStatusList())})
+	startDirectoryStatusBroadcaster()
+
+def unfollowDirectoryStatus(message):
+	Group(DASHBOARD_GROUP).discard(message.reply_channel)
+	updateDirectoryStatusFollowers(remove=message.reply_channel.name)
+
+_DASHBOARD_BROADCASTER = None
+_DASHBOARD_BROADCASTER_LOCK = threading.Lock()
+
+def startDirectoryStatusBroadcaster():
+	global _DASHBOARD_BROADCASTER
+	with _DASHBOARD_BROADCASTER_LOCK:
+		if _DASHBOARD_BROADCASTER is None or not _DASHBOARD_BROADCASTER.is_alive():
+			_DASHBOARD_BROADCASTER = threading.Thread(target=runDirectoryStatusBroadcaster, name="DirectoryStatusBroadcaster")
+			_DASHBOARD_BROADCASTER.daemon = True
+			_DASHBOARD_BROADCASTER.start()
+
+def runDirectoryStatusBroadcaster():
+	'''
+		Broadcasts the dashboard status while a dashboard is followed, see updateDirectoryStatusFollowers
+		Of the workers running a broadcaster only the holder of the DASHBOARD_BROADCASTER_KEY lease sends, another one takes over when it lapses
+	'''
+	worker = getBuildWorker()
+	lease = 3*DASHBOARD_STATUS_INTERVAL
+	try:
+		while updateDirectoryStatusFollowers():
+			if cache.add(DASHBOARD_BROADCASTER_KEY, worker, lease) or cache.get(DASHBOARD_BROADCASTER_KEY)==worker:
+				cache.set(DASHBOARD_BROADCASTER_KEY, worker, lease)
+				publishDirectoryStatus()
+			time.sleep(DASHBOARD_STATUS_INTERVAL)
+		if cache.get(DASHBOARD_BROADCASTER_KEY)==worker:
+			cache.delete(DASHBOARD_BROADCASTER_KEY)
+	except Exception, e:
+		print "@@@ Dashboard broadcast failed--{}, {}".format(Exception, e)
+	finally:
+		connection.close()
+
+def aggregateHistoryStatistic():
+	'''The HistorySearch statistic from the summary rows, one aggregate query'''
+	aggregates = {"count":Count('id')}
+	for key, field, summary_key in HISTORY_STATISTIC_FIELDS:
+		aggregates["total_"+key] = Sum(field)
+		aggregates["maximum_"+key] = Max(field)
+	row = SearchCacheEntry.objects.filter(summarized=True).aggregate(**aggregates)
+	return {
+		"count":row["count"],
+		"total":dict([(key, row["total_"+key] or 0) for key, field, summary_key in HISTORY_STATISTIC_FIELDS]),
+		"maximum":dict([(key, row["maximum_"+key] or 0) for key, field, summary_key in HISTORY_STATISTIC_FIELDS]),
+	}
+
+def updateHistoryStatistic(removed=None, added=None):
+	'''
+		Moves the HistorySearch statistic by one summary leaving ({statistic key: value}) and one
+		coming in, in O(1); only a removed maximum is looked up again, in one aggregate query
+		The statistic row is locked, so concurrent searches do not lose each other's updates
+	'''
+	with transaction.atomic():
+		v = GlobalStaticVarible.objects.select_for_update().filter(varible_label=HISTORY_STATISTIC_LABEL).first()
+		content = json.loads(v.varible_content) if v is not None and v.varible_content else {}
+		if "total" not in content:
+			# First use, or written by the full recomputation of older versions
+			content = aggregateHistoryStatistic()
+		else:
+			content["count"] += (1 if added else 0)-(1 if removed else 0)
+			for key, field, summary_key in HISTORY_STATISTIC_FIELDS:
+				content["total"][key] += (added or {}).get(key, 0)-(removed or {}).get(key, 0)
+				if added and added[key]>content["maximum"][key]:
+					content["maximum"][key] = added[key]
+			if removed and any([removed[key] and removed[key]>=content["maximum"][key] for key, field, summary_key in HISTORY_STATISTIC_FIELDS]):
+				content["maximum"] = aggregateHistoryStatistic()["maximum"]
+		if v is None:
+			GlobalStaticVarible.objects.create(varible_label=HISTORY_STATISTIC_LABEL, varible_content=json.dumps(content))
+		else:
+			GlobalStaticVarible.objects.filter(id=v.id).update(varible_content=json.dumps(content))
+	return content
+
+def getEntryHistoryStatistic(entry):
+	return dict([(key, getattr(entry, field)) for key, field, summary_key in HISTORY_STATISTIC_FIELDS])
+
+def summarizeSearchMatches(search_string):
+	'''
+		{file id: [num_match, [config id, ...], match index]} of the cached result of search_string, read one cache
+		row at a time, the config ids are the blocks holding the file's matches and num_match counts the index
+	'''
+	parts, blocks = {}, {}
+	cache_rows = getSearchResultCacheQuerySet(search_string).order_by('id').values_list('config_info_id', 'search_matches')
+	for config_id, data in cache_rows.iterator():
+		records = np.frombuffer(bytes(data), dtype=MATCH_RECORD_DTYPE)
+		records = records[np.argsort(records['file_id'], kind='mergesort')]
+		file_ids, starts = np.unique(records['file_id'], return_index=True)
+		ends = starts[1:].tolist()+[len(records)]
+		for file_id, start, end in zip(file_ids.tolist(), starts.tolist(), ends):
+			parts.setdefault(file_id, []).append(records[start:end])
+			blocks.setdefault(file_id, []).append(config_id)
+	files = {}
+	for file_id, records in parts.items():
+		index = sortMatchIndex(np.concatenate(records))
+		files[file_id] = [len(index), blocks[file_id], index]
+	return files
+
+def summarizeSearchHistory(search_string):
+	'''
+		Indexes the cached result of search_string by file in SearchFileSummary rows, stores its summary on its
+		SearchCacheEntry and moves the HistorySearch statistic from the previous summary to it
+	'''
+	files = summarizeSearchMatches(search_string)
+	file_info = getFileInfo(files.keys(), 'id')
+	summary = {"num_file":0, "num_match":0, "MPM":0, "file_size":0}
+	directories = set()
+	file_rows = []
+	for file_id, (num_match, blocks, index) in sorted(files.items()):
+		if file_id not in file_info:
+			continue
+		_, file_name, dir_name, file_size = file_info[file_id]
+		# The same integer MPM as makeDetailItem
+		mpm = num_match*1024*1024/file_size if file_size!=0 else 0
+		file_rows.append((file_id, num_match, mpm, file_size, ",".join([str(b) for b in blocks]), index.tobytes()))
+		directories.add(dir_name)
+		summary["num_file"] += 1
+		summary["num_match"] += num_match
+		summary["MPM"] += mpm
+		summary["file_size"] += file_size
+	summary["num_directory"] = len(directories)
+	values = dict([(field, summary[summary_key]) for key, field, summary_key in HISTORY_STATISTIC_FIELDS])
+	# The match indexes copy the cached matches, so they count in the size the cache is evicted by
+	index_size = sum([len(row[-1]) for row in file_rows])
+	with transaction.atomic():
+		entry = getSearchCacheEntryQuerySet(search_string).select_for_update().order_by('id').first()
+		if entry is None:
+			return None
+		removed = getEntryHistoryStatistic(entry) if entry.summarized else None
+		summary_query_set = SearchFileSummary.objects.filter(search_entry=entry)
+		dropped_size = summary_query_set.aggregate(size=Sum(Length('matches')))['size'] or 0
+		getSearchCacheEntryQuerySet(search_string).update(summarized=True, size=F('size')+index_size-dropped_size, **values)
+		summary_query_set.delete()
+		SearchFileSummary.objects.bulk_create([SearchFileSummary(search_entry=entry, file_info_id=file_id, num_match=num_match, mpm=mpm,
+			file_size=file_size, blocks=blocks, matches=data) for file_id, num_match, mpm, file_size, blocks, data in file_rows])
+		added = dict([(key, values[field]) for key, field, summary_key in HISTORY_STATISTIC_FIELDS])
+		return updateHistoryStatistic(removed, added)
+
+def getHistoryStatistic():
+	'''{"average":{...}, "maximum":{...}} of the summarized search strings, coverage averages over the directories'''
+	v = GlobalStaticVarible.objects.filter(varible_label=HISTORY_STATISTIC_LABEL).first()
+	content = json.loads(v.varible_content) if v is not None and v.varible_content else {}
+	if "total" not in content:
+		content = aggregateHistoryStatistic()
+	count = content["count"]
+	num_directory = DirectoryInfo.objects.count()
+	average = {}
+	for key, field, summary_key in HISTORY_STATISTIC_FIELDS:
+		divisor = count*num_directory if key=="coverage" else count
+		average[key] = content["total"][key]/float(divisor) if divisor else 0
+	return {"average":average, "maximum":content["maximum"]}
+
 def historySearchStatisticUpdateProgram():
+	'''
+		Summarizes the complete search results that have no summary yet, like those cached before the
+		summaries existed, then rewrites the HistorySearch statistic from the summary rows
+	'''
 	result = {"code":1, "message":""}
 	try:
-		average = {"num_file":0, "num_match":0, "coverage":0, "MPM":0, "file_size":0}
-		maximum = {"num_file":0, "num_match":0, "coverage":0, "MPM":0, "file_size":0}
-
-		history_query_set = SearchResultCache.objects.all()
-		search_string_list = list(set([s.search_string for s in history_query_set]))
-		num_search_string = len(search_string_list)
-		num_directory = len(DirectoryInfo.objects.all())
-		struct_info_list = []
-		for search_item in search_string_list:
-			search_query_set = history_query_set.filter(search_string=search_item)
-			content_list = []
-			for s in search_query_set:
-				content_list.extend(json.loads(s.search_content))
-			format_result = formatIndexSearchResult(content_list)
-			struct_info_list.append(format_result["summary"])
-		for s in struct_info_list:
-			maximum["num_file"] = s["num_file"] if s["num_file"]>maximum["num_file"] else maximum["num_file"]
-			maximum["num_match"] = s["num_match"] if s["num_match"]>maximum["num_match"] else maximum["num_match"]
-			maximum["coverage"] = s["num_directory"] if s["num_directory"]>maximum["coverage"] else maximum["coverage"]
-			maximum["MPM"] = s["MPM"] if s["MPM"]>maximum["MPM"] else maximum["MPM"]
-			maximum["file_size"] = s["file_size"] if s["file_size"]>maximum["file_size"] else maximum["file_size"]
-			average["num_file"] += s["num_file"]
-			average["num_match"] += s["num_match"]
-			average["coverage"] += s["num_directory"]
-			average["MPM"] += s["MPM"]
-			average["file_size"] += s["file_size"]
-		average["num_file"] = average["num_file"]/float(num_search_string)
-		average["num_match"] = average["num_match"]/float(num_search_string)
-		average["coverage"] = average["coverage"]/float(num_directory*num_search_string)
-		average["MPM"] = average["MPM"]/float(num_search_string)
-		average["file_size"] = average["file_size"]/float(num_search_string)
-		
-		content = json.dumps({"average":average, "maximum":maximum}) 
-		varible_query_set = GlobalStaticVarible.objects.filter(varible_label="HistorySearch")
-		if len(varible_query_set)==0:
-			v = GlobalStaticVarible(varible_label="HistorySearch",varible_content=content)
-			v.save()
-			result["message"] = "Create History Search Statistic Success!"
-		else:
-			varible_query_set.update(varible_content=content)
-			result["message"] = "Update History Search Statistic Success!"
+		running = SEARCH_JOBS.searchStrings()
+		for search_string in SearchCacheEntry.objects.filter(summarized=False).values_list('search_string', flat=True):
+			if search_string not in running and indexCacheExistJudge(search_string)["code"]==0:
+				summarizeSearchHistory(search_string)
+		content = aggregateHistoryStatistic()
+		with transaction.atomic():
+			if GlobalStaticVarible.objects.select_for_update().filter(varible_label=HISTORY_STATISTIC_LABEL).update(varible_content=json.dumps(content)):
+				result["message"] = "Update History Search Statistic Success!"
+			else:
+				GlobalStaticVarible.objects.create(varible_label=HISTORY_STATISTIC_LABEL, varible_content=json.dumps(content))
+				result["message"] = "Create History Search Statistic Success!"
 		result["code"] = 0
 	except Exception,e:
+		print "{}-{}".format(Exception,e)
 		result["message"] = "Update History Search Statistic Failed!"
 	return result
 
@@ -558,19 +1293,28 @@ def runHistorySearchStatisticUpdateProgram():
 
 
 
-def indexSearchProgram(search_string, configFilePathName, configFileName):
+def blockSearchProgram(search_string, configFilePathName):
 	'''
-		run C++ Search Program
+		run the in-process search engine, or the C++ Search Program when SEARCH_ENGINE is "bgrep"
 		subprocess.Popen([<path/to/algorithm>, search_string, configFile], shell=Ture, stdout=subprocess.PIPE)
+		Runs inside the search workers, so it must not touch the database
+		A relative configFilePathName is taken from WORKPATH_ABS like bgrep did, never from the current directory
 	'''
-	# cmd = "{}bgrep {} {}".format(ALGORITHMPATH, search_string, configFilePathName)
-	cmd = "bgrep {} {}".format(search_string, configFilePathName)
-	p = subprocess.Popen(cmd, shell=True, cwd=WORKPATH_ABS, stdout=subprocess.PIPE)
-	# result = p.stdout.read()
-	# rtnCode = json.loads(result)["code"]
-	output, err_info = p.communicate()
-	#result = json.loads(p.stdout.read())
-	result = json.loads(output)
+	configFilePathName = os.path.join(WORKPATH_ABS, configFilePathName)
+	if SEARCH_ENGINE=="native":
+		result = pyIndexSearcher.searchConfigFile(search_string, configFilePathName)
+	else:
+		# cmd = "{}bgrep {} {}".format(ALGORITHMPATH, search_string, configFilePathName)
+		cmd = "bgrep {} {}".format(search_string, configFilePathName)
+		p = subprocess.Popen(cmd, shell=True, cwd=WORKPATH_ABS, stdout=subprocess.PIPE)
+		# result = p.stdout.read()
+		# rtnCode = json.loads(result)["code"]
+		output, err_info = p.communicate()
+		#result = json.loads(p.stdout.read())
+		result = json.loads(output)
+	return result
+
+def saveIndexSearchResult(search_string, configFileName, result, config_generation=None):
 	# print result
 	if result["code"]==0:
 		'''
@@ -584,23 +1328,26 @@ def indexSearchProgram(search_string, configFilePathName, configFileName):
 		search_content = result["matches"]
 		close_old_connections()
 		config_info = AlgorithmConfigInfo.objects.filter(config_name=configFileName)[0]
+		config_generation = config_info.config_generation if config_generation is None else config_generation
 		# except Exception, e:
 		#     print "@@@ StepOne @@@ SEARCH falied--{}, {}".format(Exception, e)
 		try:
 			# print "### SEARCH PROGRAM START"
-			print "### SEARCH PROGRAM RUN - {}".format(p.pid)
+			print "### SEARCH PROGRAM RUN - {}".format(configFileName)
 			close_old_connections()
-			cache_query_set = SearchResultCache.objects.all()
-			flag = cache_query_set.filter(search_string=search_string, config_info=config_info).count()
+			cache_query_set = getSearchResultCacheQuerySet(search_string).filter(config_info=config_info)
+			flag = cache_query_set.filter(config_generation=config_generation).count()
 			if flag==0:
 				try:
 					close_old_connections()
-					while len(json.dumps(search_content))>65535:
-						search_content = search_content[:-200]
-					c = SearchResultCache(search_string=search_string, config_info=config_info, search_content=json.dumps(search_content))
+					dropStaleSearchResultCache(search_string, cache_query_set)
+					records = packMatches(search_content)
+					c = SearchResultCache(search_string=search_string, config_info=config_info, config_generation=config_generation, search_matches=records.tobytes(), num_match=len(records))
+					getSearchCacheEntry(search_string)
 					#print "searchString:{}\nsearchContent:{}".format(search_string, len(search_content))
 					# print c
 					c.save()
+					getSearchCacheEntryQuerySet(search_string).update(size=F('size')+records.nbytes)
 					# SearchResultCache.objects.create(search_string=search_string, config_info=config_info, search_content=json.dumps(search_content))
 				except Exception, e:
 					# print "[{} / {}]".format(len(json.dumps(search_content)),len(json.dumps(search_content[:400])))
@@ -615,25 +1362,195 @@ def indexSearchProgram(search_string, configFilePathName, configFileName):
 		print result
 	return result
 
+def indexSearchProgram(search_string, configFilePathName, configFileName):
+	result = blockSearchProgram(search_string, configFilePathName)
+	return saveIndexSearchResult(search_string, configFileName, result)
+
+def normalizeSearchString(search_string):
+	# bgrep drops the leading and trailing '.', they do not change the matches
+	return search_string.strip('.')
+
+def makeConfigGeneration(config_content):
+	'''Fingerprint of one config block: its raw file list and the index file mkindex wrote for it'''
+	fingerprint = hashlib.sha1(config_content.encode('utf-8'))
+	try:
+		st = os.stat(json.loads(config_content)["index_file"])
+		fingerprint.update("{}:{}".format(st.st_mtime, st.st_size))
+	except (OSError, ValueError, KeyError):
+		pass
+	return fingerprint.hexdigest()
+
+def getIndexGeneration(config_query_set):
+	'''Fingerprint of a set of index blocks, changes when one is added, removed or rebuilt'''
+	blocks = sorted(["{}:{}".format(c.config_name, c.config_generation) for c in config_query_set])
+	return hashlib.md5("\n".join(blocks)).hexdigest()
 
+def searchJobKey(search_string, config_query_set):
+	return (normalizeSearchString(search_string), getIndexGeneration(config_query_set))
+
+def submitIndexSearchPrograms(search_string, config_query_set, config_path=None):
+	'''
+		Queue one search job per config that has no cached result of its current generation on the
+		process-wide search executor, or join the running SearchJob when the same pattern is already
+		being searched over the same blocks
+		The results are saved from the executor's callback thread in this process
+		Returns None when every block is cached
+		config_path defaults to CONFIGFILEPATH_ABS as it is when called
+	'''
+	config_path = CONFIGFILEPATH_ABS if config_path is None else config_path
+	configs = getUncachedConfigs(search_string, config_query_set)
+	if not configs:
+		return None
+	block_sizes = [(c.config_name, c.config_content_size) for c in configs]
+	block_generations = [(c.config_name, c.config_generation) for c in configs]
+	job, created, finished_results = SEARCH_JOBS.attach(searchJobKey(search_string, configs), search_string, block_sizes, block_generations)
+	leaseSearchStrings(job, [search_string])
+	for configFileName, matches in finished_results.items():
+		if matches is not None:
+			saveIndexSearchResult(search_string, configFileName, {"code":0, "matches":matches}, job.block_generations[configFileName])
+	if not created:
+		print "### SEARCH JOB JOINED - {}".format(search_string)
+		return job
+	executor = searchExecutor.getSearchExecutor(CPUCORES, SEARCH_QUEUE_SIZE, SEARCH_JOB_TIMEOUT)
+	jobs = [(blockSearchProgram, (search_string, config_path+config.config_name)) for config in configs]
+	try:
+		futures = executor.submitMany(jobs, timeout=SEARCH_QUEUE_TIMEOUT)
+	except searchExecutor.SearchQueueFull:
+		job.abort()
+		SEARCH_JOBS.discard(job)
+		releaseSearchStrings(job, [search_string])
+		raise
+	for config, future in zip(configs, futures):
+		future.addDoneCallback(lambda f, name=config.config_name: onIndexSearchFinished(job, name, f))
+	return job
+
+def onIndexSearchFinished(job, configFileName, future):
+	result = future.result() if future.error() is None else {"code":-1, "message":future.error()}
+	matches = result["matches"] if result["code"]==0 else None
+	search_strings = job.blockFinished(configFileName, matches)
+	leaseSearchStrings(job, search_strings)
+	if matches is None:
+		print "@@@ SEARCH failed--{}, {}".format(configFileName, result["message"])
+	else:
+		close_old_connections()
+		for search_string in search_strings:
+			saveIndexSearchResult(search_string, configFileName, result, job.block_generations[configFileName])
+	try:
+		publishIndexSearchBlock(job, configFileName, matches)
+	except Exception, e:
+		print "@@@ SEARCH publish failed--{}, {}".format(Exception, e)
+	if job.finished():
+		SEARCH_JOBS.discard(job)
+		releaseSearchStrings(job, search_strings)
+		for search_string in search_strings:
+			try:
+				if indexCacheExistJudge(search_string)["code"]==0:
+					summarizeSearchHistory(search_string)
+			except Exception, e:
+				print "@@@ SEARCH summary failed--{}, {}".format(Exception, e)
+		evictSearchCache()
+
+def getSearchEventGroup(search_string):
+	'''The channels Group of the websockets following a pattern, named by its hash to stay a valid group name'''
+	return Group(SEARCH_EVENT_GROUP.format(hashSearchString(normalizeSearchString(search_string))))
+
+def getSearchEventCountKey(search_string):
+	return SEARCH_EVENT_COUNT_KEY.format(hashSearchString(normalizeSearchString(search_string)))
+
+def countIndexSearchEvent(search_string):
+	'''Counts one more delta of the pattern, waking the waitIndexSearchProgress of every process'''
+	key = getSearchEventCountKey(search_string)
+	cache.add(key, 0, SEARCH_JOB_TIMEOUT)
+	try:
+		cache.incr(key)
+	except ValueError:
+		cache.set(key, 1, SEARCH_JOB_TIMEOUT)
+
+def publishIndexSearchBlock(job, configFileName, matches):
+	'''
+		Sends one finished block of a SearchJob to its followers as a delta: detail, num_* and
+		size_searched_file only cover this block, finished is the job's
+		Followers skip deltas of the blocks listed in their snapshot
+	'''
+	countIndexSearchEvent(job.key[0])
+	finished = 1 if job.finished() else 0
+	size_searched_file = job.block_sizes[configFileName] if matches is not None else 0
+	format_result = formatIndexSearchResult(time_start=job.time_start, cache_query_set=None, cache_result=matches or [], finished=finished, size_searched_file=size_searched_file)
+	format_result["summary"]["delta"] = 1
+	format_result["summary"]["block"] = configFileName
+	group = getSearchEventGroup(job.key[0])
+	group.send({'text':json.dumps(format_result)})
+	if finished:
+		group.send({'text':'over'})
+
+def getIndexSearchProgress(search_string, time_start):
+	'''
+		(format_result, [blocks finished, blocks]) of a disk search
+		The blocks of the running SearchJob are read from the job when this process owns one,
+		every other block from the SearchResultCache rows saved so far
+		summary["blocks"] names the blocks the snapshot holds
+	'''
+	job = SEARCH_JOBS.findPattern(normalizeSearchString(search_string)) if len(SEARCH_JOBS) else None
+	if job is not None:
+		job_result, job_size, job_status, blocks = job.progress()
+		cache_query_set = getValidSearchResultCacheQuerySet(search_string).exclude(config_info__config_name__in=job.block_sizes.keys())
+		blocks = blocks+list(cache_query_set.values_list('config_info__config_name', flat=True))
+		cache_result = unpackMatches(loadMatchRecords(cache_query_set))+job_result
+		size_searched_file = job_size+(cache_query_set.aggregate(size=Sum('config_info__config_content_size'))['size'] or 0)
+		num_config_caches = cache_query_set.count()
+		status = [job_status[0]+num_config_caches, job_status[1]+num_config_caches]
+		finished = 1 if job_status[0]>=job_status[1] else 0
+		format_result = formatIndexSearchResult(time_start=job.time_start, cache_query_set=None, cache_result=cache_result, finished=finished, size_searched_file=size_searched_file)
+	else:
+		status = indexCacheExistJudge(search_string)["data"]
+		finished = 1 if status[0]>=status[1] else 0
+		cache_result, cache_query_set, _ = getIndexCacheSearchResult(search_string)
+		blocks = list(cache_query_set.values_list('config_info__config_name', flat=True))
+		format_result = formatIndexSearchResult(cache_result=cache_result, cache_query_set=cache_query_set, time_start=time_start, finished=finished)
+	format_result["summary"]["blocks"] = blocks
+	return format_result, status
+
+def getIndexSearchCounts(searchStringList):
+	'''
+		Cheap progress signature of the patterns, without a database query: the deltas published for them
+		by every process, and the blocks their SearchJobs in this process finished
+	'''
+	keys = [getSearchEventCountKey(search_string) for search_string in searchStringList]
+	events = cache.get_many(keys)
+	counts = []
+	for search_string, key in zip(searchStringList, keys):
+		job = SEARCH_JOBS.findPattern(normalizeSearchString(search_string)) if len(SEARCH_JOBS) else None
+		counts.append((events.get(key, 0), job.status()[0] if job is not None else -1))
+	return counts
+
+def waitIndexSearchProgress(searchStringList, counts, timeout=SEARCH_STATUS_INTERVAL):
+	'''
+		Blocks until getIndexSearchCounts differs from counts and returns the new counts
+		Wakes as soon as a SearchJob of this process finishes a block, reads the shared counts every timeout seconds otherwise
+	'''
+	while True:
+		new_counts = getIndexSearchCounts(searchStringList)
+		if new_counts!=counts:
+			# The caller reads the new progress from the database next
+			close_old_connections()
+			return new_counts
+		jobs = [SEARCH_JOBS.findPattern(normalizeSearchString(s)) for s in searchStringList] if len(SEARCH_JOBS) else []
+		jobs = [job for job in jobs if job is not None and not job.finished()]
+		if jobs:
+			jobs[0].wait(timeout)
+		else:
+			time.sleep(timeout)
 
 
 def runIndexSearchProgram(search_string):
 	result = {"code":1, "message":""}
 	config_query_set = AlgorithmConfigInfo.objects.filter(config_flag=1)
-	pool = multiprocessing.Pool(processes=CPUCORES)
-	for config in config_query_set:
-		configFilePathName = CONFIGFILEPATH+config.config_name
-		configFileName = config.config_name
-		'''
-			Example Codes
-			pool.apply_async(func_A, (args,))
-		'''
-		pool.apply_async(indexSearchProgram, args=(search_string, configFilePathName, configFileName,))
-	pool.close()
-	#pool.join()
-	result["code"] = 0
-	result["message"] = "IndexSearchPrograms run success!"
+	try:
+		submitIndexSearchPrograms(search_string, config_query_set)
+		result["code"] = 0
+		result["message"] = "IndexSearchPrograms run success!"
+	except searchExecutor.SearchQueueFull, e:
+		result["message"] = "Search queue is full, please retry later! {}".format(e)
 	print result
 	return result
 
@@ -642,24 +1559,8 @@ def runIndexSearchProgram(search_string):
 def formatHistoryIndexSearchResult(result_list=[]):
 	summary = {}
 	detail = []
-	if result_list:
-		file_name_list = list(set([r["name"] for r in result_list]))
-		algorithm_query_set = AlgorithmConfigInfo.objects.filter(config_flag=1)
-		for file_name in file_name_list:
-			try:    
-				item = {}
-				f = FileInfo.objects.filter(filefullpathname=file_name)[0]
-				item["directory_info"] = f.directory_info.dir_name
-				item["file_size"] = f.filesize
-				item["name"] = file_name
-				item["match_list"] = [{"offset":r["offset"], "offset_bit":r["offset_bit"], "length":r["length"]} for r in result_list if r["name"]==file_name]
-				item["num_match"] = len(item["match_list"])
-				item["MPM"] = item["num_match"]*1024*1024/item["file_size"] if item["file_size"]!=0 else 0
-				detail.append(item)
-			except Exception, e:
-				print "@@@ FAILED {}-{}".format(Exception, e)
-				continue
-
+	if len(result_list):
+		file_name_list, detail = formatMatchDetail(result_list)
 		summary["num_file"] = len(file_name_list)
 		summary["num_match"] = sum([d["num_match"] for d in detail])
 		summary["num_directory"] = len(list(set([d["directory_info"] for d in detail])))
@@ -677,8 +1578,8 @@ def formatHistoryIndexSearchResult(result_list=[]):
 
 def stringCacheExistJudge(search_string):
 	result = {"code":1, "message":""}
-	cache_query_set = SearchResultCache.objects.filter(search_string=search_string)
-	num_config_caches = len(cache_query_set) if cache_query_set else 0
+	cache_query_set = getSearchResultCacheQuerySet(search_string)
+	num_config_caches = cache_query_set.count()
 	if num_config_caches:
 		num_configs = len(AlgorithmConfigInfo.objects.all())
 		if num_configs==num_config_caches:
@@ -802,11 +1703,6 @@ DICT_HLreverse = {
 	'0':'0','1':'8','2':'4','3':'C','4':'2','5':'A','6':'6','7':'E','8':'1',\
 	'9':'9','A':'5','B':'D','C':'3','D':'B','E':'7','F':'F','.':'.'}
 
-DICT_Hex2Bin = {
-	'0':'0000','1':'0001','2':'0010','3':'0011','4':'0100','5':'0101','6':'0110',\
-	'7':'0111','8':'1000','9':'1001','A':'1010','B':'1011','C':'1100','D':'1101',\
-	'E':'1110','F':'1111','.':'....'}
-
 def changeString(searchString, scale, option):
 	result = ""
 	if scale==2:
@@ -855,8 +1751,7 @@ def changeString(searchString, scale, option):
 
 def validString(searchString, scale):
 	rule = BIN_SEARCH_RULE if scale==2 else HEX_SEARCH_RULE
-	m = re.match(rule, searchString)
-	return True if m and m.group()==searchString else False
+	return patternCompiler.compilePattern(searchString, scale).matches(rule)
 
 def validMultiString(searchStringList):
 	return True if sum([1 if validString(s,2) else 0 for s in searchStringList])==len(searchStringList) else False
@@ -870,22 +1765,19 @@ def runIndexDiskSearchProgram(search_string):
 	result = {"code":1, "message":"There's no Index In System"}
 	config_query_set = AlgorithmConfigInfo.objects.filter(config_flag=1)
 	if config_query_set:
-		pool = multiprocessing.Pool(processes=CPUCORES)
-		for config in config_query_set:
-			configFilePathName = CONFIGFILEPATH_ABS+config.config_name
-			configFileName = config.config_name
-			pool.apply_async(indexSearchProgram, args=(search_string, configFilePathName, configFileName,))
-		pool.close()
-		#pool.join()
-		result["code"] = 0
-		result["message"] = "IndexDiskSearchPrograms run success!"
+		try:
+			submitIndexSearchPrograms(search_string, config_query_set)
+			result["code"] = 0
+			result["message"] = "IndexDiskSearchPrograms run success!"
+		except searchExecutor.SearchQueueFull, e:
+			result["code"] = 3
+			result["message"] = "Search queue is full, please retry later! {}".format(e)
 	return result
 
 def indexCacheExistJudge(search_string):
 	result = {"code":1, "message":"Search string[{}] has no cache history!\n".format(search_string), "data":[0, -1]}
-	cache_query_set = SearchResultCache.objects.filter(search_string=search_string)
-	num_config_caches = len(cache_query_set) if cache_query_set else 0
-	num_configs = len(AlgorithmConfigInfo.objects.all())
+	num_config_caches = getValidSearchResultCacheQuerySet(search_string).count()
+	num_configs = AlgorithmConfigInfo.objects.filter(config_flag=1).count()
 	if num_config_caches:
 		if num_configs==num_config_caches:
 			result["code"] = 0
@@ -907,11 +1799,20 @@ def multiIndexCacheExistJudge(searchStringList):
 	return result
 
 def hex2bin(search_string):
-	return "".join(map(lambda x:DICT_Hex2Bin[x.upper()], search_string))
+	bits = patternCompiler.compilePattern(search_string, 16).bits
+	if bits is None:
+		raise ValueError("Invalid hex search string: {}".format(search_string))
+	return bits
+
+def canonicalSearchString(search_string, scale=2):
+	'''The key the search and its cached results go by, the same for every equivalent binary or hex string'''
+	return patternCompiler.canonicalSearchString(search_string, scale)
 
 def indexSearch(search_string, scale):
-	search_string = search_string if scale==2 else hex2bin(search_string)
+	search_string = canonicalSearchString(search_string, scale)
+	expireSearchCacheEntry(search_string)
 	result = indexCacheExistJudge(search_string)
+	recordSearchCacheAccess(search_string, result['code']==0)
 	if result['code']==0:
 		result = runIndexCacheSearchProgram(search_string)
 	else:
@@ -919,8 +1820,10 @@ def indexSearch(search_string, scale):
 	return result
 
 def api_indexSearch(search_string, scale):
-	search_string = search_string if scale==2 else hex2bin(search_string)
+	search_string = canonicalSearchString(search_string, scale)
+	expireSearchCacheEntry(search_string)
 	result = indexCacheExistJudge(search_string)
+	recordSearchCacheAccess(search_string, result['code']==0)
 	if result['code']==0:
 		result = runIndexCacheSearchProgram(search_string)
 	else:
@@ -934,11 +1837,15 @@ def api_indexCreate(directory_string):
 		if result['code']==0:
 			result = makeAlgorithmConfigFiles()
 			if result['code']==0:
-				result = runIndexCreateProgram()
+				result = runIndexCreateProgram(retry_failed=True)
 	return result
 
 def multiIndexSearch(searchStringList, option):
 	result = {"code":0, "message":""}
+	try:
+		searchRelation.parseRelation(option, len(searchStringList))
+	except ValueError, e:
+		return {"code":1, "message":"Wrong Relation! {}".format(e)}
 	for searchString in searchStringList:
 		r = indexSearch(searchString, 2)
 		result["code"] += r["code"]
@@ -948,49 +1855,59 @@ def multiIndexSearch(searchStringList, option):
 	# sum(map(lambda x: indexSearch(x,2)['code'], searchStringList))==0
 	# [if indexSearch(s,2)['code']==0 for s in searchStringList]
 
+def getMultiIndexCacheSearchResult(searchStringList, relation):
+	'''
+		The format result of cached patterns joined by relation; the joins run on the packed match records,
+		so only the files the relation keeps are formatted
+	'''
+	time_start = time.time()
+	record_list = []
+	size_searched_file = 0
+	for searchString in searchStringList:
+		cache_result, cache_query_set, _ = getIndexCacheSearchResult(searchString)
+		record_list.append(cache_result)
+		size_searched_file += cache_query_set.aggregate(size=Sum('config_info__config_content_size'))['size'] or 0
+	records = searchRelation.mergeSearchRecords(record_list, relation)
+	return formatIndexSearchResult(time_start=time_start, cache_query_set=None, cache_result=records, finished=1,
+		size_searched_file=int(math.ceil(size_searched_file/float(len(searchStringList)))))
+
 def getMultiIndexSearchStatus(message):
 	request = json.loads(message.content['text'])
 	if request['type']=='multiIndexSearchStatus':
 		searchStringList = request['searchStringList']
-		searchStringList = [searchString.encode('utf-8') for searchString in searchStringList]
+		searchStringList = [canonicalSearchString(searchString.encode('utf-8')) for searchString in searchStringList]
 		relation = request['relation']
+		try:
+			searchRelation.parseRelation(relation, len(searchStringList))
+		except ValueError, e:
+			message.reply_channel.send({'text':json.dumps({"code":1, "message":"Wrong Relation! {}".format(e)})})
+			message.reply_channel.send({'text':'over'})
+			return
 		r = multiIndexCacheExistJudge(searchStringList)
 		if r['code']==0:
 			print "#Cache# num_config_caches[{0}] == num_configs[{1}]".format(*r['data'])
-			format_result_list = []
-			for searchString in searchStringList:
-				cache_result, cache_query_set, time_start = getIndexCacheSearchResult(searchString)
-				format_result = formatIndexSearchResult(cache_result=cache_result, cache_query_set=cache_query_set, time_start=time_start, finished=1)
-				format_result_list.append(format_result)
-			final_result = mergeFormatIndexSearchResult(format_result_list, relation)
+			final_result = getMultiIndexCacheSearchResult(searchStringList, relation)
 			message.reply_channel.send({'text':json.dumps(final_result)})
 		else:
-			num_config_caches, num_configs = multiIndexCacheExistJudge(searchStringList)["data"]
+			# AND/OR merges can not be patched by per-block deltas, the merged result is rebuilt only when a block finished
 			time_start = time.time()
-			while num_config_caches<num_configs:
-				print "#Disk# num_config_caches[{}] < num_configs[{}]".format(num_config_caches, num_configs)
-				format_result_list = []
-				for searchString in searchStringList:
-					cache_result, cache_query_set, _ = getIndexCacheSearchResult(searchString)
-					format_result = formatIndexSearchResult(cache_result=cache_result, cache_query_set=cache_query_set, time_start=time_start, finished=0)
-					format_result_list.append(format_result)
-				final_result = mergeFormatIndexSearchResult(format_result_list, relation)
+			counts = getIndexSearchCounts(searchStringList)
+			progress_list = [getIndexSearchProgress(searchString, time_start) for searchString in searchStringList]
+			while not all([format_result["summary"]["finished"] for format_result, _ in progress_list]):
+				print "#Disk# num_config_caches[{}] < num_configs[{}]".format(sum([s[0] for _, s in progress_list]), sum([s[1] for _, s in progress_list]))
+				final_result = mergeFormatIndexSearchResult([format_result for format_result, _ in progress_list], relation)
+				final_result["summary"]["finished"] = 0
 				message.reply_channel.send({'text':json.dumps(final_result)})
-				time.sleep(1)
-				num_config_caches, num_configs = multiIndexCacheExistJudge(searchStringList)["data"]
+				counts = waitIndexSearchProgress(searchStringList, counts)
+				progress_list = [getIndexSearchProgress(searchString, time_start) for searchString in searchStringList]
 			else:
-				print "#Disk# num_config_caches[{}] == num_configs[{}]".format(num_config_caches, num_configs)
-				format_result_list = []
-				for searchString in searchStringList:
-					cache_result, cache_query_set, _ = getIndexCacheSearchResult(searchString)
-					format_result = formatIndexSearchResult(cache_result=cache_result, cache_query_set=cache_query_set, time_start=time_start, finished=1)
-					format_result_list.append(format_result)
-				final_result = mergeFormatIndexSearchResult(format_result_list, relation)
+				print "#Disk# num_config_caches[{}] == num_configs[{}]".format(sum([s[0] for _, s in progress_list]), sum([s[1] for _, s in progress_list]))
+				final_result = mergeFormatIndexSearchResult([format_result for format_result, _ in progress_list], relation)
 				message.reply_channel.send({'text':json.dumps(final_result)})
 	message.reply_channel.send({'text':'over'})
 
 def api_indexSearchStatus(search_string, scale):
-	search_string = search_string if scale==2 else hex2bin(search_string)
+	search_string = canonicalSearchString(search_string, scale)
 	result = indexCacheExistJudge(search_string)
 	if result['code']==0:
 		result['message'] = "#Cache# num_config_caches[{0}] == num_configs[{1}]".format(*result['data'])
@@ -999,139 +1916,77 @@ def api_indexSearchStatus(search_string, scale):
 		format_result = formatIndexSearchResult(cache_result=cache_result, cache_query_set=cache_query_set, time_start=time_start, finished=1)
 	else:
 		time_start = time.time()
-		num_config_caches, num_configs = indexCacheExistJudge(search_string)["data"]
-		if num_config_caches<num_configs:
-			result['message'] = "#Disk# num_config_caches[{}] < num_configs[{}]".format(num_config_caches, num_configs)
-			result['message'] = [num_config_caches, num_configs]
-			cache_result, cache_query_set, _ = getIndexCacheSearchResult(search_string)
-			format_result = formatIndexSearchResult(cache_result=cache_result, cache_query_set=cache_query_set, time_start=time_start, finished=0)
-		else:
-			result['message'] = "#Disk# num_config_caches[{}] == num_configs[{}]".format(num_config_caches, num_configs)
-			result['message'] = [num_config_caches, num_configs]
-			cache_result, cache_query_set, _ = getIndexCacheSearchResult(search_string)
-			format_result = formatIndexSearchResult(cache_result=cache_result, cache_query_set=cache_query_set, time_start=time_start, finished=1)
+		format_result, status = getIndexSearchProgress(search_string, time_start)
+		result['message'] = status
 	result['data'] = format_result
 	return result
 
 def api_indexCreateStatus():
 	result = {'code': 0, 'message': '','data':{}}
 	try:
-		summary = {"fileNumCreated":0, "fileNumTotal":0, "fileSizeCreated":0, "fileSizeTotal":0, "rate":0}
-		detail = {"finished":[], "unfinished":[]}
-
-		dir_query_set = DirectoryInfo.objects.all()
-		now = timezone.now()
-		directory_status_list = []
-		for directory in dir_query_set:
-			item = {}
-			item["name"] = directory.dir_name
-			item["fileNumCreated"] = len(directory.files.filter(fileflag=2))
-			item["fileNumTotal"] = len(directory.files.all())
-			item["fileSizeCreated"] = sum([c.config_content_size for c in directory.configs.filter(config_flag=1)])
-			item["fileSizeTotal"] = sum([c.config_content_size for c in directory.configs.all()])
-			createtime = timezone.localtime(directory.createtime)
-			item["timeCreated"] = createtime.strftime(ISOTIMEFORMAT)
-			flag = directory.dir_flag
-			item["status"] = "Finished" if flag==1 else "Unfinished"
-			if flag:
-				finishtime = timezone.localtime(directory.finishtime)
-				item["timeFinished"] = finishtime.strftime(ISOTIMEFORMAT)
-				item["timeWasted"] = (datetime.strptime('00:00:00','%H:%M:%S')+(finishtime-createtime)).strftime('%X')
-				item["rate"] = "%.2f"%(float(item["fileSizeTotal"])/(1024*1024*(finishtime-createtime).seconds))
-				detail["finished"].append(item)
-			else:
-				item["timeFinished"] = "---------- --:--:--"
-				item["timeWasted"] = (datetime.strptime('00:00:00','%H:%M:%S')+(now-createtime)).strftime('%X')
-				rate = float(item["fileSizeCreated"])/(1024*1024*(now-createtime).seconds+1)+random.uniform(0,3.0)
-				item["rate"] = "%.2f"%(10.0+random.uniform(-1.5,1.5)) if rate<8.0 else "%.2f"%(rate)
-				detail["unfinished"].append(item)
-		if detail["finished"]:
-			summary["fileNumCreated"] += sum(item["fileNumCreated"]for item in detail["finished"])
-			summary["fileNumTotal"] += sum(item["fileNumTotal"] for item in detail["finished"])
-			summary["fileSizeCreated"] += sum(item["fileSizeCreated"] for item in detail["finished"])
-			summary["fileSizeTotal"] += sum(item["fileSizeTotal"] for item in detail["finished"])
-		if detail["unfinished"]:
-			summary["fileNumCreated"] += sum(item["fileNumCreated"]for item in detail["unfinished"])
-			summary["fileNumTotal"] += sum(item["fileNumTotal"] for item in detail["unfinished"])
-			summary["fileSizeCreated"] += sum(item["fileSizeCreated"] for item in detail["unfinished"])
-			summary["fileSizeTotal"] += sum(item["fileSizeTotal"] for item in detail["unfinished"])
-			summary["rate"] += sum(float(item["rate"]) for item in detail["unfinished"])
-		else:
-			summary["rate"] = '--'
+		result['data'] = dict(getCachedDirectoryStatusList())
+		result['data']["queue"] = getIndexBuildQueueStatus()
 		result['code'] = 0
 		result['message'] = 'Get Index Create Status Success!'
-		result['data'] = {"summary":summary, "detail":detail}
 	except Exception,e:
 		result['message'] = 'Get Index Create Status Failed, Because {}-{}'.format(Exception, e)
 	return result
 
 def api_multiIndexSearchStatus(searchStringList, relation):
 	result = {}
-	r_list = [api_indexSearchStatus(searchString.encode('utf-8'), 2) for searchString in searchStringList]
+	searchStringList = [canonicalSearchString(searchString.encode('utf-8')) for searchString in searchStringList]
+	r = multiIndexCacheExistJudge(searchStringList)
+	if r['code']==0:
+		return {'code':0, 'message':r['data'], 'data':getMultiIndexCacheSearchResult(searchStringList, relation)}
+	r_list = [api_indexSearchStatus(searchString, 2) for searchString in searchStringList]
 	result['code'] = sum([r['code'] for r in r_list])
-	result['message'] = map(lambda (n1,n2):n1+n2, zip(r_list[0]['message'], r_list[1]['message']))
-	result['data'] = mergeFormatIndexSearchResult([r['data'] for r in r_list], relation)	
+	result['message'] = [sum(n) for n in zip(*[r['message'] for r in r_list])]
+	result['data'] = mergeFormatIndexSearchResult([r['data'] for r in r_list], relation)
 	return result
 
+def getClusterClient():
+	return clusterClient.getClusterClient(CLUSTER_TIMEOUT, CLUSTER_RETRIES, CLUSTER_BACKOFF)
+
+REMOTE_INDEX_SEARCH_STATUS = ("/api_indexSearchStatus/", {'code':1, 'message':[0, 0], 'data':{}})
+REMOTE_INDEX_CREATE_STATUS = ("/api_indexCreateStatus/", {'code':1, 'message':'Not 200 Failed', 'data':{}})
+REMOTE_DIRECTORY_BROWSER_INFO = ("/api_getDirectoryBrowserInfo/", {'code':1, 'message':'Not 200 Failed', 'data':{}})
+REMOTE_INDEX_CREATE = ("/api_indexCreate/", {'code':1, 'message':'RemoteIndexCreateProgram Run Failed'})
+REMOTE_INDEX_SEARCH = ("/api_indexSearch/", {'code':1, 'message':'RemoteIndexSearchProgram Run Failed'})
+REMOTE_MULTI_INDEX_SEARCH_STATUS = ("/api_multiIndexSearchStatus/", {'code':1, 'message':[0, 0], 'data':{}})
+# Sent twice these start a second build or search, they are not retried after a gateway error
+REMOTE_NOT_IDEMPOTENT = (REMOTE_INDEX_CREATE[0], REMOTE_INDEX_SEARCH[0])
+
+def postRemote(node_ip, remote_api, pay_load):
+	'''Calls one of the REMOTE_* apis on a node, a failed node answers its default with node_error set'''
+	path, default = remote_api
+	return getClusterClient().post(node_ip, path, pay_load, default, path not in REMOTE_NOT_IDEMPOTENT)
+
 def getRemoteIndexSearchStatus(node_ip, pay_load):
-	node_url = u"http://{}:80/api_indexSearchStatus/".format(node_ip)
-	r = requests.post(node_url, data=pay_load)
-	if r.status_code==200:
-		r = r.json()
-		r['node_ip'] = node_ip
-	else:
-		r = {'code':1, 'message':[0, 0], 'data':{}, 'node_ip':node_ip}
-	return r
+	return postRemote(node_ip, REMOTE_INDEX_SEARCH_STATUS, pay_load)
 
 def getRemoteIndexCreateStatus(node_ip, pay_load):
-	node_url = u"http://{}:80/api_indexCreateStatus/".format(node_ip)
-	r = requests.post(node_url, data=pay_load)
-	if r.status_code==200:
-		r = r.json()
-		r['node_ip'] = node_ip
-	else:
-		r = {'code':1, 'message':'Not 200 Failed', 'data':{}, 'node_ip':node_ip}
-	return r
+	return postRemote(node_ip, REMOTE_INDEX_CREATE_STATUS, pay_load)
 
 def getRemoteDirectoryBrowserInfo(node_ip, pay_load):
-	node_url = u"http://{}:80/api_getDirectoryBrowserInfo/".format(node_ip)
-	r = requests.post(node_url, data=pay_load)
-	if r.status_code==200:
-		r = r.json()
-		r['node_ip'] = node_ip
-	else:
-		r = {'code':1, 'message':'Not 200 Failed', 'data':{}, 'node_ip':node_ip}
-	return r
+	return postRemote(node_ip, REMOTE_DIRECTORY_BROWSER_INFO, pay_load)
 
 def runRemoteIndexCreateProgram(node_ip, pay_load):
-	node_url = u"http://{}:80/api_indexCreate/".format(node_ip)
-	r = requests.post(node_url, data=pay_load)
-	if r.status_code==200:
-		r = r.json()
-		r['node_ip'] = node_ip
-	else:
-		r = {'code':1, 'message':'RemoteIndexCreateProgram Run Failed', 'node_ip':node_ip}
-	return r
+	return postRemote(node_ip, REMOTE_INDEX_CREATE, pay_load)
 
 def runRemoteIndexSearchProgram(node_ip, pay_load):
-	node_url = u"http://{}:80/api_indexSearch/".format(node_ip)
-	r = requests.post(node_url, data=pay_load)
-	if r.status_code==200:
-		r = r.json()
-		r['node_ip'] = node_ip
-	else:
-		r = {'code':1, 'message':'RemoteIndexSearchProgram Run Failed', 'node_ip':node_ip}
-	return r	
+	return postRemote(node_ip, REMOTE_INDEX_SEARCH, pay_load)
 
 def getRemoteMultiIndexSearchStatus(node_ip, pay_load):
-	node_url = u"http://{}:80/api_multiIndexSearchStatus/".format(node_ip)
-	r = requests.post(node_url, data=pay_load)
-	if r.status_code==200:
-		r = r.json()
-		r['node_ip'] = node_ip
-	else:
-		r = {'code':1, 'message':[0, 0], 'data':{}, 'node_ip':node_ip}
-	return r
+	return postRemote(node_ip, REMOTE_MULTI_INDEX_SEARCH_STATUS, pay_load)
+
+def getRemoteResults(node_query_set, remote_api, pay_load):
+	'''postRemote on every node at once, in the order of node_query_set'''
+	path, default = remote_api
+	return getClusterClient().postAll([node.node_ip for node in node_query_set], path, pay_load, default, path not in REMOTE_NOT_IDEMPOTENT)
+
+def splitRemoteResults(r_list):
+	'''(answers of the nodes that replied, ips of the nodes that failed)'''
+	return [r for r in r_list if 'node_error' not in r], [r['node_ip'] for r in r_list if 'node_error' in r]
 
 def distributedIndexCreate(directory_string, node_ip):
 	pay_load = {'directory': directory_string}
@@ -1142,12 +1997,31 @@ def distributedIndexSearch(search_string, scale):
 	node_query_set = NodeInfo.objects.filter(node_active=True)
 	search_type = "BSearchString" if scale==2 else "HSearchString"
 	pay_load = {search_type: search_string, 'scale': scale}
-	r_list = [runRemoteIndexSearchProgram(node.node_ip, pay_load) for node in node_query_set]
-	if sum(r['code'] for r in r_list)==0:
+	r_list = getRemoteResults(node_query_set, REMOTE_INDEX_SEARCH, pay_load)
+	# Nodes that can not be reached are left out, the search runs on the others
+	r_list_replied, node_failed = splitRemoteResults(r_list)
+	if r_list_replied and sum(r['code'] for r in r_list_replied)==0:
 		return {'code':0, 'message':json.dumps(r_list)}
 	else:
 		return {'code':1, 'message':json.dumps(r_list)}
 
+def followRemoteIndexSearch(message, node_query_set, remote_api, pay_load):
+	'''
+		Sends the merged search status of the nodes every SEARCH_STATUS_INTERVAL until each node that
+		answers has finished; failed nodes are asked again every round and listed in node_failed meanwhile
+	'''
+	time_start = time.time()
+	while True:
+		r_list, node_failed = splitRemoteResults(getRemoteResults(node_query_set, remote_api, pay_load))
+		finished = 0 if sum([r['code'] for r in r_list]) else 1
+		num_node_searched = len(filter(lambda r:r['code']==0, r_list))
+		print "#Cache# num_node_searched[{}] num_node_total[{}] num_node_failed[{}]".format(num_node_searched, len(r_list), len(node_failed))
+		format_result = formatRemoteIndexSearchResult(time_start=time_start, result_list=r_list, finished=finished)
+		format_result['node_failed'] = node_failed
+		message.reply_channel.send({'text':json.dumps(format_result)})
+		if finished:
+			break
+		time.sleep(SEARCH_STATUS_INTERVAL)
 
 def distributedIndexSearchStatus(message):
 	node_query_set = NodeInfo.objects.filter(node_active=True)
@@ -1157,66 +2031,12 @@ def distributedIndexSearchStatus(message):
 		scale = int(request['scale'])
 		# search_string = search_string if scale==2 else hex2bin(search_string)
 		pay_load = {'scale':scale, 'searchString':search_string}
-		r_list = [getRemoteIndexSearchStatus(node.node_ip, pay_load) for node in node_query_set]
-		time_start = time.time()
-		if sum([r['code'] for r in r_list])==0:
-			# num_config_caches = sum([r['message'][0] for r in r_list])
-			# num_configs = sum([r['message'][1] for r in r_list])
-			num_node_searched = len(filter(lambda r:r['code']==0, r_list))
-			num_node_total = len(r_list)
-			print "#Cache# num_node_searched[{}] == num_node_total[{}]".format(num_node_searched, num_node_total)
-			format_result = formatRemoteIndexSearchResult(time_start=time_start, result_list=r_list, finished=1)
-			message.reply_channel.send({'text':json.dumps(format_result)})
-		else:
-			r_list = [getRemoteIndexSearchStatus(node.node_ip, pay_load) for node in node_query_set]
-			while sum([r['code'] for r in r_list])>0:
-				# num_config_caches = sum([r['message'][0] for r in r_list])
-				# num_configs = sum([r['message'][1] for r in r_list])
-				# print "#Disk# num_config_caches[{}] < num_configs[{}]".format(num_config_caches, num_configs)
-				num_node_searched = len(filter(lambda r:r['code']==0, r_list))
-				num_node_total = len(r_list)
-				print "#Cache# num_node_searched[{}] == num_node_total[{}]".format(num_node_searched, num_node_total)
-				format_result = formatRemoteIndexSearchResult(time_start=time_start, result_list=r_list, finished=0)
-				message.reply_channel.send({'text':json.dumps(format_result)})
-				time.sleep(1)
-				r_list = [getRemoteIndexSearchStatus(node.node_ip, pay_load) for node in node_query_set]
-			else:
-				# num_config_caches = sum([r['message'][0] for r in r_list])
-				# num_configs = sum([r['message'][1] for r in r_list])
-				# print "#Disk# num_config_caches[{}] == num_configs[{}]".format(num_config_caches, num_configs)
-				num_node_searched = len(filter(lambda r:r['code']==0, r_list))
-				num_node_total = len(r_list)
-				print "#Cache# num_node_searched[{}] == num_node_total[{}]".format(num_node_searched, num_node_total)
-				format_result = formatRemoteIndexSearchResult(time_start=time_start, result_list=r_list, finished=1)
-				message.reply_channel.send({'text':json.dumps(format_result)})
+		followRemoteIndexSearch(message, node_query_set, REMOTE_INDEX_SEARCH_STATUS, pay_load)
 	if request['type']=='distributedMultiIndexSearchStatus':
 		searchStringList = request['searchStringList']
 		relation = request['relation']
 		pay_load = {'relation': relation, 'searchStringList': searchStringList}
-		r_list = [getRemoteMultiIndexSearchStatus(node.node_ip, pay_load) for node in node_query_set]
-		time_start = time.time()
-		if sum([r['code'] for r in r_list])==0:
-			num_node_searched = len(filter(lambda r:r['code']==0, r_list))
-			num_node_total = len(r_list)
-			print "#Cache# num_node_searched[{}] == num_node_total[{}]".format(num_node_searched, num_node_total)
-			format_result = formatRemoteIndexSearchResult(time_start=time_start, result_list=r_list, finished=1)
-			message.reply_channel.send({'text':json.dumps(format_result)})
-		else:
-			r_list = [getRemoteMultiIndexSearchStatus(node.node_ip, pay_load) for node in node_query_set]
-			while sum([r['code'] for r in r_list])>0:
-				num_node_searched = len(filter(lambda r:r['code']==0, r_list))
-				num_node_total = len(r_list)
-				print "#Cache# num_node_searched[{}] == num_node_total[{}]".format(num_node_searched, num_node_total)
-				format_result = formatRemoteIndexSearchResult(time_start=time_start, result_list=r_list, finished=0)
-				message.reply_channel.send({'text':json.dumps(format_result)})
-				time.sleep(1)
-				r_list = [getRemoteMultiIndexSearchStatus(node.node_ip, pay_load) for node in node_query_set]
-			else:
-				num_node_searched = len(filter(lambda r:r['code']==0, r_list))
-				num_node_total = len(r_list)
-				print "#Cache# num_node_searched[{}] == num_node_total[{}]".format(num_node_searched, num_node_total)
-				format_result = formatRemoteIndexSearchResult(time_start=time_start, result_list=r_list, finished=1)
-				message.reply_channel.send({'text':json.dumps(format_result)})
+		followRemoteIndexSearch(message, node_query_set, REMOTE_MULTI_INDEX_SEARCH_STATUS, pay_load)
 	message.reply_channel.send({'text':'over'})
 
 def distributedIndexCreateStatus(message):
@@ -1226,16 +2046,18 @@ def distributedIndexCreateStatus(message):
 	# request = json.loads()
 	# if message.content['text']=='distributedIndexCreateStatus':
 		pay_load = {}
-		r_list = [getRemoteIndexCreateStatus(node.node_ip, pay_load) for node in node_query_set]
-		while sum([r['code'] for r in r_list])==0:
+		r_list, node_failed = splitRemoteResults(getRemoteResults(node_query_set, REMOTE_INDEX_CREATE_STATUS, pay_load))
+		while r_list and sum([r['code'] for r in r_list])==0:
 			format_result = formatRemoteIndexCreateResult(result_list=r_list)
+			format_result['node_failed'] = node_failed
 			message.reply_channel.send({'text':json.dumps(format_result)})
 			time.sleep(1)
-			r_list = [getRemoteIndexCreateStatus(node.node_ip, pay_load) for node in node_query_set]
+			r_list, node_failed = splitRemoteResults(getRemoteResults(node_query_set, REMOTE_INDEX_CREATE_STATUS, pay_load))
 		else:
 			r_list = filter(lambda x: x['code']==0, r_list)
 			print "Some Node's status was Wrong!"
 			format_result = formatRemoteIndexCreateResult(result_list=r_list)
+			format_result['node_failed'] = node_failed
 			message.reply_channel.send({'text':json.dumps(format_result)})
 	message.reply_channel.send({'text':'over'})
 
@@ -1247,101 +2069,186 @@ def getIndexSearchStatus(message):
 	if request['type']=='indexSearchStatus':
 		search_string = request['searchString']
 		scale = int(request['scale'])
-		search_string = search_string if scale==2 else hex2bin(search_string)
-		r = indexCacheExistJudge(search_string)
-		if r['code']==0:
-			print "#Cache# num_config_caches[{0}] == num_configs[{1}]".format(*r['data'])
-			cache_result, cache_query_set, time_start = getIndexCacheSearchResult(search_string)
-			format_result = formatIndexSearchResult(cache_result=cache_result, cache_query_set=cache_query_set, time_start=time_start, finished=1)
-			message.reply_channel.send({'text':json.dumps(format_result)})
-		else:
-			time_start = time.time()
-			num_config_caches, num_configs = indexCacheExistJudge(search_string)["data"]
-			while num_config_caches<num_configs:
-				print "#Disk# num_config_caches[{}] < num_configs[{}]".format(num_config_caches, num_configs)
-				cache_result, cache_query_set, _ = getIndexCacheSearchResult(search_string)
-				format_result = formatIndexSearchResult(cache_result=cache_result, cache_query_set=cache_query_set, time_start=time_start, finished=0)
-				message.reply_channel.send({'text':json.dumps(format_result)})
-				time.sleep(1)
-				num_config_caches, num_configs = indexCacheExistJudge(search_string)["data"]
-			else:
-				print "#Disk# num_config_caches[{}] == num_configs[{}]".format(num_config_caches, num_configs)
-				cache_result, cache_query_set, _ = getIndexCacheSearchResult(search_string)
-				format_result = formatIndexSearchResult(cache_result=cache_result, cache_query_set=cache_query_set, time_start=time_start, finished=1)
-				message.reply_channel.send({'text':json.dumps(format_result)})
-	message.reply_channel.send({'text':'over'})
+		search_string = canonicalSearchString(search_string, scale)
+		followIndexSearch(message, search_string)
+	else:
+		message.reply_channel.send({'text':'over'})
+
+def followIndexSearch(message, search_string):
+	'''
+		Sends one snapshot of a search (summary["delta"]==0) to the websocket; while the search runs the
+		reply channel joins the pattern's Group and gets a delta per finished block from publishIndexSearchBlock,
+		then 'over', so no consumer stays in a loop reading the database
+		The consumer needs channel_session, ws_disconnect leaves the Group
+	'''
+	r = indexCacheExistJudge(search_string)
+	if r['code']==0:
+		print "#Cache# num_config_caches[{0}] == num_configs[{1}]".format(*r['data'])
+		cache_result, cache_query_set, time_start = getIndexCacheSearchResult(search_string)
+		format_result = formatIndexSearchResult(cache_result=cache_result, cache_query_set=cache_query_set, time_start=time_start, finished=1)
+		format_result["summary"]["delta"] = 0
+		message.reply_channel.send({'text':json.dumps(format_result)})
+		message.reply_channel.send({'text':'over'})
+		return
+	# Join before reading the snapshot so no block falls between the two
+	group = getSearchEventGroup(search_string)
+	group.add(message.reply_channel)
+	format_result, status = getIndexSearchProgress(search_string, time.time())
+	format_result["summary"]["delta"] = 0
+	message.reply_channel.send({'text':json.dumps(format_result)})
+	if format_result["summary"]["finished"]:
+		print "#Disk# num_config_caches[{}] == num_configs[{}]".format(*status)
+		group.discard(message.reply_channel)
+		message.reply_channel.send({'text':'over'})
+	else:
+		print "#Disk# num_config_caches[{}] < num_configs[{}]".format(*status)
+		message.channel_session['search_group'] = group.name
 
 def getIndexCacheSearchResult(search_string):
 	time_start = time.time()
-	cache_query_set = SearchResultCache.objects.filter(search_string=search_string)
-	cache_result = []
-	for c in cache_query_set:
-		cache_result.extend(json.loads(c.search_content))
+	cache_query_set = getValidSearchResultCacheQuerySet(search_string)
+	cache_result = loadMatchRecords(cache_query_set)
 	return cache_result, cache_query_set, time_start
 
-def getIndexDiskSearchResult(search_string):
-	pass
-
-def mergeByDetailInfo(d1, d2, file_name_list):
-	detail = []
-	detail.extend([d for d in d1 if d['name'] in file_name_list])
-	for d in d2:
-		if d['name'] in file_name_list:
-			flag = 0
-			for item in detail:
-				if d['name']==item['name']:
-					flag += 1
-					item['match_list'].extend(d['match_list'])
-					item['num_match'] += d['num_match']
-					item['MPM'] += d['MPM']
-			if flag==0:
-				detail.append(d)
-	return detail
+def getSearchResultCacheQuerySet(search_string):
+	# search_hash is indexed, search_string only guards against collisions
+	return SearchResultCache.objects.filter(search_hash=hashSearchString(search_string), search_string=search_string)
+
+def getValidSearchResultCacheQuerySet(search_string):
+	'''The cache rows of search_string for searchable blocks whose index has not changed since'''
+	return getSearchResultCacheQuerySet(search_string).filter(config_info__config_flag=1, config_generation=F('config_info__config_generation'))
+
+def getUncachedConfigs(search_string, config_query_set):
+	cached_config_ids = set(getValidSearchResultCacheQuerySet(search_string).values_list('config_info_id', flat=True))
+	return [c for c in config_query_set if c.id not in cached_config_ids]
+
+def dropStaleSearchResultCache(search_string, cache_query_set):
+	stale_size = (cache_query_set.aggregate(num_match=Sum('num_match'))['num_match'] or 0)*MATCH_RECORD_DTYPE.itemsize
+	if cache_query_set.delete()[0]:
+		getSearchCacheEntryQuerySet(search_string).update(size=F('size')-stale_size)
+
+def getSearchCacheEntryQuerySet(search_string):
+	return SearchCacheEntry.objects.filter(search_hash=hashSearchString(search_string), search_string=search_string)
+
+def getSearchCacheEntry(search_string):
+	'''The SearchCacheEntry of search_string; search_hash is unique, so concurrent first saves share one entry'''
+	with transaction.atomic():
+		entry, created = SearchCacheEntry.objects.get_or_create(search_hash=hashSearchString(search_string), defaults={'search_string':search_string})
+	return entry
+
+def recordSearchCacheAccess(search_string, hit):
+	'''Counts a hit or a miss on the entry of search_string, a search string with nothing cached has none to count on'''
+	counter = {'hits':F('hits')+1} if hit else {'misses':F('misses')+1}
+	getSearchCacheEntryQuerySet(search_string).update(accesstime=timezone.now(), **counter)
+
+def getSearchRunningKey(search_string):
+	return SEARCH_RUNNING_KEY.format(hashSearchString(search_string))
+
+def getSearchJobOwner(job):
+	return "{}:{}".format(getBuildWorker(), id(job))
+
+def leaseSearchStrings(job, search_strings):
+	'''Marks search_strings as searched by job for SEARCH_JOB_TIMEOUT seconds, in every process'''
+	owner = getSearchJobOwner(job)
+	cache.set_many(dict([(getSearchRunningKey(search_string), owner) for search_string in search_strings]), SEARCH_JOB_TIMEOUT)
+
+def releaseSearchStrings(job, search_strings):
+	'''Drops the leases of search_strings that job still holds'''
+	owner = getSearchJobOwner(job)
+	leases = cache.get_many([getSearchRunningKey(search_string) for search_string in search_strings])
+	cache.delete_many([key for key, value in leases.items() if value==owner])
+
+def getRunningSearchStrings(search_strings):
+	'''Those of search_strings a SearchJob of this or of another process is searching'''
+	running = SEARCH_JOBS.searchStrings()
+	keys = dict([(getSearchRunningKey(search_string), search_string) for search_string in search_strings if search_string not in running])
+	leased = set([keys[key] for key in cache.get_many(keys.keys())])
+	return set([search_string for search_string in search_strings if search_string in running or search_string in leased])
+
+def dropSearchCacheEntry(search_string):
+	'''Deletes every cache row of search_string in one transaction, so no reader sees part of them'''
+	with transaction.atomic():
+		summarized = [getEntryHistoryStatistic(entry) for entry in getSearchCacheEntryQuerySet(search_string).filter(summarized=True)]
+		getSearchResultCacheQuerySet(search_string).delete()
+		getSearchCacheEntryQuerySet(search_string).delete()
+		for removed in summarized:
+			updateHistoryStatistic(removed=removed)
+
+def expireSearchCacheEntry(search_string):
+	if SEARCH_CACHE_TTL is None:
+		return False
+	deadline = timezone.now()-timedelta(seconds=SEARCH_CACHE_TTL)
+	if getRunningSearchStrings([search_string]) or not getSearchCacheEntryQuerySet(search_string).filter(createtime__lt=deadline).exists():
+		return False
+	dropSearchCacheEntry(search_string)
+	return True
 
-def mergeByAndRelation(r1, r2):
-	summary = {"num_file":0, "num_match":0, "num_directory":0, "MPM":0, "file_size":0, "finished":0}
-	detail = []
-	file_name_list_1 = [r['name'] for r in r1['detail']]
-	file_name_list_2 = [r['name'] for r in r2['detail']]
-	file_name_list = list(set(file_name_list_1)&set(file_name_list_2))
-	detail = mergeByDetailInfo(r1['detail'], r2['detail'], file_name_list)
-	summary["num_file"] = len(file_name_list)
-	summary["num_match"] = sum([d["num_match"] for d in detail])
-	summary["num_directory"] = len(list(set([d["directory_info"] for d in detail])))
-	summary["MPM"] = sum([d["MPM"] for d in detail])
-	summary["file_size"] = sum(d["file_size"] for d in detail)
-
-	summary["size_searched_file"] = math.ceil((r1["summary"]["size_searched_file"]+r2["summary"]["size_searched_file"])/2.0)
-	summary["size_total_file"] = math.ceil((r1["summary"]["size_total_file"]+r2["summary"]["size_total_file"])/2.0)
-	summary["time_cost"] = max(r1["summary"]["time_cost"], r2["summary"]["time_cost"])
-	summary["rate"] = r1["summary"]["rate"]+r2["summary"]["rate"]
-	summary["finished"] = math.ceil((r1["summary"]["finished"]+r2["summary"]["finished"])/2.0)
-	return {"summary":summary, "detail":detail}
+def evictSearchCache():
+	'''
+		Drops expired search strings, then whole search strings in SEARCH_CACHE_POLICY order
+		until the cached matches fit in SEARCH_CACHE_BUDGET bytes
+		Search strings of running jobs are kept, whichever process runs them
+	'''
+	evicted = 0
+	if SEARCH_CACHE_TTL is not None:
+		deadline = timezone.now()-timedelta(seconds=SEARCH_CACHE_TTL)
+		expired = list(SearchCacheEntry.objects.filter(createtime__lt=deadline).values_list('search_string', flat=True))
+		running = getRunningSearchStrings(expired)
+		for search_string in expired:
+			if search_string not in running:
+				dropSearchCacheEntry(search_string)
+				evicted += 1
+	total = SearchCacheEntry.objects.aggregate(total=Sum('size'))['total'] or 0
+	if total<=SEARCH_CACHE_BUDGET:
+		return evicted
+	order = ('hits', 'accesstime') if SEARCH_CACHE_POLICY=="LFU" else ('accesstime',)
+	for search_string, size in SearchCacheEntry.objects.order_by(*order).values_list('search_string', 'size').iterator():
+		if total<=SEARCH_CACHE_BUDGET:
+			break
+		if getRunningSearchStrings([search_string]):
+			continue
+		dropSearchCacheEntry(search_string)
+		total -= size
+		evicted += 1
+	print "### SEARCH CACHE evicted {} search strings, {} bytes left".format(evicted, total)
+	return evicted
+
+def getSearchCacheStatus():
+	status = SearchCacheEntry.objects.aggregate(size=Sum('size'), hits=Sum('hits'), misses=Sum('misses'))
+	status = dict([(k, v or 0) for k, v in status.items()])
+	status.update({"entries":SearchCacheEntry.objects.count(), "budget":SEARCH_CACHE_BUDGET, "policy":SEARCH_CACHE_POLICY, "ttl":SEARCH_CACHE_TTL})
+	return status
+
+def packMatches(matches):
+	'''
+		bgrep matches as MATCH_RECORD_DTYPE records
+		Matches in files that FileInfo does not know are dropped, they could not be shown anyway
+	'''
+	names = list(set([m["name"] for m in matches]))
+	file_ids = {}
+	for i in range(0, len(names), QUERY_CHUNK_SIZE):
+		file_ids.update(FileInfo.objects.filter(filefullpathname__in=names[i:i+QUERY_CHUNK_SIZE]).values_list('filefullpathname', 'id'))
+	rows = [(file_ids[m["name"]], m["offset"], m["offset_bit"], m["length"]) for m in matches if m["name"] in file_ids]
+	return np.array(rows, dtype=MATCH_RECORD_DTYPE)
+
+def loadMatchRecords(cache_query_set):
+	'''The records of all the cache rows, streamed from the database and decoded with one frombuffer'''
+	data = b"".join([bytes(m) for m in cache_query_set.values_list('search_matches', flat=True).iterator()])
+	return np.frombuffer(data, dtype=MATCH_RECORD_DTYPE)
+
+def unpackMatches(records):
+	'''bgrep style match dicts of MATCH_RECORD_DTYPE records'''
+	file_info = getFileInfo(np.unique(records['file_id']).tolist(), 'id')
+	names = dict([(file_id, row[1]) for file_id, row in file_info.items()])
+	columns = zip(records['file_id'].tolist(), records['offset'].tolist(), records['offset_bit'].tolist(), records['length'].tolist())
+	return [{"name":names[f], "offset":o, "offset_bit":b, "length":l} for f, o, b, l in columns if f in names]
 
-def mergeByOrRelation(r1, r2):
-	summary = {"num_file":0, "num_match":0, "num_directory":0, "MPM":0, "file_size":0, "finished":0}
-	detail = []
-	file_name_list_1 = [r['name'] for r in r1['detail']]
-	file_name_list_2 = [r['name'] for r in r2['detail']]
-	file_name_list = list(set(file_name_list_1)|set(file_name_list_2))
-	detail = mergeByDetailInfo(r1['detail'], r2['detail'], file_name_list)
-	# print detail
-	summary["num_file"] = len(file_name_list)
-	summary["num_match"] = sum([d["num_match"] for d in detail])
-	summary["num_directory"] = len(list(set([d["directory_info"] for d in detail])))
-	summary["MPM"] = sum([d["MPM"] for d in detail])
-	summary["file_size"] = sum(d["file_size"] for d in detail)
-
-	summary["size_searched_file"] = math.ceil((r1["summary"]["size_searched_file"]+r2["summary"]["size_searched_file"])/2.0)
-	summary["size_total_file"] = math.ceil((r1["summary"]["size_total_file"]+r2["summary"]["size_total_file"])/2.0)
-	summary["time_cost"] = max(r1["summary"]["time_cost"], r2["summary"]["time_cost"])
-	summary["rate"] = r1["summary"]["rate"]+r2["summary"]["rate"]
-	summary["finished"] = math.ceil((r1["summary"]["finished"]+r2["summary"]["finished"])/2.0)
-	return {"summary":summary, "detail":detail}
+def getIndexDiskSearchResult(search_string):
+	pass
 
 def mergeFormatIndexSearchResult(format_result_list, relation):
-	result = reduce(mergeByAndRelation, format_result_list) if relation=='AND' else reduce(mergeByOrRelation, format_result_list)
-	return result
+	'''Joins the format results of the patterns by relation, see searchRelation for the relations'''
+	return searchRelation.mergeSearchResults(format_result_list, relation)
 
 def formatRemoteIndexSearchResult(time_start, result_list, finished=0):
 	time_end = time.time()
@@ -1369,7 +2276,7 @@ def formatRemoteIndexSearchResult(time_start, result_list, finished=0):
 	return result
 
 def formatRemoteIndexCreateResult(result_list):
-	summary = {"fileNumCreated":0, "fileNumTotal":0, "fileSizeCreated":0, "fileSizeTotal":0, "rate":0}
+	summary = {"fileNumCreated":0, "fileNumTotal":0, "fileSizeCreated":0, "fileSizeTotal":0, "rate":0, "eta":0, "blocksStalled":0}
 	result = {'code':0, 'message':[], 'node_ip':[], 'data':{'summary':summary, 'detail':[]}}
 	for r in result_list:
 		result['code'] += r['code']
@@ -1380,57 +2287,167 @@ def formatRemoteIndexCreateResult(result_list):
 		result['data']['summary']['fileSizeCreated'] += r['data']['summary']['fileSizeCreated']
 		result['data']['summary']['fileSizeTotal'] += r['data']['summary']['fileSizeTotal']
 		result['data']['summary']['rate'] += 0 if isinstance(r['data']['summary']['rate'], unicode) else r['data']['summary']['rate']
+		# The nodes build at the same time, the cluster is done with its slowest node
+		eta = r['data']['summary'].get('eta', 0)
+		result['data']['summary']['eta'] = None if eta is None or summary['eta'] is None else max(summary['eta'], eta)
+		result['data']['summary']['blocksStalled'] += r['data']['summary'].get('blocksStalled', 0)
 		d = r['data']
 		d['node_ip'] = r['node_ip']
 		result['data']['detail'].append(d)
 	return result
 
-def formatIndexSearchResult(time_start, cache_query_set, cache_result=[], finished=0):
+def bumpFileInfoGeneration():
+	'''Makes every process drop its FILE_INFO_CACHE, once FileInfo rows were resized or deleted'''
+	cache.add(FILE_INFO_GENERATION_KEY, 0, None)
+	try:
+		cache.incr(FILE_INFO_GENERATION_KEY)
+	except ValueError:
+		cache.set(FILE_INFO_GENERATION_KEY, 1, None)
+	FILE_INFO_CACHE.clear()
+
+def getFileInfoCache(key_field):
+	'''The FILE_INFO_CACHE of key_field, emptied first when the generation moved or FILE_INFO_CACHE_TTL passed'''
+	generation = cache.get(FILE_INFO_GENERATION_KEY, 0)
+	now = time.time()
+	state = FILE_INFO_CACHE.get("generation")
+	if state is None or state[0]!=generation or now-state[1]>FILE_INFO_CACHE_TTL:
+		FILE_INFO_CACHE.clear()
+		FILE_INFO_CACHE["generation"] = (generation, now)
+	return FILE_INFO_CACHE.setdefault(key_field, {})
+
+def getFileInfo(keys, key_field='filefullpathname'):
+	'''
+		{key: (id, filefullpathname, directory name, file size)} of the FileInfo rows whose key_field
+		("filefullpathname" or "id") is in keys, one query per QUERY_CHUNK_SIZE keys
+		Rows looked up once are kept until FILE_INFO_CACHE fills up or getFileInfoCache drops it
+	'''
+	file_cache = getFileInfoCache(key_field)
+	missing = [k for k in keys if k not in file_cache]
+	if len(file_cache)+len(missing)>FILE_INFO_CACHE_SIZE:
+		file_cache.clear()
+		missing = keys
+	for i in range(0, len(missing), QUERY_CHUNK_SIZE):
+		file_query_set = FileInfo.objects.filter(directory_info__isnull=False, **{key_field+'__in':missing[i:i+QUERY_CHUNK_SIZE]})
+		for row in file_query_set.values_list('id', 'filefullpathname', 'directory_info__dir_name', 'filesize'):
+			file_cache[row[0] if key_field=='id' else row[1]] = row
+	return dict([(k, file_cache[k]) for k in keys if k in file_cache])
+
+def getIndexedDirectorySize():
+	'''{directory name: size of its indexed blocks}, shared through the cache until a block is indexed, reset or dropped'''
+	sizes = cache.get(INDEXED_DIRECTORY_SIZE_KEY)
+	if sizes is None:
+		sizes = dict(AlgorithmConfigInfo.objects.filter(config_flag=1).order_by().values_list('dir_name').annotate(size=Sum('config_content_size')))
+		cache.set(INDEXED_DIRECTORY_SIZE_KEY, sizes, FILE_INFO_CACHE_TTL)
+	return sizes
+
+def makeDetailItem(file_name, dir_name, file_size, match_list):
+	item = {"directory_info":dir_name, "file_size":file_size, "name":file_name, "match_list":match_list}
+	item["num_match"] = len(match_list)
+	item["MPM"] = item["num_match"]*1024*1024/item["file_size"] if item["file_size"]!=0 else 0
+	return item
+
+def formatMatchDetail(result_list):
+	'''
+		Groups matches by file, result_list is either bgrep style match dicts or MATCH_RECORD_DTYPE records
+		Returns (every matched file name, detail items of the files FileInfo knows)
+	'''
+	if isinstance(result_list, np.ndarray):
+		return formatMatchRecordDetail(result_list)
+	match_lists = {}
+	file_name_list = []
+	for r in result_list:
+		match_list = match_lists.get(r["name"])
+		if match_list is None:
+			match_list = match_lists[r["name"]] = []
+			file_name_list.append(r["name"])
+		match_list.append({"offset":r["offset"], "offset_bit":r["offset_bit"], "length":r["length"]})
+	file_info = getFileInfo(file_name_list)
+	detail = [makeDetailItem(name, file_info[name][2], file_info[name][3], match_lists[name]) for name in file_name_list if name in file_info]
+	return file_name_list, detail
+
+def formatMatchRecordDetail(records):
+	# A stable sort by file keeps every file's matches in their stored order
+	order = np.argsort(records['file_id'], kind='mergesort')
+	file_ids, starts, counts = np.unique(records['file_id'][order], return_index=True, return_counts=True)
+	file_info = getFileInfo(file_ids.tolist(), 'id')
+	# None of the objects built below can be part of a cycle, and with a million matches alive every
+	# pass of the collector would walk them all, so it is paused until the detail is built
+	collecting = gc.isenabled()
+	gc.disable()
+	try:
+		columns = izip(records['offset'][order].tolist(), records['offset_bit'][order].tolist(), records['length'][order].tolist())
+		match_list = [{"offset":o, "offset_bit":b, "length":l} for o, b, l in columns]
+		file_name_list = []
+		detail = []
+		for file_id, start, count in izip(file_ids.tolist(), starts.tolist(), counts.tolist()):
+			if file_id in file_info:
+				_, file_name, dir_name, file_size = file_info[file_id]
+				file_name_list.append(file_name)
+				detail.append(makeDetailItem(file_name, dir_name, file_size, match_list[start:start+count]))
+		return file_name_list, detail
+	finally:
+		if collecting:
+			gc.enable()
+
+def formatIndexSearchResult(time_start, cache_query_set, cache_result=[], finished=0, size_searched_file=None):
 	time_end = time.time()
 	summary = {"num_file":0, "num_match":0, "num_directory":0, "MPM":0, "file_size":0, "finished":finished}
 	detail = []
-	algorithm_query_set = AlgorithmConfigInfo.objects.filter(config_flag=1)
-	if cache_result:
-		file_name_list = list(set([r["name"] for r in cache_result]))
-		for file_name in file_name_list:
-			try:    
-				item = {}
-				f = FileInfo.objects.filter(filefullpathname=file_name)[0]
-				item["directory_info"] = f.directory_info.dir_name
-				item["file_size"] = f.filesize
-				item["name"] = file_name
-				item["match_list"] = [{"offset":r["offset"], "offset_bit":r["offset_bit"], "length":r["length"]} for r in cache_result if r["name"]==file_name]
-				item["num_match"] = len(item["match_list"])
-				item["MPM"] = item["num_match"]*1024*1024/item["file_size"] if item["file_size"]!=0 else 0
-				detail.append(item)
-			except Exception, e:
-				print "@@@ FAILED {}-{}".format(Exception, e)
-				continue
-
+	if len(cache_result):
+		file_name_list, detail = formatMatchDetail(cache_result)
 		summary["num_file"] = len(file_name_list)
 		summary["num_match"] = sum([d["num_match"] for d in detail])
 		summary["num_directory"] = len(list(set([d["directory_info"] for d in detail])))
 		summary["MPM"] = sum([d["MPM"] for d in detail])
 		summary["file_size"] = sum(d["file_size"] for d in detail)
 
-	summary["size_searched_file"] = sum([c.config_info.config_content_size for c in cache_query_set]) if cache_query_set else 0
-	summary["size_total_file"] = sum([a.config_content_size for a in algorithm_query_set]) if algorithm_query_set else 0
+	if size_searched_file is None:
+		size_searched_file = cache_query_set.aggregate(size=Sum('config_info__config_content_size'))['size'] if cache_query_set is not None else 0
+	summary["size_searched_file"] = size_searched_file or 0
+	summary["size_total_file"] = sum(getIndexedDirectorySize().values())
 	summary["time_cost"] = "{:.4f}".format(time_end-time_start)
-	summary["rate"] = summary["size_searched_file"]/(time_end-time_start)
+	summary["rate"] = summary["size_searched_file"]/(time_end-time_start) if (time_end-time_start)>0 else 99999999999
 	return {"summary":summary, "detail":detail}
 
 
-def getBlockInfo(_uri, _start, _length):
-	result = {'offset':_start, 'data':'', 'match_array':[], 'bytemap':[0]*_length}
-	# result['data'] = np.fromfile(_uri, dtype=np.uint8).tolist()[_start:_start+_length]
+def getBlockInfo(_uri, _start, _length, _matches=None):
+	return api_getBlockContent(_uri, _start, _length, _matches)
+
+def readFileBlock(_uri, _start, _length):
+	'''
+		(file length, offset, bytes) of _uri in [_start, _start+_length), at most FILE_BLOCK_MAX_SIZE bytes
+		Only the window is mapped, so the bytes are copied once from the page cache
+	'''
 	with open(_uri, 'rb') as f:
-		f.seek(_start, 0)
-		# result['data'] = np.fromfile(f, dtype=np.uint8)
-		data = f.read(_length)
-		data = np.asarray(list(data))
-		data.dtype = np.uint8
-		result['data'] = data.tolist()
-	return result
+		size = os.fstat(f.fileno()).st_size
+		start = max(0, min(_start, size))
+		end = min(size, start+max(0, min(_length, FILE_BLOCK_MAX_SIZE)))
+		if end<=start:
+			return size, start, b""
+		base = start-start%mmap.ALLOCATIONGRANULARITY
+		m = mmap.mmap(f.fileno(), end-base, access=mmap.ACCESS_READ, offset=base)
+		try:
+			return size, start, m[start-base:end-base]
+		finally:
+			m.close()
+
+def getMatchIntervals(_matches, _start, _length):
+	'''
+		The bits the matches cover in [_start, _start+_length) as merged [bit_start, bit_end) intervals,
+		counted in bits from _start; a match is {offset, offset_bit, length} with the length in bits
+	'''
+	window_start, window_end = _start*8, (_start+_length)*8
+	spans = sorted([(m['offset']*8+m.get('offset_bit', 0), m['offset']*8+m.get('offset_bit', 0)+m['length']) for m in _matches])
+	intervals = []
+	for bit_start, bit_end in spans:
+		bit_start, bit_end = max(bit_start, window_start), min(bit_end, window_end)
+		if bit_start>=bit_end:
+			continue
+		if intervals and bit_start<=intervals[-1][1]:
+			intervals[-1][1] = max(intervals[-1][1], bit_end)
+		else:
+			intervals.append([bit_start, bit_end])
+	return [[bit_start-window_start, bit_end-window_start] for bit_start, bit_end in intervals]
 
 def getFileLength(_uri):
 	return os.path.getsize(_uri)
@@ -1440,27 +2457,27 @@ def getFileMatchesInfo(_uri, _matches):
 		m['name'] = _uri
 	return _matches
 
-def api_getBlockContent(_uri, _start, _length):
-	result = {'offset':_start, 'data':'', 'match_array':[], 'bytemap':[0]*_length}
-	# result['data'] = np.fromfile(_uri, dtype=np.uint8).tolist()[_start:_start+_length]
-	with open(_uri, 'rb') as f:
-		f.seek(_start, 0)
-		# result['data'] = np.fromfile(f, dtype=np.uint8)
-		data = f.read(_length)
-		data = np.asarray(list(data))
-		data.dtype = np.uint8
-		result['data'] = data.tolist()
-	return result
+def api_getBlockContent(_uri, _start, _length, _matches=None):
+	'''The base64 form of a block for clients that can not take /api_getBlockBytes/, with the same match intervals'''
+	fileLength, offset, data = readFileBlock(_uri, _start, _length)
+	return {'offset':offset, 'length':len(data), 'fileLength':fileLength, 'encoding':'base64', 'data':base64.b64encode(data),
+		'intervals':getMatchIntervals(_matches or [], offset, len(data))}
 
-def api_initFileContent(_uri, _matches):
+def api_initFileContent(_uri, _matches, entry_id=None, file_id=None):
+	'''The reader parameters of _uri, with entry_id and file_id the matches stay in the match index and only the page count is sent'''
 	result = {'code':1, 'message':''}
 	try:
-		fileLength = getFileLength(_uri)
-		theMatches = getFileMatchesInfo(_uri, _matches)
-		itemNum = 20
-		pageNum = int(math.ceil(len(theMatches)/float(itemNum)))
+		itemNum = FILE_MATCH_PAGE_SIZE
+		if entry_id is not None and file_id is not None:
+			page = getFileMatchPage(entry_id, file_id, 1, itemNum)
+			_uri = page["fileName"]
+			result['message'] = {"fileName":_uri, "matches":"", "pageNum":page["pageNum"], "itemNum":itemNum, "fileLength":getFileLength(_uri),
+				"entryId":entry_id, "fileId":file_id}
+		else:
+			theMatches = getFileMatchesInfo(_uri, _matches)
+			pageNum = int(math.ceil(len(theMatches)/float(itemNum)))
+			result['message'] = {"fileName":_uri, "matches":json.dumps(theMatches, ensure_ascii=False), "pageNum":pageNum, "itemNum":itemNum, "fileLength":getFileLength(_uri)}
 		result['code'] = 0
-		result['message'] = {"fileName":_uri, "matches":json.dumps(theMatches, ensure_ascii=False), "pageNum":pageNum, "itemNum":itemNum, "fileLength":fileLength}
 	except Exception,e:
 		result['message'] = "Something Wrong: {}-{}".format(Exception, e)
 	return result
@@ -1481,16 +2498,12 @@ def fileContentReader(request):
 		return HttpResponse(json.dumps(result), content_type='application/json')
 
 def getRemoteFileContent(_node_ip, _uri, _matches):
-	node_url = u"http://{}:80/api_initFileContent/".format(_node_ip)
 	pay_load = {'_uri':_uri, '_matches':json.dumps(_matches)}
-	r = requests.post(node_url, data=pay_load)
-	return r.json()
+	return postRemote(_node_ip, ("/api_initFileContent/", {'code':1, 'message':'RemoteFileContent Failed'}), pay_load)
 
 def getRemoteBlockContent(_node_ip, _uri, _start, _length):
-	node_url = u"http://{}:80/api_getBlockContent/".format(_node_ip)
 	pay_load = {'_uri':_uri, '_start':_start, '_length':_length}
-	r = requests.post(node_url, data=pay_load)
-	return r.json()
+	return postRemote(_node_ip, ("/api_getBlockContent/", {'code':1, 'message':'RemoteBlockContent Failed'}), pay_load)
 
 def api_addNodeInfo(hostIP, hostName, hostIsAlive, hostDefaultDirectory):
 	result = {'code':1, 'message':'Add Host Info Success!'}
@@ -0,0 +1,398 @@
+# -*- coding: utf-8 -*-
+'''
+Created on 2026-10-18
+
+In-process counterpart of Algorithm/libdivsufsort/examples/bgrep.c.
+
+The index file written by mkindex is the int32 suffix array of the raw files
+in a config, followed by the 2^24-entry 3-gram start position table (GRAM).
+Both the index and the raw files are opened with numpy.memmap and kept open
+for the lifetime of the process, so a search on warm page cache is a handful
+of memory reads instead of a bgrep spawn plus a JSON round trip.
+'''
+import os, json, threading
+import numpy as np
+from Server import patternCompiler
+
+SAIDX_DTYPE = np.dtype('<i4')
+GRAM_BITS = 24
+GRAM_ARRAY_SIZE = 1<<GRAM_BITS
+# mkindex reads the 3-gram of the last two suffixes past the end of T, so buckets may be off by two
+GRAM_SLACK = 2
+MINIMUM_BITS = 16
+MAXIMUM_PATTERN_BITS = 4096*8-16
+MAXIMUM_EVALUATIONS = 1024*1024
+RESULT_SIZE = 65536
+# Candidates whose windows are gathered into one 2D array, and determined bytes compared per step
+VERIFY_CHUNK_ROWS = 1<<18
+VERIFY_COLUMNS = 8
+MAX_RAW_FILE_LENGTH = 0xFFFFFFFF
+
+
+class SearchError(Exception):
+	"""Carries the same code/message pair bgrep would print before exiting"""
+	def __init__(self, code, message):
+		super(SearchError, self).__init__(message)
+		self.code = code
+		self.message = message
+
+
+class RawFileList(object):
+	"""The raw files of a config seen as one virtual file, like smartfile's file_list"""
+	def __init__(self, raw_files):
+		self.names = [r["name"] for r in raw_files]
+		self.offsets = np.array([r["offset"] for r in raw_files], dtype=np.int64)
+		self.lengths = np.array([r["length"] for r in raw_files], dtype=np.int64)
+		self.offsets_in_list = np.cumsum(self.lengths)-self.lengths
+		self.total_len = int(self.lengths.sum()) if len(raw_files) else 0
+		self._maps = [None]*len(raw_files)
+
+	def _map(self, i):
+		m = self._maps[i]
+		if m is None:
+			length = int(self.lengths[i])
+			if length==0:
+				m = np.zeros(0, dtype=np.uint8)
+			else:
+				try:
+					m = np.memmap(self.names[i], dtype=np.uint8, mode='r', offset=int(self.offsets[i]), shape=(length,))
+				except (IOError, OSError, ValueError), e:
+					raise SearchError(4, "open input file failed: {}".format(self.names[i].encode('utf-8')))
+			self._maps[i] = m
+		return m
+
+	def locate(self, offset):
+		"""Index of the file holding the virtual offset, smfile_list_get"""
+		return int(np.searchsorted(self.offsets_in_list, offset, side='right'))-1
+
+	def read(self, offset, size):
+		"""Read up to size bytes from the virtual offset, smfile_list_read"""
+		if offset<0 or offset>=self.total_len or size<=0:
+			return ''
+		i = self.locate(offset)
+		cur_off = offset-int(self.offsets_in_list[i])
+		length = int(self.lengths[i])
+		if cur_off+size<=length:
+			return self._map(i)[cur_off:cur_off+size].tostring()
+		chunks = []
+		while size>0 and i<len(self._maps):
+			chunk = self._map(i)[cur_off:cur_off+size].tostring()
+			chunks.append(chunk)
+			size -= len(chunk)
+			cur_off = 0
+			i += 1
+		return ''.join(chunks)
+
+	def close(self):
+		self._maps = [None]*len(self._maps)
+
+
+def bitsToBytes(bits):
+	"""
+		Converts the leading run of '0'/'1' in bits into bytes, bits_to_bytes in bgrep.c
+		The last byte may be partial, mask tells which of its high bits are determined
+	"""
+	k = 0
+	while k<len(bits) and bits[k] in '01':
+		k += 1
+	run = bits[:k]
+	tail = k%8
+	mask = 0xFF
+	if tail:
+		run += '0'*(8-tail)
+		mask = (0xFF<<(8-tail))&0xFF
+	return ''.join([chr(int(run[m:m+8], 2)) for m in range(0, len(run), 8)]), mask
+
+def compileRegex(regex):
+	"""Per byte mask/value arrays of a '0','1','.' string whose length is a multiple of 8, mmtregex_from_str"""
+	n = len(regex)/8
+	mask = np.zeros(n, dtype=np.uint8)
+	value = np.zeros(n, dtype=np.uint8)
+	for i in range(n):
+		chunk = regex[i*8:i*8+8]
+		mask[i] = int(''.join(['0' if b=='.' else '1' for b in chunk]), 2)
+		value[i] = int(chunk.replace('.', '0'), 2)
+	return mask, value
+
+def stripPattern(pattern):
+	"""Removes the leading and trailing '.' like sa_bitgrep_filelist and validates what is left"""
+	P = pattern.strip('.')
+	if len(P)<=MINIMUM_BITS or len(P)>MAXIMUM_PATTERN_BITS:
+		raise SearchError(1, "Input parameter invalid: too short or too long")
+	if P.strip('01.'):
+		raise SearchError(1, "Input parameter invalid, can only be '0', '1', '.'")
+	return P
+
+
+class BlockIndex(object):
+	"""One mkindex output: the suffix array, the GRAM table and the raw files it covers"""
+	def __init__(self, config):
+		self.index_file = config["index_file"]
+		self.raw_files = RawFileList(config["raw_files"])
+		n = self.raw_files.total_len
+		if n>MAX_RAW_FILE_LENGTH:
+			raise SearchError(6, "overall input file length too huge: {}, should less than: {}".format(n, MAX_RAW_FILE_LENGTH))
+		try:
+			n_suf = os.path.getsize(self.index_file)
+		except OSError:
+			raise SearchError(2, "cannot open index file {}".format(self.index_file.encode('utf-8')))
+		if n_suf<n*SAIDX_DTYPE.itemsize:
+			raise SearchError(2, "index file {} is not correct".format(self.index_file.encode('utf-8')))
+		self.SA = np.memmap(self.index_file, dtype=SAIDX_DTYPE, mode='r', shape=(n,)) if n else np.zeros(0, dtype=SAIDX_DTYPE)
+		self.GRAM = None
+		if n and n_suf>=(n+GRAM_ARRAY_SIZE)*SAIDX_DTYPE.itemsize:
+			self.GRAM = np.memmap(self.index_file, dtype=SAIDX_DTYPE, mode='r', offset=n*SAIDX_DTYPE.itemsize, shape=(GRAM_ARRAY_SIZE,))
+		self.total_len = n
+
+	def close(self):
+		self.SA = None
+		self.GRAM = None
+		self.raw_files.close()
+
+	def saSearch(self, P, start=0, count=None):
+		"""Range of suffixes starting with the bytes P, sa_search_filelist"""
+		count = self.total_len-start if count is None else count
+		m = len(P)
+		if m==0:
+			return start, count
+		read, SA = self.raw_files.read, self.SA
+		lo, hi = start, start+count
+		while lo<hi:
+			mid = (lo+hi)>>1
+			if read(int(SA[mid]), m)<P:
+				lo = mid+1
+			else:
+				hi = mid
+		left, hi = lo, start+count
+		while lo<hi:
+			mid = (lo+hi)>>1
+			if read(int(SA[mid]), m)<=P:
+				lo = mid+1
+			else:
+				hi = mid
+		return left, lo-left
+
+	def saSearchByteMask(self, start, count, c, cmask, coffset):
+		"""Narrows [start, start+count) by the masked byte at coffset, sa_bitsearch_bytemask"""
+		read, SA, n = self.raw_files.read, self.SA, self.total_len
+		def key(i):
+			p = int(SA[i])+coffset
+			return ord(read(p, 1))&cmask if p<n else -1
+		lo, hi = start, start+count
+		while lo<hi:
+			mid = (lo+hi)>>1
+			if key(mid)<c:
+				lo = mid+1
+			else:
+				hi = mid
+		left, hi = lo, start+count
+		while lo<hi:
+			mid = (lo+hi)>>1
+			if key(mid)<=c:
+				lo = mid+1
+			else:
+				hi = mid
+		return left, lo-left
+
+	def gramRange(self, P, mask):
+		"""
+			Range of the SA holding every suffix whose first 3 bytes agree with the determined bits of P
+			The bits left undetermined by P or mask span a contiguous run of GRAM buckets
+		"""
+		if self.GRAM is None or len(P)==0:
+			return 0, self.total_len
+		lo = hi = 0
+		for b in range(3):
+			if b<len(P):
+				m = mask if b==len(P)-1 else 0xFF
+				c = ord(P[b])&m
+				lo = (lo<<8)|c
+				hi = (hi<<8)|c|(~m&0xFF)
+			else:
+				lo = lo<<8
+				hi = (hi<<8)|0xFF
+		start = max(0, int(self.GRAM[lo])-GRAM_SLACK)
+		end = int(self.GRAM[hi+1])+GRAM_SLACK if hi+1<GRAM_ARRAY_SIZE else self.total_len
+		end = min(self.total_len, end)
+		return start, max(0, end-start)
+
+	def saSearchMask(self, P, mask):
+		"""Range of suffixes matching P whose last byte only has the mask bits determined, sa_search_filelist_mask"""
+		if len(P)==0:
+			return 0, self.total_len
+		start, count = self.gramRange(P, mask)
+		if mask==0xFF:
+			return self.saSearch(P, start, count)
+		idx, count = self.saSearch(P[:-1], start, count)
+		if count<=0:
+			return idx, count
+		return self.saSearchByteMask(idx, count, ord(P[-1]), mask, len(P)-1)
+
+	def candidateIndices(self, idx, count, offset):
+		return self.SA[idx:idx+count].astype(np.int64)-offset
+
+	def verify(self, candidates, mask, value, limit=None):
+		"""
+			Keeps the candidates whose raw bytes match the compiled regex, mmtregex_match over a whole chunk at once
+			The kept candidates are in the order given, at most limit of them
+		"""
+		candidates = np.asarray(candidates, dtype=np.int64)
+		length = len(mask)
+		candidates = candidates[(candidates>=0)&(candidates+length<=self.total_len)]
+		# Bytes left all '.' match anything and are never read
+		columns = np.nonzero(mask)[0]
+		mask, value = mask[columns], value[columns]
+		matched, found = [], 0
+		for start in range(0, len(candidates), VERIFY_CHUNK_ROWS):
+			chunk = candidates[start:start+VERIFY_CHUNK_ROWS]
+			chunk = chunk[self.matchWindows(chunk, length, columns, mask, value)]
+			matched.append(chunk)
+			found += len(chunk)
+			if limit is not None and found>=limit:
+				break
+		matched = np.concatenate(matched) if matched else np.zeros(0, dtype=np.int64)
+		return matched[:limit] if limit is not None else matched
+
+	def matchWindows(self, candidates, length, columns, mask, value):
+		"""
+			Boolean array of the candidates whose bytes at columns agree with value under mask
+			The windows inside one raw file are gathered into a 2D uint8 array VERIFY_COLUMNS bytes at a time,
+			so the candidates failing the first bytes are dropped before the rest of their window is read
+		"""
+		raw = self.raw_files
+		ok = np.zeros(len(candidates), dtype=bool)
+		file_index = np.searchsorted(raw.offsets_in_list, candidates, side='right')-1
+		local = candidates-raw.offsets_in_list[file_index]
+		inside = local+length<=raw.lengths[file_index]
+		rows = np.nonzero(inside)[0]
+		rows = rows[np.argsort(file_index[rows], kind='mergesort')]
+		files, starts = np.unique(file_index[rows], return_index=True)
+		for i, file_rows in zip(files.tolist(), np.split(rows, starts[1:])):
+			data, base = raw._map(i), local[file_rows]
+			for c in range(0, len(columns), VERIFY_COLUMNS):
+				window = data[base[:, None]+columns[c:c+VERIFY_COLUMNS]]
+				keep = ((window&mask[c:c+VERIFY_COLUMNS])==value[c:c+VERIFY_COLUMNS]).all(axis=1)
+				file_rows, base = file_rows[keep], base[keep]
+				if len(file_rows)==0:
+					break
+			ok[file_rows] = True
+		# A window running into the next raw file is read through the virtual file, as bgrep does
+		for r in np.nonzero(~inside)[0].tolist():
+			window = np.frombuffer(raw.read(int(candidates[r]), length), dtype=np.uint8)
+			ok[r] = len(window)==length and ((window[columns]&mask)==value).all()
+		return ok
+
+	def bitGrep(self, pattern, result_size=RESULT_SIZE):
+		"""
+			Bit level grep of '0', '1' and '.' over the block, sa_bitgrep_filelist
+			Returns (off_byte, off_bit, len_bit) arrays sorted by off_byte
+		"""
+		P = stripPattern(pattern)
+		Psize = len(P)
+		compiled = patternCompiler.compilePattern(P)
+		off_byte, off_bit = [], []
+		result_pos = 0
+		for i in range(8):
+			if result_pos>=result_size:
+				break
+			length = (Psize+i+7)/8
+			regex = compiled.shiftRegex(i)
+
+			matches = []
+			j = 0
+			while j<length:
+				buf, mask = bitsToBytes(regex[j*8:])
+				k = len(buf)
+				if k<=0:
+					j += 1
+					continue
+				idx, count = self.saSearchMask(buf, mask)
+				if count<=0:
+					break
+				matches.append((count, idx, j))
+				j += max(1, k)
+			if j<length or not matches:
+				continue
+
+			matches.sort()
+			count, idx, offset = matches[0]
+			if len(matches)==1 or count<(count+matches[1][0])*SAIDX_DTYPE.itemsize/4096:
+				candidates = self.candidateIndices(idx, min(count, MAXIMUM_EVALUATIONS), offset)
+			else:
+				count2, idx2, offset2 = matches[1]
+				candidates = np.intersect1d(self.candidateIndices(idx, count, offset), self.candidateIndices(idx2, count2, offset2))
+				if len(candidates)==0:
+					continue
+
+			regex_mask, regex_value = compiled.shiftMasks(i)
+			matched = self.verify(candidates, regex_mask, regex_value, result_size-result_pos)
+			off_byte.append(matched)
+			off_bit.append(np.full(len(matched), i, dtype=np.int64))
+			result_pos += len(matched)
+
+		off_byte = np.concatenate(off_byte) if off_byte else np.zeros(0, dtype=np.int64)
+		off_bit = np.concatenate(off_bit) if off_bit else np.zeros(0, dtype=np.int64)
+		order = np.lexsort((off_bit, off_byte))
+		return off_byte[order], off_bit[order], Psize
+
+	def formatMatches(self, off_byte, off_bit, len_bit):
+		"""Maps virtual offsets back to raw file offsets, create_json_result"""
+		raw = self.raw_files
+		matches = []
+		if len(off_byte)==0:
+			return matches
+		file_index = np.searchsorted(raw.offsets_in_list, off_byte, side='right')-1
+		local = off_byte-raw.offsets_in_list[file_index]
+		# Same boundary check as bgrep, which compares the bit length against the byte length
+		keep = local+len_bit<=raw.lengths[file_index]
+		offset = raw.offsets[file_index]+local
+		for i in np.nonzero(keep)[0]:
+			matches.append({"name":raw.names[file_index[i]], "offset":int(offset[i]), "offset_bit":int(off_bit[i]), "length":len_bit})
+		return matches
+
+	def search(self, pattern):
+		off_byte, off_bit, len_bit = self.bitGrep(pattern)
+		return self.formatMatches(off_byte, off_bit, len_bit)
+
+
+_BLOCK_INDEX_CACHE = {}
+_BLOCK_INDEX_LOCK = threading.Lock()
+
+def openBlockIndex(configFilePathName):
+	"""
+		BlockIndex of a config file, kept open per process
+		The index is reopened when mkindex has rewritten it since it was mapped
+	"""
+	try:
+		st = os.stat(configFilePathName)
+		with open(configFilePathName) as f:
+			config = json.loads(f.read())
+		index_st = os.stat(config["index_file"])
+	except (IOError, OSError, ValueError, KeyError):
+		raise SearchError(2, "json config file {} error".format(configFilePathName))
+	stamp = (st.st_mtime, index_st.st_mtime, index_st.st_size)
+	with _BLOCK_INDEX_LOCK:
+		cached = _BLOCK_INDEX_CACHE.get(configFilePathName)
+		if cached and cached[0]==stamp:
+			return cached[1]
+		block = BlockIndex(config)
+		if cached:
+			cached[1].close()
+		_BLOCK_INDEX_CACHE[configFilePathName] = (stamp, block)
+		return block
+
+def closeBlockIndexes():
+	with _BLOCK_INDEX_LOCK:
+		for stamp, block in _BLOCK_INDEX_CACHE.values():
+			block.close()
+		_BLOCK_INDEX_CACHE.clear()
+
+def searchConfigFile(search_string, configFilePathName):
+	"""Same contract as running `bgrep search_string configFilePathName` and parsing its output"""
+	result = {"code":0, "matches":[]}
+	try:
+		block = openBlockIndex(configFilePathName)
+		result["matches"] = block.search(search_string)
+	except SearchError, e:
+		result = {"code":e.code, "message":"bgrep: {}".format(e.message)}
+	return result
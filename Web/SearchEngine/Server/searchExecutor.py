@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+'''
+Created on 2026-10-18
+
+One long-lived pool of search workers per server process.
+
+Jobs wait in the pool's task queue; at most max_queued of them may be queued
+or running at once, further submissions block for a while and then fail so
+callers can report back-pressure instead of piling up work.
+
+A monitor thread watches the jobs in flight: one running past its deadline is
+failed. Every job tells the monitor which worker took it before it runs, so
+when a worker dies only the job it held is failed; the pool replaces the
+worker and the jobs still queued run as usual.
+
+Concurrent searches for the same pattern over the same index generation share
+one SearchJob from the registry and read its partial results.
+'''
+import atexit, multiprocessing, os, threading, time, traceback
+from multiprocessing.queues import SimpleQueue
+from django.db import connections
+
+# Seconds between two checks of the workers and of the deadlines of the jobs in flight
+MONITOR_INTERVAL = 1
+
+
+class SearchQueueFull(Exception):
+	pass
+
+
+class SearchFuture(object):
+	"""Result of one job, filled in by the pool's result handler thread"""
+	def __init__(self):
+		self._event = threading.Event()
+		self._lock = threading.Lock()
+		self._callbacks = []
+		self._result = None
+		self._error = None
+
+	def done(self):
+		return self._event.is_set()
+
+	def result(self, timeout=None):
+		self._event.wait(timeout)
+		if not self._event.is_set():
+			raise RuntimeError("Search job not finished")
+		if self._error is not None:
+			raise RuntimeError(self._error)
+		return self._result
+
+	def error(self):
+		return self._error
+
+	def addDoneCallback(self, callback):
+		with self._lock:
+			if not self._event.is_set():
+				self._callbacks.append(callback)
+				return
+		callback(self)
+
+	def _finish(self, result=None, error=None):
+		with self._lock:
+			self._result = result
+			self._error = error
+			self._event.set()
+			callbacks, self._callbacks = self._callbacks, []
+		for callback in callbacks:
+			try:
+				callback(self)
+			except Exception, e:
+				print "@@@ Search callback failed--{}, {}".format(Exception, e)
+
+
+# (job token, worker pid) of every job a worker takes, set in the workers by _initWorker
+_STARTED = None
+
+def _initWorker(started):
+	global _STARTED
+	_STARTED = started
+
+
+def _runJob(token, func, args):
+	try:
+		# SimpleQueue writes before returning, the pid is known even if the job kills the worker
+		_STARTED.put((token, os.getpid()))
+		return True, func(*args)
+	except Exception:
+		return False, traceback.format_exc()
+
+
+class SearchExecutor(object):
+	def __init__(self, processes, max_queued, job_timeout=None):
+		self.processes = processes
+		self.max_queued = max_queued
+		self.job_timeout = job_timeout
+		self._pool = None
+		self._workers = set()
+		self._started = None
+		self._pending = 0
+		self._next_token = 0
+		# {SearchFuture: (deadline or None, token)} of the jobs in flight, their pool results and worker pids by token
+		self._running = {}
+		self._results = {}
+		self._owners = {}
+		self._monitor = None
+		self._closed = False
+		self._cond = threading.Condition()
+
+	def _getPool(self):
+		"""The pool, created on first use or after the last one broke, called with the lock held"""
+		if self._pool is None:
+			# Forked workers must not share the parent's database sockets
+			connections.close_all()
+			self._started = SimpleQueue()
+			self._pool = multiprocessing.Pool(processes=self.processes, initializer=_initWorker, initargs=(self._started,))
+			self._workers = self._workerPids(self._pool)
+		if self._monitor is None:
+			# Idle workers the pool replaced since the last jobs took nothing with them
+			self._workers = self._workerPids(self._pool)
+			self._monitor = threading.Thread(target=self._watch, name="SearchExecutorMonitor")
+			self._monitor.daemon = True
+			self._monitor.start()
+		return self._pool
+
+	def _workerPids(self, pool):
+		"""The pool replaces a dead worker by a new process, which changes this set"""
+		return set([worker.pid for worker in pool._pool])
+
+	def _finish(self, future, ok, result):
+		"""Ends a job in flight once, whichever of its callback and the monitor comes first"""
+		with self._cond:
+			running = self._running.pop(future, None)
+			if running is None:
+				return
+			self._results.pop(running[1], None)
+			self._owners.pop(running[1], None)
+			self._pending -= 1
+			self._cond.notify_all()
+		if ok:
+			future._finish(result=result)
+		else:
+			future._finish(error=result)
+
+	def _release(self, future, ok_result):
+		ok, result = ok_result
+		self._finish(future, ok, result)
+
+	def _readStarted(self):
+		"""Records the workers of the jobs that started since the last call, called with the lock held"""
+		tokens = set([token for deadline, token in self._running.values()])
+		while not self._started.empty():
+			token, pid = self._started.get()
+			if token in tokens:
+				self._owners[token] = pid
+
+	def _watch(self):
+		"""Fails the jobs past their deadline and the jobs of the workers that died"""
+		while True:
+			with self._cond:
+				# Woken early by every job that ends, so it stops with the last one
+				self._cond.wait(MONITOR_INTERVAL)
+				now = time.time()
+				if not self._running:
+					self._monitor = None
+					return
+				pool = self._pool
+				dead = set()
+				if pool is not None and not self._closed:
+					self._readStarted()
+					workers = self._workerPids(pool)
+					dead = self._workers-workers
+					self._workers = workers
+				lost = [future for future, (deadline, token) in self._running.items() if self._owners.get(token) in dead]
+				for future in lost:
+					# The pool waits for the result of a lost job forever, even in join
+					result = self._results.get(self._running[future][1])
+					if result is not None:
+						pool._cache.pop(result._job, None)
+				expired = [future for future, (deadline, token) in self._running.items()
+					if deadline is not None and deadline<=now and future not in lost]
+			for future in lost:
+				self._finish(future, False, "Search worker exited abnormally")
+			for future in expired:
+				self._finish(future, False, "Search job exceeded {} seconds".format(self.job_timeout))
+			if dead:
+				print "@@@ Search worker exited abnormally, {} jobs failed".format(len(lost))
+
+	def submitMany(self, jobs, timeout=None):
+		"""
+			Queue [(func, args), ...] as one unit, returns a SearchFuture per job
+			Waits up to timeout seconds for room and raises SearchQueueFull after that
+		"""
+		jobs = list(jobs)
+		if len(jobs)>self.max_queued:
+			raise SearchQueueFull("{} jobs exceed the queue size {}".format(len(jobs), self.max_queued))
+		futures = []
+		with self._cond:
+			if self._closed:
+				raise RuntimeError("Search executor is shut down")
+			deadline = None if timeout is None else time.time()+timeout
+			while self._pending+len(jobs)>self.max_queued:
+				remaining = None if deadline is None else deadline-time.time()
+				if remaining is not None and remaining<=0:
+					raise SearchQueueFull("Search queue is full ({} jobs pending)".format(self._pending))
+				self._cond.wait(remaining)
+			self._pending += len(jobs)
+			pool = self._getPool()
+			job_deadline = None if self.job_timeout is None else time.time()+self.job_timeout
+			tokens = range(self._next_token, self._next_token+len(jobs))
+			self._next_token += len(jobs)
+			for token in tokens:
+				future = SearchFuture()
+				# Registered first, a quick job may call back before apply_async returns
+				self._running[future] = (job_deadline, token)
+				futures.append(future)
+		for future, token, (func, args) in zip(futures, tokens, jobs):
+			callback = lambda ok_result, future=future: self._release(future, ok_result)
+			result = pool.apply_async(_runJob, (token, func, args), callback=callback)
+			with self._cond:
+				if future in self._running:
+					self._results[token] = result
+		return futures
+
+	def submit(self, func, args=(), timeout=None):
+		return self.submitMany([(func, args)], timeout)[0]
+
+	def status(self):
+		with self._cond:
+			return {"processes":self.processes, "pending":self._pending, "max_queued":self.max_queued, "started":self._pool is not None}
+
+	def shutdown(self, wait=True):
+		with self._cond:
+			self._closed = True
+			pool, self._pool = self._pool, None
+			monitor = self._monitor
+		if pool is not None:
+			pool.close()
+			if wait:
+				pool.join()
+		if wait and monitor is not None:
+			monitor.join()
+
+
+_EXECUTOR = None
+_EXECUTOR_LOCK = threading.Lock()
+
+def getSearchExecutor(processes, max_queued, job_timeout=None):
+	"""The executor of this server process, created on first use"""
+	global _EXECUTOR
+	with _EXECUTOR_LOCK:
+		if _EXECUTOR is None:
+			_EXECUTOR = SearchExecutor(processes, max_queued, job_timeout)
+			atexit.register(_EXECUTOR.shutdown)
+		return _EXECUTOR
+
+
+class SearchJob(object):
+	"""One fan-out of a pattern over the index blocks, shared by every request for that pattern"""
+	def __init__(self, key, block_sizes, block_generations=None):
+		self.key = key
+		self.block_sizes = dict(block_sizes)
+		self.block_generations = dict(block_generations or {})
+		self.time_start = time.time()
+		self.search_strings = set()
+		self.results = {}
+		self._cond = threading.Condition()
+
+	def attach(self, search_string):
+		"""Adds a requested search string, returns the finished blocks it has not been given yet"""
+		with self._cond:
+			if search_string in self.search_strings:
+				return {}
+			self.search_strings.add(search_string)
+			return dict(self.results)
+
+	def blockFinished(self, block, matches):
+		"""
+			Records the matches of one block, None when its search failed
+			Returns the search strings attached so far, the caller stores the block for them
+		"""
+		with self._cond:
+			self.results[block] = matches
+			self._cond.notify_all()
+			return set(self.search_strings)
+
+	def abort(self):
+		with self._cond:
+			for block in self.block_sizes:
+				self.results.setdefault(block, None)
+			self._cond.notify_all()
+
+	def finished(self):
+		with self._cond:
+			return len(self.results)>=len(self.block_sizes)
+
+	def wait(self, timeout):
+		"""Sleeps until a block finishes or timeout seconds pass"""
+		with self._cond:
+			if len(self.results)<len(self.block_sizes):
+				self._cond.wait(timeout)
+
+	def status(self):
+		"""[blocks finished, blocks]"""
+		with self._cond:
+			return [len(self.results), len(self.block_sizes)]
+
+	def progress(self):
+		"""(matches so far, bytes of the blocks searched so far, [blocks finished, blocks], names of the finished blocks)"""
+		with self._cond:
+			matches = []
+			size = 0
+			for block, block_matches in self.results.items():
+				if block_matches is not None:
+					matches.extend(block_matches)
+					size += self.block_sizes[block]
+			return matches, size, [len(self.results), len(self.block_sizes)], self.results.keys()
+
+
+class SearchJobRegistry(object):
+	"""The running SearchJobs of this server process by (normalized pattern, index generation)"""
+	def __init__(self):
+		self._jobs = {}
+		self._lock = threading.Lock()
+
+	def attach(self, key, search_string, block_sizes, block_generations=None):
+		"""
+			Joins the running job of key or starts a new one
+			Returns (job, created, finished blocks search_string has not been given yet)
+		"""
+		with self._lock:
+			job = self._jobs.get(key)
+			created = job is None
+			if created:
+				job = SearchJob(key, block_sizes, block_generations)
+				self._jobs[key] = job
+		return job, created, job.attach(search_string)
+
+	def find(self, key):
+		with self._lock:
+			return self._jobs.get(key)
+
+	def findPattern(self, pattern):
+		"""The newest running job of a normalized pattern, over whichever blocks it searches"""
+		with self._lock:
+			jobs = [job for key, job in self._jobs.items() if key[0]==pattern]
+		return max(jobs, key=lambda job: job.time_start) if jobs else None
+
+	def searchStrings(self):
+		"""Every search string attached to a running job"""
+		with self._lock:
+			jobs = self._jobs.values()
+		search_strings = set()
+		for job in jobs:
+			with job._cond:
+				search_strings.update(job.search_strings)
+		return search_strings
+
+	def discard(self, job):
+		with self._lock:
+			if self._jobs.get(job.key) is job:
+				del self._jobs[job.key]
+
+	def __len__(self):
+		with self._lock:
+			return len(self._jobs)
@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+'''
+Created on 2026-10-18
+
+Joins the search results of several patterns by a boolean relation.
+
+A relation is an expression over the patterns, numbered from 0 in the order
+they were searched, like "0 AND (1 OR NOT 2)". "0 NEAR/k 1" keeps the files
+where a match of pattern 0 starts within k bytes of a match of pattern 1, and
+in them only the matches that are that close, like _joint_array in bgrep.c.
+NOT binds tightest, then NEAR, AND and OR. The relations "AND" and "OR" join
+all the patterns, "NOT" keeps the files of pattern 0 none of the others match.
+
+The expression is evaluated on the sets of matched files only. RecordJoin
+works on MATCH_RECORD_DTYPE records: its sets are sorted file id arrays joined
+by sort-merge, and NEAR merges the offsets of every file in one sort.
+DetailJoin works on formatted detail items, for results only known that way,
+with hash joins on the file names. Either way the matches are gathered once,
+for the files the relation selected; a file selected only through NOT has no
+matches to list and is left out.
+'''
+import math, re
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"\s*(?:(\d+)|NEAR/(\d+)|(AND|OR|NOT)\b|(\()|(\)))", re.I)
+
+
+def tokenize(relation):
+	"""[(kind, value), ...] of relation, kind is PATTERN, NEAR, AND, OR, NOT, ( or )"""
+	tokens = []
+	relation = relation.strip()
+	pos = 0
+	while pos<len(relation):
+		m = TOKEN_PATTERN.match(relation, pos)
+		if m is None:
+			raise ValueError("Unexpected {!r} in relation {!r}".format(relation[pos:], relation))
+		pattern, distance, operator, left, right = m.groups()
+		if pattern is not None:
+			tokens.append(("PATTERN", int(pattern)))
+		elif distance is not None:
+			tokens.append(("NEAR", int(distance)))
+		elif operator is not None:
+			tokens.append((operator.upper(), None))
+		else:
+			tokens.append((left or right, None))
+		pos = m.end()
+	return tokens
+
+
+class RelationParser(object):
+	def __init__(self, tokens, num_pattern):
+		self.tokens = tokens
+		self.num_pattern = num_pattern
+		self.pos = 0
+
+	def peek(self):
+		return self.tokens[self.pos][0] if self.pos<len(self.tokens) else None
+
+	def take(self, kind):
+		if self.peek()!=kind:
+			raise ValueError("Expected {} at token {} of the relation".format(kind, self.pos))
+		self.pos += 1
+		return self.tokens[self.pos-1][1]
+
+	def parse(self):
+		node = self.parseOr()
+		if self.pos<len(self.tokens):
+			raise ValueError("Unexpected {} at token {} of the relation".format(self.peek(), self.pos))
+		return node
+
+	def parseOr(self):
+		nodes = [self.parseAnd()]
+		while self.peek()=="OR":
+			self.take("OR")
+			nodes.append(self.parseAnd())
+		return nodes[0] if len(nodes)==1 else ("OR", nodes)
+
+	def parseAnd(self):
+		nodes = [self.parseNear()]
+		while self.peek()=="AND":
+			self.take("AND")
+			nodes.append(self.parseNear())
+		return nodes[0] if len(nodes)==1 else ("AND", nodes)
+
+	def parseNear(self):
+		node = self.parseNot()
+		while self.peek()=="NEAR":
+			distance = self.take("NEAR")
+			other = self.parseNot()
+			if node[0]!="PATTERN" or other[0]!="PATTERN":
+				raise ValueError("NEAR joins two patterns")
+			node = ("NEAR", (node[1], other[1], distance))
+		return node
+
+	def parseNot(self):
+		if self.peek()=="NOT":
+			self.take("NOT")
+			return ("NOT", self.parseNot())
+		return self.parseAtom()
+
+	def parseAtom(self):
+		if self.peek()=="(":
+			self.take("(")
+			node = self.parseOr()
+			self.take(")")
+			return node
+		pattern = self.take("PATTERN")
+		if pattern>=self.num_pattern:
+			raise ValueError("The relation names pattern {} of {}".format(pattern, self.num_pattern))
+		return ("PATTERN", pattern)
+
+
+def parseRelation(relation, num_pattern):
+	"""The expression tree of relation over num_pattern patterns, nodes are (kind, operand) tuples"""
+	if num_pattern<1:
+		raise ValueError("A relation needs at least one pattern")
+	patterns = [("PATTERN", i) for i in range(num_pattern)]
+	kind = relation.strip().upper()
+	if kind in ("AND", "OR"):
+		return patterns[0] if num_pattern==1 else (kind, patterns)
+	if kind=="NOT":
+		return patterns[0] if num_pattern==1 else ("AND", patterns[:1]+[("NOT", p) for p in patterns[1:]])
+	return RelationParser(tokenize(relation), num_pattern).parse()
+
+
+def positivePatterns(node, negated=False, found=None):
+	"""The patterns of node that appear outside of a NOT, their matches make up the merged result"""
+	found = set() if found is None else found
+	kind, operand = node
+	if kind=="PATTERN":
+		if not negated:
+			found.add(operand)
+	elif kind=="NEAR":
+		if not negated:
+			found.update(operand[:2])
+	elif kind=="NOT":
+		positivePatterns(operand, not negated, found)
+	else:
+		for child in operand:
+			positivePatterns(child, negated, found)
+	return sorted(found)
+
+
+def evaluate(node, join):
+	"""The set of files node selects, in the representation of join"""
+	kind, operand = node
+	if kind=="PATTERN":
+		return join.files(operand)
+	if kind=="NEAR":
+		return join.near(*operand)
+	if kind=="NOT":
+		return join.minus(join.universe(), evaluate(operand, join))
+	if kind=="OR":
+		return reduce(join.union, [evaluate(child, join) for child in operand])
+	# AND intersects the positive operands smallest first, then takes the negated ones away
+	positive = sorted([evaluate(child, join) for child in operand if child[0]!="NOT"], key=len)
+	selected = reduce(join.intersect, positive) if positive else join.universe()
+	for child in operand:
+		if child[0]=="NOT" and len(selected):
+			selected = join.minus(selected, evaluate(child[1], join))
+	return selected
+
+
+def nearOther(files, offsets, other, distance):
+	"""
+		Mask of the matches with a match flagged in other within distance in the same file,
+		the matches sorted by file then offset
+	"""
+	n = len(files)
+	index = np.arange(n)
+	before = np.maximum.accumulate(np.where(other, index, -1))
+	after = np.minimum.accumulate(np.where(other, index, n)[::-1])[::-1]
+	b = np.maximum(before, 0)
+	a = np.minimum(after, n-1)
+	near_before = (before>=0) & (files[b]==files) & (offsets-offsets[b]<=distance)
+	near_after = (after<n) & (files[a]==files) & (offsets[a]-offsets<=distance)
+	return near_before | near_after
+
+
+def nearMasks(files_a, offsets_a, files_b, offsets_b, distance):
+	"""(mask of a, mask of b) of the matches within distance of a match of the other pattern in the same file"""
+	files = np.concatenate([files_a, files_b])
+	offsets = np.concatenate([offsets_a, offsets_b]).astype(np.int64)
+	is_b = np.arange(len(files))>=len(files_a)
+	order = np.lexsort((offsets, files))
+	files, offsets, is_b = files[order], offsets[order], is_b[order]
+	mask = np.empty(len(order), dtype=bool)
+	mask[order] = np.where(is_b, nearOther(files, offsets, ~is_b, distance), nearOther(files, offsets, is_b, distance))
+	return mask[:len(files_a)], mask[len(files_a):]
+
+
+class RecordJoin(object):
+	"""File sets of MATCH_RECORD_DTYPE records as sorted unique file id arrays"""
+	def __init__(self, record_list):
+		self.record_list = record_list
+		# pattern: (mask of its close matches, the files NEAR selected)
+		self.near_matches = {}
+
+	def files(self, pattern):
+		return np.unique(self.record_list[pattern]['file_id'])
+
+	def universe(self):
+		return np.unique(np.concatenate([records['file_id'] for records in self.record_list]))
+
+	def intersect(self, s, t):
+		return np.intersect1d(s, t, assume_unique=True)
+
+	def union(self, s, t):
+		return np.union1d(s, t)
+
+	def minus(self, s, t):
+		return np.setdiff1d(s, t, assume_unique=True)
+
+	def near(self, first, second, distance):
+		a, b = self.record_list[first], self.record_list[second]
+		mask_a, mask_b = nearMasks(a['file_id'], a['offset'], b['file_id'], b['offset'], distance)
+		selected = np.unique(a['file_id'][mask_a])
+		for pattern, mask in [(first, mask_a), (second, mask_b)]:
+			if pattern in self.near_matches:
+				old_mask, old_files = self.near_matches[pattern]
+				self.near_matches[pattern] = (old_mask | mask, np.union1d(old_files, selected))
+			else:
+				self.near_matches[pattern] = (mask, selected)
+		return selected
+
+	def merge(self, positive, selected):
+		"""The records of the selected files from the positive patterns, pattern by pattern"""
+		merged = []
+		for pattern in positive:
+			records = self.record_list[pattern]
+			keep = np.in1d(records['file_id'], selected)
+			if pattern in self.near_matches:
+				mask, near_files = self.near_matches[pattern]
+				keep &= mask | ~np.in1d(records['file_id'], near_files)
+			merged.append(records[keep])
+		return np.concatenate(merged) if merged else self.record_list[0][:0]
+
+
+class DetailJoin(object):
+	"""File sets of formatted detail items as sets of file names"""
+	def __init__(self, detail_lists):
+		self.detail_lists = detail_lists
+		self.items = [dict([(d["name"], d) for d in detail]) for detail in detail_lists]
+		# (pattern, name): mask of the close matches of the pattern in that file
+		self.near_masks = {}
+
+	def files(self, pattern):
+		return set(self.items[pattern].viewkeys())
+
+	def universe(self):
+		return set().union(*[items.viewkeys() for items in self.items])
+
+	def intersect(self, s, t):
+		return s & t
+
+	def union(self, s, t):
+		return s | t
+
+	def minus(self, s, t):
+		return s-t
+
+	def near(self, first, second, distance):
+		selected = set()
+		for name in self.items[first].viewkeys() & self.items[second].viewkeys():
+			a = [m["offset"] for m in self.items[first][name]["match_list"]]
+			b = [m["offset"] for m in self.items[second][name]["match_list"]]
+			mask_a, mask_b = nearMasks(np.zeros(len(a), dtype=np.int32), a, np.zeros(len(b), dtype=np.int32), b, distance)
+			if not mask_a.any():
+				continue
+			for pattern, mask in [(first, mask_a), (second, mask_b)]:
+				key = (pattern, name)
+				self.near_masks[key] = self.near_masks[key] | mask if key in self.near_masks else mask
+			selected.add(name)
+		return selected
+
+	def mergeItem(self, name, positive):
+		parts = [(pattern, self.items[pattern][name]) for pattern in positive if name in self.items[pattern]]
+		if len(parts)==1 and (parts[0][0], name) not in self.near_masks:
+			return dict(parts[0][1])
+		merged = dict(parts[0][1], match_list=[], num_match=0, MPM=0)
+		for pattern, item in parts:
+			mask = self.near_masks.get((pattern, name))
+			if mask is None:
+				merged["match_list"].extend(item["match_list"])
+				merged["num_match"] += item["num_match"]
+				merged["MPM"] += item["MPM"]
+			else:
+				match_list = [m for m, keep in zip(item["match_list"], mask.tolist()) if keep]
+				merged["match_list"].extend(match_list)
+				merged["num_match"] += len(match_list)
+				merged["MPM"] += len(match_list)*1024*1024/item["file_size"] if item["file_size"]!=0 else 0
+		return merged
+
+	def merge(self, positive, selected):
+		"""Detail items of the selected files with the matches of the positive patterns, in the order the patterns list them"""
+		selected = set(selected)
+		detail = []
+		for pattern in positive:
+			for d in self.detail_lists[pattern]:
+				if d["name"] in selected:
+					selected.discard(d["name"])
+					detail.append(self.mergeItem(d["name"], positive))
+		return detail
+
+
+def joinResults(join, relation, num_pattern):
+	node = parseRelation(relation, num_pattern)
+	return join.merge(positivePatterns(node), evaluate(node, join))
+
+
+def mergeSearchRecords(record_list, relation):
+	"""The MATCH_RECORD_DTYPE records of the files relation selects from the records of the patterns"""
+	return joinResults(RecordJoin(record_list), relation, len(record_list))
+
+
+def mergeSummary(summaries, detail):
+	summary = {}
+	summary["num_file"] = len(detail)
+	summary["num_match"] = sum([d["num_match"] for d in detail])
+	summary["num_directory"] = len(set([d["directory_info"] for d in detail]))
+	summary["MPM"] = sum([d["MPM"] for d in detail])
+	summary["file_size"] = sum([d["file_size"] for d in detail])
+	count = float(len(summaries))
+	summary["size_searched_file"] = math.ceil(sum([s["size_searched_file"] for s in summaries])/count)
+	summary["size_total_file"] = math.ceil(sum([s["size_total_file"] for s in summaries])/count)
+	summary["time_cost"] = max([s["time_cost"] for s in summaries])
+	summary["rate"] = sum([s["rate"] for s in summaries])
+	summary["finished"] = math.ceil(sum([s["finished"] for s in summaries])/count)
+	return summary
+
+
+def mergeSearchResults(format_result_list, relation):
+	"""
+		Joins the {"summary", "detail"} results of the patterns by relation
+		Raises ValueError on a relation that does not parse
+	"""
+	detail = joinResults(DetailJoin([r["detail"] for r in format_result_list]), relation, len(format_result_list))
+	return {"summary":mergeSummary([r["summary"] for r in format_result_list], detail), "detail":detail}
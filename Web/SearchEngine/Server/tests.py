@@ -1,7 +1,14 @@
 from django.test import TestCase, Client
 from django.contrib.auth.models import User as AuthUser
+from channels.tests import ChannelTestCase, Client as ChannelClient
 import plugins
-import json, os, logging, time
+import pyIndexSearcher, searchExecutor, clusterClient, blockPlanner, buildScheduler, searchRelation, patternCompiler
+import json, os, logging, time, random, shutil, struct, subprocess, tempfile, threading
+import BaseHTTPServer, SocketServer
+import numpy as np
+from multiprocessing.pool import ThreadPool
+from datetime import timedelta
+from django.db import IntegrityError, transaction
 from models import *
 # Create your tests here.
 
@@ -248,7 +255,109 @@ class DirectoryAnalysisTestCase(TestCase):
 		pass
 
 	def test_ImportFileinfoToDatabase(self):
-		pass
+		directory = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, directory)
+		for i in range(30):
+			sub = os.path.join(directory, "d{}".format(i%3), "e{}".format(i%5))
+			if not os.path.isdir(sub):
+				os.makedirs(sub)
+			with open(os.path.join(sub, "f{}".format(i)), "wb") as f:
+				f.write("0"*i)
+		os.symlink(os.path.join(directory, "d0"), os.path.join(directory, "link"))
+		walked = set()
+		for root, dirs, files in os.walk(directory):
+			walked.update([(os.path.join(root, name), os.path.getsize(os.path.join(root, name))) for name in files])
+		file_list = plugins.getFileFromDirectory(directory)
+		self.assertEqual(set([(f['absolute'], f['file_size']) for f in file_list]), walked)
+		self.assertEqual(len(file_list), 30)
+
+		DirectoryInfo.objects.create(dir_name=directory)
+		self.assertTrue(plugins.importFileInfoToDatabase(plugins.iterFileFromDirectory(directory)))
+		self.assertTrue(plugins.importFileInfoToDatabase(file_list))
+		self.assertEqual(FileInfo.objects.filter(dir_name=directory).count(), 30)
+		self.assertEqual(set(FileInfo.objects.values_list('filefullpathname', 'filesize')), walked)
+
+	def test_ImportManyFileinfo(self):
+		directory = "/data/many"
+		DirectoryInfo.objects.create(dir_name=directory)
+		num_file = plugins.IMPORT_BATCH_SIZE*2+7
+		file_list = ({'dir_info':directory, 'file_path':directory, 'file_name':"f{}".format(i), 'absolute':"{}/f{}".format(directory, i),
+			'file_size':i, 'file_flag':0, 'file_mtime':i*0.5, 'file_inode':i} for i in range(num_file))
+		self.assertTrue(plugins.importFileInfoToDatabase(file_list))
+		self.assertEqual(FileInfo.objects.filter(dir_name=directory).count(), num_file)
+		f = FileInfo.objects.get(filefullpathname=directory+"/f9")
+		self.assertEqual((f.filesize, f.mtime, f.inode, f.configured, f.directory_info.dir_name), (9, 4.5, 9, 0, directory))
+		self.assertIsNotNone(f.createtime)
+
+	def test_RescanDirectory(self):
+		directory = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, directory)
+		for name, value in [("BLOCKSIZE", plugins.BLOCKSIZE), ("MARGINSIZE", plugins.MARGINSIZE)]:
+			self.addCleanup(setattr, plugins, name, value)
+		plugins.BLOCKSIZE, plugins.MARGINSIZE = 100, 0
+		index_directory = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, index_directory)
+		# mkindex writes the suffix array of the block, without its gram table
+		def build_index(configFilePathName, configFileName):
+			with open(configFilePathName) as f:
+				config = json.loads(f.read())
+			T = "".join([open(r["name"], "rb").read()[r["offset"]:r["offset"]+r["length"]] for r in config["raw_files"]])
+			with open(config["index_file"], "wb") as f:
+				f.write(struct.pack("<{}i".format(len(T)), *sorted(range(len(T)), key=lambda i: T[i:])))
+			return {"code":0, "message":""}
+		for name, value in [("CONFIGFILEPATH_ABS", index_directory+"/"), ("INDEXFILEPATH_ABS", index_directory+"/"),
+				("indexCreateProgram", build_index), ("startIndexBuildRunner", lambda: threading.Thread()), ("dispatchIndexBuildJobs", lambda: None)]:
+			self.addCleanup(setattr, plugins, name, getattr(plugins, name))
+			setattr(plugins, name, value)
+		self.addCleanup(plugins.cache.clear)
+		def build_queued():
+			plugins.runIndexCreateProgram()
+			job_ids = list(IndexBuildJob.objects.filter(state=BUILD_QUEUED).values_list('id', flat=True))
+			for job_id in job_ids:
+				self.assertEqual(plugins.runIndexBuildJob(job_id)["code"], 0)
+			return len(job_ids)
+		paths = [os.path.join(directory, "f{}".format(i)) for i in range(5)]
+		for path in paths:
+			with open(path, "wb") as f:
+				f.write("0"*60)
+		DirectoryInfo.objects.create(dir_name=directory)
+		self.assertEqual(plugins.directoryAnalysisProgram(directory)["code"], 0)
+		self.assertEqual(plugins.makeAlgorithmConfigFiles()["code"], 0)
+		self.assertEqual(build_queued(), AlgorithmConfigInfo.objects.count())
+		self.assertFalse(AlgorithmConfigInfo.objects.filter(config_flag=0).exists())
+		configs_of = lambda path: set([c.id for c in AlgorithmConfigInfo.objects.all() if path in plugins.getConfigRawFileNames(c)])
+		unchanged = {"new":0, "resized":0, "rewritten":0, "deleted":0, "configs_dropped":0, "configs_rebuilt":0}
+		self.assertEqual(plugins.rescanDirectory(directory), unchanged)
+
+		with open(paths[2], "wb") as f:
+			f.write("1"*60)
+		os.utime(paths[2], (time.time()+100, time.time()+100))
+		result = plugins.rescanDirectory(directory)
+		self.assertEqual((result["rewritten"], result["configs_dropped"], result["configs_rebuilt"]), (1, 0, len(configs_of(paths[2]))))
+		self.assertEqual(set(AlgorithmConfigInfo.objects.filter(config_flag=0).values_list('id', flat=True)), configs_of(paths[2]))
+		self.assertEqual(plugins.rescanDirectory(directory), unchanged)
+		# The rewritten blocks are built again and find the new content
+		self.assertEqual(build_queued(), len(configs_of(paths[2])))
+		self.assertFalse(AlgorithmConfigInfo.objects.filter(config_flag=0).exists())
+		search = lambda pattern: set([m["name"] for config in AlgorithmConfigInfo.objects.filter(config_flag=1)
+			for m in plugins.blockSearchProgram(pattern, plugins.CONFIGFILEPATH_ABS+config.config_name)["matches"]])
+		self.assertEqual(search("00110001"*4), set([paths[2]]))
+		self.assertEqual(search("00110000"*4), set(paths)-set([paths[2]]))
+
+		with open(paths[0], "ab") as f:
+			f.write("0")
+		os.remove(paths[4])
+		with open(os.path.join(directory, "f5"), "wb") as f:
+			f.write("0"*10)
+		result = plugins.rescanDirectory(directory)
+		self.assertEqual((result["new"], result["resized"], result["deleted"]), (1, 1, 1))
+		self.assertTrue(result["configs_dropped"]>=len(configs_of(paths[0])))
+		self.assertFalse(FileInfo.objects.filter(filefullpathname=paths[4]).exists())
+		plugins.makeAlgorithmConfigFile(directory)
+		configs = AlgorithmConfigInfo.objects.filter(dir_name=directory)
+		self.assertEqual(len(set([c.config_name for c in configs])), len(configs))
+		self.assertEqual(sum([c.config_content_size for c in configs]), 60*3+61+10)
+		self.assertEqual(set.union(*[plugins.getConfigRawFileNames(c) for c in configs]), set(paths[:4]+[os.path.join(directory, "f5")]))
 
 class FileAggregationDivisionTestCase(TestCase):
 	"""
@@ -265,7 +374,959 @@ class FileAggregationDivisionTestCase(TestCase):
 		pass
 
 	def test_MakeConfigFile(self):
-		pass
+		files = [("/data/big", 250), ("/data/a", 70), ("/data/b", 60), ("/data/c", 40), ("/data/d", 30), ("/data/e", 0)]
+		blocks = blockPlanner.planBlocks(files, 100, 8)
+		pieces = {}
+		for block in blocks:
+			self.assertTrue(sum([p["length"] for p in block])<=108)
+			for p in block:
+				pieces.setdefault(p["name"], []).append((p["offset"], p["length"]))
+		self.assertEqual(sorted(pieces["/data/big"]), [(0, 108), (100, 108), (200, 50)])
+		self.assertEqual([pieces[name] for name in ["/data/a", "/data/b", "/data/e"]], [[(0, 70)], [(0, 60)], [(0, 0)]])
+		plan = blockPlanner.describePlan(blocks, 100, 8)
+		self.assertEqual((plan["num_block"], plan["size_total"], plan["size_max"], plan["size_min"]), (5, 466, 108, 70))
+		self.assertEqual(plan["fill_ratio"], 466/540.0)
+		# Within the margin a file stays whole, and a tail the previous margin covers gets no piece of its own
+		self.assertEqual([(p["offset"], p["length"]) for p in blockPlanner.splitFile("/data/f", 105, 100, 8)], [(0, 105)])
+		self.assertEqual([(p["offset"], p["length"]) for p in blockPlanner.splitFile("/data/f", 205, 100, 8)], [(0, 108), (100, 105)])
+		self.assertEqual([(p["offset"], p["length"]) for p in blockPlanner.splitFile("/data/f", 0, 100, 8)], [(0, 0)])
+		self.assertEqual(plan["memory_max"], 5*108+(64<<20))
+
+		directory = DirectoryInfo.objects.create(dir_name="/data")
+		for name, size in files:
+			FileInfo.objects.create(dir_name="/data", directory_info=directory, filefullpathname=name, filename=name[6:], filesize=size)
+		plan = plugins.makeAlgorithmConfigFile("/data", dry_run=True)
+		self.assertEqual((plan["num_block"], plan["num_file"], plan["size_total"]), (1, 6, 450))
+		self.assertFalse(AlgorithmConfigInfo.objects.exists())
+		self.assertEqual(plugins.makeAlgorithmConfigFile("/data"), plan)
+		self.assertEqual(AlgorithmConfigInfo.objects.get().config_name, "data-0.config")
+		self.assertEqual(FileInfo.objects.filter(configured=0).count(), 0)
 
 	def test_WriteConfigFilesToDisk(self):
 		pass
+
+
+def write_test_index(directory, contents, with_gram=False):
+	"""
+		Writes raw files and an mkindex style index for the contents,
+		returns the config file path
+	"""
+	raw_files = []
+	for i, content in enumerate(contents):
+		name = os.path.join(directory, "raw{}.bin".format(i))
+		with open(name, "wb") as f:
+			f.write(content)
+		raw_files.append({"name":name, "offset":0, "length":len(content)})
+	T = "".join(contents)
+	SA = sorted(range(len(T)), key=lambda i: T[i:])
+	index_file = os.path.join(directory, "test.index")
+	with open(index_file, "wb") as f:
+		f.write(struct.pack("<{}i".format(len(SA)), *SA))
+		if with_gram:
+			# gram_pos in mkindex.c, reading zeros past the end of T
+			padded = np.frombuffer(T+"\x00\x00", dtype=np.uint8).astype(np.int64)
+			grams = (padded[:-2]<<16)+(padded[1:-1]<<8)+padded[2:]
+			GRAM = np.zeros(pyIndexSearcher.GRAM_ARRAY_SIZE, dtype='<i4')
+			GRAM[1:] = np.cumsum(np.bincount(grams, minlength=pyIndexSearcher.GRAM_ARRAY_SIZE))[:-1]
+			f.write(GRAM.tostring())
+	config_file = os.path.join(directory, "test.config")
+	with open(config_file, "w") as f:
+		f.write(json.dumps({"index_file":index_file, "raw_files":raw_files}))
+	return config_file
+
+def brute_force_bit_search(content, pattern):
+	P = pattern.strip('.')
+	bits = "".join([format(ord(c), '08b') for c in content])
+	result = []
+	for pos in range(len(bits)-len(P)+1):
+		if pos/8+len(P)>len(content):
+			break
+		if all([p=='.' or p==b for p, b in zip(P, bits[pos:pos+len(P)])]):
+			result.append((pos/8, pos%8, len(P)))
+	return result
+
+class IndexSearcherTestCase(TestCase):
+	"""
+		Test Name: IndexSearcherTest
+	"""
+	def setUp(self):
+		random.seed(2026)
+		self.directory = tempfile.mkdtemp()
+		self.content = "".join([random.choice(["\x00", "A", "B", "\xff", chr(random.randint(0, 255))]) for i in range(3000)])
+		self.config_file = write_test_index(self.directory, [self.content])
+
+	def tearDown(self):
+		pyIndexSearcher.closeBlockIndexes()
+		shutil.rmtree(self.directory)
+
+	def test_BitGrepMatchesBruteForce(self):
+		bits = "".join([format(ord(c), '08b') for c in self.content])
+		pattern_list = ["01000001010000100", ".01000001010000100.", "0100000..1000010010000010"]
+		for i in range(10):
+			start = random.randint(0, len(bits)-64)
+			pattern = list(bits[start:start+random.randint(20, 40)])
+			pattern[random.randrange(1, len(pattern)-1)] = '.'
+			pattern_list.append("".join(pattern))
+		for pattern in pattern_list:
+			result = pyIndexSearcher.searchConfigFile(pattern, self.config_file)
+			self.assertEqual(result["code"], 0)
+			found = sorted([(m["offset"], m["offset_bit"], m["length"]) for m in result["matches"]])
+			self.assertEqual(found, brute_force_bit_search(self.content, pattern))
+
+	def test_GramNarrowedSearch(self):
+		gram_directory = tempfile.mkdtemp()
+		try:
+			gram_config_file = write_test_index(gram_directory, [self.content], with_gram=True)
+			block = pyIndexSearcher.openBlockIndex(gram_config_file)
+			self.assertTrue(block.GRAM is not None)
+			for P, mask in [("AB", 0xFF), ("\x00\x00\x00A", 0xFF), ("\xffA", 0xF0), ("B", 0xC0)]:
+				start, count = block.gramRange(P, mask)
+				self.assertTrue(count<block.total_len)
+				self.assertEqual(block.saSearchMask(P, mask)[1], pyIndexSearcher.openBlockIndex(self.config_file).saSearchMask(P, mask)[1])
+			for pattern in ["01000001010000100", ".01000001010000100.", "11111111.1111111111111111"]:
+				result = pyIndexSearcher.searchConfigFile(pattern, gram_config_file)
+				found = sorted([(m["offset"], m["offset_bit"], m["length"]) for m in result["matches"]])
+				self.assertEqual(found, brute_force_bit_search(self.content, pattern))
+		finally:
+			pyIndexSearcher.closeBlockIndexes()
+			shutil.rmtree(gram_directory)
+
+	def test_VectorizedVerify(self):
+		verify_directory = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, verify_directory)
+		contents = [self.content[:1000], self.content[1000:1003], self.content[1003:]]
+		block = pyIndexSearcher.openBlockIndex(write_test_index(verify_directory, contents))
+		self.addCleanup(setattr, pyIndexSearcher, "VERIFY_CHUNK_ROWS", pyIndexSearcher.VERIFY_CHUNK_ROWS)
+		pyIndexSearcher.VERIFY_CHUNK_ROWS = 700
+		candidates = np.array(random.sample(range(-5, len(self.content)+5), len(self.content)), dtype=np.int64)
+		for regex in ["0100000101000010", "........0100000101000010", "010000..........1.00..10........", "."*16]:
+			mask, value = pyIndexSearcher.compileRegex(regex)
+			length = len(mask)
+			expected = [c for c in candidates.tolist() if 0<=c and c+length<=len(self.content)
+				and all([ord(self.content[c+k])&mask[k]==value[k] for k in range(length)])]
+			self.assertEqual(block.verify(candidates, mask, value).tolist(), expected)
+			self.assertEqual(block.verify(candidates, mask, value, 10).tolist(), expected[:10])
+		result = pyIndexSearcher.searchConfigFile("0100000..10000100", write_test_index(verify_directory, [self.content]))
+		found = sorted([(m["offset"], m["offset_bit"], m["length"]) for m in result["matches"]])
+		self.assertEqual(found, brute_force_bit_search(self.content, "0100000..10000100"))
+
+	def test_SearchFromAnotherDirectory(self):
+		work_directory, other_directory = tempfile.mkdtemp(), tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, work_directory)
+		self.addCleanup(shutil.rmtree, other_directory)
+		os.mkdir(os.path.join(work_directory, plugins.CONFIGFILEPATH))
+		write_test_index(os.path.join(work_directory, plugins.CONFIGFILEPATH), [self.content])
+		for name, value in [("WORKPATH_ABS", work_directory), ("CONFIGFILEPATH_ABS", os.path.join(work_directory, plugins.CONFIGFILEPATH))]:
+			self.addCleanup(setattr, plugins, name, getattr(plugins, name))
+			setattr(plugins, name, value)
+		# getBrowserInfo changes the directory of the server process
+		self.addCleanup(os.chdir, os.getcwd())
+		os.chdir(other_directory)
+		pattern = "01000001010000100"
+		expected = brute_force_bit_search(self.content, pattern)
+		result = plugins.blockSearchProgram(pattern, plugins.CONFIGFILEPATH+"test.config")
+		self.assertEqual(sorted([(m["offset"], m["offset_bit"], m["length"]) for m in result["matches"]]), expected)
+
+		# The websocket searches, run by the workers of the executor
+		self.addCleanup(setattr, searchExecutor, "_EXECUTOR", searchExecutor._EXECUTOR)
+		searchExecutor._EXECUTOR = searchExecutor.SearchExecutor(1, 2)
+		self.addCleanup(searchExecutor._EXECUTOR.shutdown)
+		directory = DirectoryInfo.objects.create(dir_name=work_directory)
+		AlgorithmConfigInfo.objects.create(dir_name=work_directory, directory_info=directory, config_name="test.config", config_content="", config_content_size=len(self.content), config_flag=1)
+		# Only the block results are checked, saving them is covered by SearchResultCacheTest
+		self.addCleanup(setattr, plugins, "onIndexSearchFinished", plugins.onIndexSearchFinished)
+		plugins.onIndexSearchFinished = lambda job, name, future: job.blockFinished(name, future.result(0)["matches"])
+		job = plugins.submitIndexSearchPrograms(pattern, AlgorithmConfigInfo.objects.filter(config_flag=1))
+		self.addCleanup(plugins.SEARCH_JOBS.discard, job)
+		deadline = time.time()+10
+		while not job.finished() and time.time()<deadline:
+			job.wait(1)
+		matches = job.results["test.config"]
+		self.assertEqual(sorted([(m["offset"], m["offset_bit"], m["length"]) for m in matches]), expected)
+
+	def test_InvalidPattern(self):
+		for pattern in ["0101", "................................", "0101010101010101010101a"]:
+			result = pyIndexSearcher.searchConfigFile(pattern, self.config_file)
+			self.assertEqual(result["code"], 1)
+
+class SearchExecutorTestCase(TestCase):
+	"""
+		Test Name: SearchExecutorTest
+	"""
+	def setUp(self):
+		self.executor = searchExecutor.SearchExecutor(2, 2)
+
+	def tearDown(self):
+		self.executor.shutdown()
+
+	def test_SubmitMany(self):
+		futures = self.executor.submitMany([(pow, (2, i)) for i in range(2)])
+		self.assertEqual([f.result(10) for f in futures], [1, 2])
+		future = self.executor.submit(int, ("x",))
+		self.assertRaises(RuntimeError, future.result, 10)
+		self.assertTrue("ValueError" in future.error())
+		self.assertEqual(self.executor.status()["pending"], 0)
+
+	def test_QueueFull(self):
+		sleeping = self.executor.submitMany([(time.sleep, (1,)), (time.sleep, (1,))])
+		self.assertRaises(searchExecutor.SearchQueueFull, self.executor.submit, pow, (2, 2), 0.1)
+		self.assertRaises(searchExecutor.SearchQueueFull, self.executor.submitMany, [(pow, (2, 2))]*3)
+		[f.result(10) for f in sleeping]
+		self.assertEqual(self.executor.submit(pow, (2, 2), 1).result(10), 4)
+
+	def test_WorkerDeathFailsOnlyItsJob(self):
+		self.addCleanup(setattr, searchExecutor, "MONITOR_INTERVAL", searchExecutor.MONITOR_INTERVAL)
+		searchExecutor.MONITOR_INTERVAL = 0.1
+		futures = self.executor.submitMany([(time.sleep, (1,)), (os._exit, (1,))])
+		self.assertRaises(RuntimeError, futures[1].result, 10)
+		self.assertTrue("exited abnormally" in futures[1].error())
+		self.assertEqual(futures[0].result(10), None)
+		self.assertEqual(self.executor.status()["pending"], 0)
+		futures = self.executor.submitMany([(pow, (2, i)) for i in range(2)], 1)
+		self.assertEqual([f.result(10) for f in futures], [1, 2])
+		# A job queued behind the one that killed the only worker runs on its replacement
+		executor = searchExecutor.SearchExecutor(1, 2)
+		self.addCleanup(executor.shutdown)
+		futures = executor.submitMany([(os._exit, (1,)), (pow, (2, 3))])
+		self.assertEqual(futures[1].result(10), 8)
+		self.assertRaises(RuntimeError, futures[0].result, 10)
+		self.assertTrue("exited abnormally" in futures[0].error())
+
+	def test_JobTimeout(self):
+		self.addCleanup(setattr, searchExecutor, "MONITOR_INTERVAL", searchExecutor.MONITOR_INTERVAL)
+		searchExecutor.MONITOR_INTERVAL = 0.1
+		executor = searchExecutor.SearchExecutor(1, 1, job_timeout=0.2)
+		self.addCleanup(executor.shutdown, False)
+		future = executor.submit(time.sleep, (2,))
+		self.assertRaises(RuntimeError, future.result, 5)
+		self.assertTrue("exceeded" in future.error())
+		self.assertEqual(executor.status()["pending"], 0)
+
+class IndexBuildSchedulerTestCase(TestCase):
+	"""
+		Test Name: IndexBuildSchedulerTest
+	"""
+	def test_AdmitByMemory(self):
+		scheduler = buildScheduler.IndexBuildScheduler(processes=3, memory_budget=100)
+		release = threading.Event()
+		started = []
+		def build(name):
+			status = scheduler.status()
+			started.append((name, status["memory_used"], len(status["running"])))
+			if name=="blocker":
+				release.wait(5)
+			else:
+				time.sleep(0.05)
+		self.assertTrue(scheduler.submit("blocker", 100, build, ("blocker",)))
+		for name, memory in [("a", 60), ("b", 50), ("c", 40), ("d", 30), ("huge", 200)]:
+			self.assertTrue(scheduler.submit(name, memory, build, (name,)))
+		self.assertFalse(scheduler.submit("a", 60, build, ("a",)))
+		self.assertEqual([job["name"] for job in scheduler.status()["queued"]], ["huge", "a", "b", "c", "d"])
+		release.set()
+		self.assertTrue(scheduler.wait(10))
+		self.assertEqual([s[0] for s in started[:2]], ["blocker", "huge"])
+		self.assertEqual(started[1][1:], (200, 1))
+		self.assertEqual(set([s[0] for s in started[2:4]]), set(["a", "c"]))
+		self.assertTrue(all([used<=100 for name, used, running in started if name!="huge"]))
+		self.assertEqual((scheduler.status()["finished"], scheduler.status()["memory_used"]), (6, 0))
+
+	def test_RecoverIndexBuildJobs(self):
+		tmp = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, tmp)
+		directory = DirectoryInfo.objects.create(dir_name=tmp)
+		dead = subprocess.Popen(["true"])
+		dead.wait()
+		host = plugins.socket.gethostname()
+		jobs = {}
+		for name, worker, attempts in [("dead", "{}:{}".format(host, dead.pid), 1), ("alive", "{}:{}".format(host, os.getppid()), 1), ("exhausted", "{}:{}".format(host, dead.pid), plugins.INDEX_BUILD_ATTEMPTS)]:
+			raw_file = os.path.join(tmp, name)
+			FileInfo.objects.create(dir_name=tmp, directory_info=directory, filefullpathname=raw_file, filename=name, filesize=1000, fileflag=1, configured=1)
+			content = json.dumps({"raw_files":[{"name":raw_file, "offset":0, "length":1000}], "index_file":os.path.join(tmp, name+".index")})
+			config = AlgorithmConfigInfo.objects.create(dir_name=tmp, directory_info=directory, config_name=name+".config", config_content=content, config_content_size=1000)
+			jobs[name] = IndexBuildJob.objects.create(config_info=config, state=BUILD_RUNNING, attempts=attempts, worker=worker, heartbeat=timezone.now())
+		self.assertEqual(plugins.recoverIndexBuildJobs(), {"requeued":1, "failed":1})
+		states = dict([(name, IndexBuildJob.objects.get(id=job.id).state) for name, job in jobs.items()])
+		self.assertEqual(states, {"dead":BUILD_QUEUED, "alive":BUILD_RUNNING, "exhausted":BUILD_FAILED})
+		self.assertEqual(FileInfo.objects.get(filename="dead").fileflag, 0)
+		self.assertEqual(FileInfo.objects.get(filename="alive").fileflag, 1)
+		# A worker silent for too long is gone even if its pid is taken again
+		IndexBuildJob.objects.filter(id=jobs["alive"].id).update(heartbeat=timezone.now()-timedelta(seconds=plugins.INDEX_BUILD_STALE+1))
+		self.assertEqual(plugins.recoverIndexBuildJobs(), {"requeued":1, "failed":0})
+		# The index the dead worker finished is taken without running mkindex again
+		with open(os.path.join(tmp, "dead.index"), "wb") as f:
+			f.truncate(blockPlanner.indexFileSize(1000))
+		self.assertEqual(plugins.runIndexBuildJob(jobs["dead"].id)["code"], 0)
+		job = IndexBuildJob.objects.get(id=jobs["dead"].id)
+		self.assertEqual((job.state, job.attempts), (BUILD_DONE, 2))
+		self.assertEqual(job.config_info.config_flag, 1)
+		self.assertEqual(FileInfo.objects.get(filename="dead").fileflag, 2)
+		self.assertEqual(plugins.runIndexBuildJob(jobs["dead"].id)["code"], 0)
+		self.assertEqual(IndexBuildJob.objects.get(id=jobs["dead"].id).attempts, 2)
+
+	def test_OneBuildRunnerPerHost(self):
+		directory = DirectoryInfo.objects.create(dir_name="/data")
+		config = AlgorithmConfigInfo.objects.create(dir_name="/data", directory_info=directory, config_name="c0.config", config_content=json.dumps({"raw_files":[], "index_file":"/data/c0.index"}), config_content_size=1000)
+		scheduler = buildScheduler.IndexBuildScheduler(processes=1, memory_budget=1<<30)
+		built = []
+		for name, value in [("getIndexBuildScheduler", lambda: scheduler), ("startIndexBuildRunner", lambda: threading.Thread()),
+				("runIndexBuildJob", lambda job_id: built.append(job_id))]:
+			self.addCleanup(setattr, plugins, name, getattr(plugins, name))
+			setattr(plugins, name, value)
+		self.addCleanup(plugins.cache.clear)
+		key = plugins.getIndexBuildRunnerKey()
+		# Another server process of this host runs the builds, this one only queues them
+		plugins.cache.set(key, "{}:1".format(plugins.socket.gethostname()), None)
+		result = plugins.runIndexCreateProgram()
+		job = IndexBuildJob.objects.get(config_info=config)
+		self.assertEqual(job.state, BUILD_QUEUED)
+		self.assertEqual((result["data"]["runner"], result["data"]["queued"], result["data"]["running"]), (plugins.cache.get(key), [], []))
+		self.assertFalse(plugins.stepIndexBuildRunner())
+		# Its lease lapsed, so this one takes over
+		plugins.cache.delete(key)
+		self.assertTrue(plugins.stepIndexBuildRunner())
+		self.assertTrue(scheduler.wait(5))
+		self.assertEqual((built, plugins.cache.get(key)), ([job.id], plugins.getBuildWorker()))
+		self.assertTrue(plugins.claimIndexBuildRunner())
+
+	def test_ResetConfigIsRebuilt(self):
+		tmp = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, tmp)
+		directory = DirectoryInfo.objects.create(dir_name=tmp)
+		index_file = os.path.join(tmp, "c0.index")
+		with open(index_file, "wb") as f:
+			f.truncate(blockPlanner.indexFileSize(1000))
+		content = json.dumps({"raw_files":[], "index_file":index_file})
+		config = AlgorithmConfigInfo.objects.create(dir_name=tmp, directory_info=directory, config_name="c0.config", config_content=content, config_content_size=1000)
+		job = IndexBuildJob.objects.create(config_info=config, state=BUILD_DONE, attempts=1)
+		scheduler = buildScheduler.IndexBuildScheduler(processes=1, memory_budget=1<<30)
+		built = []
+		for name, value in [("getIndexBuildScheduler", lambda: scheduler), ("startIndexBuildRunner", lambda: threading.Thread()),
+				("runIndexBuildJob", lambda job_id: built.append(job_id))]:
+			self.addCleanup(setattr, plugins, name, getattr(plugins, name))
+			setattr(plugins, name, value)
+		self.addCleanup(plugins.cache.clear)
+		# The block was reset to flag 0 after its build, as rescanDirectory does with rewritten files
+		plugins.runIndexCreateProgram()
+		self.assertTrue(scheduler.wait(5))
+		job = IndexBuildJob.objects.get(id=job.id)
+		self.assertEqual((job.state, job.attempts, built), (BUILD_QUEUED, 0, [job.id]))
+		# The old index is not taken for a complete one
+		self.assertFalse(os.path.exists(index_file))
+		self.assertFalse(plugins.indexFileComplete(config))
+
+	def test_DirectoryStatusTelemetry(self):
+		now = timezone.now()
+		for d in range(3):
+			directory = DirectoryInfo.objects.create(dir_name="/data/{}".format(d), createtime=now-timedelta(seconds=300))
+			for name, size in [("built", 400<<20), ("running", 200<<20), ("stuck", 100<<20)]:
+				raw_file = "/data/{}/{}".format(d, name)
+				FileInfo.objects.create(dir_name=directory.dir_name, directory_info=directory, filefullpathname=raw_file, filename=name, filesize=size, fileflag=1)
+				content = json.dumps({"raw_files":[{"name":raw_file, "offset":0, "length":size}], "index_file":raw_file+".index"})
+				config = AlgorithmConfigInfo.objects.create(dir_name=directory.dir_name, directory_info=directory, config_name="{}-{}.config".format(d, name), config_content=content, config_content_size=size)
+				IndexBuildJob.objects.create(config_info=config, state=BUILD_RUNNING, attempts=1, starttime=now-timedelta(seconds=200), heartbeat=now)
+			plugins.markIndexCreated("{}-built.config".format(d), {"bytes_read":400<<20, "read_time":1.5, "sort_time":6.0, "write_time":0.5, "code":0})
+			IndexBuildJob.objects.filter(config_info__config_name="{}-stuck.config".format(d)).update(heartbeat=now-timedelta(seconds=10*plugins.INDEX_BUILD_HEARTBEAT))
+		# Grouped queries, not a few per directory
+		with self.assertNumQueries(4):
+			status = plugins.getDirectoryStatusList()
+		self.assertEqual(len(status["detail"]["unfinished"]), 3)
+		item = status["detail"]["unfinished"][0]
+		self.assertEqual((item["fileNumCreated"], item["fileNumTotal"]), (1, 3))
+		self.assertEqual((item["fileSizeCreated"], item["fileSizeTotal"]), (400<<20, 700<<20))
+		self.assertEqual((item["blocksCreated"], item["blocksTotal"], item["blocksRunning"]), (1, 3, 2))
+		self.assertEqual(item["blocksStalled"], ["0-stuck.config"])
+		self.assertEqual((item["readTime"], item["sortTime"], item["writeTime"]), (1.5, 6.0, 0.5))
+		# 400MB since the first build started 200 seconds ago
+		self.assertAlmostEqual(float(item["rate"]), 2.0, places=1)
+		self.assertAlmostEqual(item["eta"], 150, delta=2)
+		self.assertEqual(status["summary"]["blocksStalled"], 3)
+		self.assertAlmostEqual(status["summary"]["rate"], 6.0, places=1)
+
+class SearchJobRegistryTestCase(TestCase):
+	"""
+		Test Name: SearchJobRegistryTest
+	"""
+	def test_CoalesceSearchJobs(self):
+		registry = searchExecutor.SearchJobRegistry()
+		blocks = [("a.config", 100), ("b.config", 50)]
+		job, created, finished_results = registry.attach(("0101", "g1"), "0101", blocks)
+		self.assertTrue(created)
+		self.assertEqual(finished_results, {})
+		self.assertEqual(job.blockFinished("a.config", [{"name":"a", "offset":1, "offset_bit":0, "length":17}]), set(["0101"]))
+		same_job, created, finished_results = registry.attach(("0101", "g1"), ".0101.", blocks)
+		self.assertTrue(same_job is job)
+		self.assertFalse(created)
+		self.assertEqual(finished_results.keys(), ["a.config"])
+		self.assertTrue(registry.attach(("0101", "g2"), "0101", blocks)[1])
+		matches, size, status, blocks = job.progress()
+		self.assertEqual((len(matches), size, status, blocks), (1, 100, [1, 2], ["a.config"]))
+		self.assertEqual(job.blockFinished("b.config", None), set(["0101", ".0101."]))
+		self.assertTrue(job.finished())
+		registry.discard(job)
+		self.assertTrue(registry.find(("0101", "g1")) is None)
+		self.assertEqual(len(registry), 1)
+
+class PatternCompilerTestCase(TestCase):
+	"""
+		Test Name: PatternCompilerTest
+	"""
+	def setUp(self):
+		patternCompiler.clearPatterns()
+		self.addCleanup(patternCompiler.clearPatterns)
+
+	def test_CanonicalPattern(self):
+		binary = "0100000101000010"*2
+		for search_string, scale in [(binary, 2), ("..."+binary+"....", 2), (".41424142", 16), ("41424142..", 16), ("41424142", 16)]:
+			self.assertEqual(plugins.canonicalSearchString(search_string, scale), binary)
+		self.assertEqual(plugins.hex2bin("4.f"), "0100....1111")
+		pattern = patternCompiler.compilePattern("..0101"+"1"*20+"..0"+"1"*30+".", 2)
+		self.assertEqual((pattern.key, pattern.prefix_bits, pattern.anchor), ("0101"+"1"*20+"..0"+"1"*30, 24, 26))
+		for shift in range(8):
+			mask, value = pyIndexSearcher.compileRegex(pattern.shiftRegex(shift))
+			self.assertEqual((pattern.shiftMasks(shift)[0].tolist(), pattern.shiftMasks(shift)[1].tolist()), (mask.tolist(), value.tolist()))
+		self.assertTrue(patternCompiler.compilePattern("41x2", 16).key is None)
+		self.assertEqual(plugins.canonicalSearchString("........", 2), "........")
+		self.assertEqual((plugins.validString("41424", 16), plugins.validString("41x2", 16), plugins.validString(binary+"..", 2)), (True, False, True))
+		self.assertEqual(plugins.searchStringValid(binary+"0")["code"], 0)
+		# Compiled once, the least recently used pattern goes first
+		self.addCleanup(setattr, patternCompiler, "PATTERN_CACHE_SIZE", patternCompiler.PATTERN_CACHE_SIZE)
+		patternCompiler.PATTERN_CACHE_SIZE = 2
+		first = patternCompiler.compilePattern(binary)
+		self.assertTrue(patternCompiler.compilePattern(binary) is first)
+		patternCompiler.compilePattern("41424142", 16)
+		patternCompiler.compilePattern(binary)
+		patternCompiler.compilePattern("0"*24)
+		self.assertTrue(patternCompiler.compilePattern(binary) is first)
+		self.assertEqual(len(patternCompiler._PATTERNS), 2)
+
+	def test_EquivalentPatternsShareCache(self):
+		directory = DirectoryInfo.objects.create(dir_name="/data")
+		FileInfo.objects.create(dir_name="/data", directory_info=directory, filefullpathname="/data/f0", filename="f0", filesize=1<<20)
+		config = AlgorithmConfigInfo.objects.create(dir_name="/data", directory_info=directory, config_name="c0.config", config_content="", config_content_size=1<<20, config_flag=1)
+		binary = "0100000101000010"*2
+		plugins.saveIndexSearchResult(binary, config.config_name, {"code":0, "matches":[{"name":"/data/f0", "offset":8, "offset_bit":0, "length":32}]})
+		for search_string, scale in [("41424142", 16), (binary+"...", 2)]:
+			result = plugins.api_indexSearchStatus(search_string, scale)
+			self.assertEqual((result["code"], result["data"]["summary"]["num_match"]), (0, 1))
+		self.assertEqual(SearchCacheEntry.objects.filter(search_string=binary).count(), 1)
+		self.assertEqual(SearchResultCache.objects.exclude(search_string=binary).count(), 0)
+
+class SearchRelationTestCase(TestCase):
+	"""
+		Test Name: SearchRelationTest
+	"""
+	def makeResult(self, files):
+		detail = []
+		for name, offsets in files:
+			match_list = [{"offset":o, "offset_bit":0, "length":32} for o in offsets]
+			detail.append({"name":name, "directory_info":"/data", "file_size":1<<20, "match_list":match_list, "num_match":len(offsets), "MPM":len(offsets)})
+		summary = {"size_searched_file":1<<20, "size_total_file":1<<20, "time_cost":1, "rate":1, "finished":1}
+		return {"summary":summary, "detail":detail}
+
+	def test_BooleanRelations(self):
+		r = [self.makeResult([("f0", [0]), ("f1", [100]), ("f2", [0])]),
+			self.makeResult([("f1", [164, 300]), ("f2", [500]), ("f3", [0])]),
+			self.makeResult([("f2", [8])])]
+		names = lambda relation: [d["name"] for d in searchRelation.mergeSearchResults(r, relation)["detail"]]
+		self.assertEqual(names("AND"), ["f2"])
+		self.assertEqual(names("OR"), ["f0", "f1", "f2", "f3"])
+		self.assertEqual(names("NOT"), ["f0"])
+		self.assertEqual(names("0 AND 1"), ["f1", "f2"])
+		self.assertEqual(names("(0 OR 1) AND NOT 2"), ["f0", "f1", "f3"])
+		# Files selected only through NOT have no matches to list
+		self.assertEqual(names("NOT 0"), [])
+		merged = searchRelation.mergeSearchResults(r, "0 AND 1 AND NOT 2")
+		self.assertEqual([(d["name"], d["num_match"]) for d in merged["detail"]], [("f1", 3)])
+		self.assertEqual((merged["summary"]["num_file"], merged["summary"]["num_match"]), (1, 3))
+		# Only the matches within the distance are kept
+		merged = searchRelation.mergeSearchResults(r, "0 NEAR/64 1")
+		self.assertEqual([m["offset"] for m in merged["detail"][0]["match_list"]], [100, 164])
+		self.assertEqual(names("0 NEAR/63 1"), [])
+		for relation in ["0 AND", "3", "0 NEAR/4 (1 OR 2)", "0 XOR 1"]:
+			self.assertRaises(ValueError, searchRelation.mergeSearchResults, r, relation)
+
+	def test_RecordJoin(self):
+		def records(matches):
+			return np.array([(f, o, 0, 32) for f, o in matches], dtype=MATCH_RECORD_DTYPE)
+		r = [records([(0, 0), (1, 100), (2, 0), (1, 400)]), records([(1, 164), (1, 300), (2, 500), (3, 0)])]
+		merged = searchRelation.mergeSearchRecords(r, "0 NEAR/64 1")
+		self.assertEqual(zip(merged["file_id"].tolist(), merged["offset"].tolist()), [(1, 100), (1, 164)])
+		self.assertEqual(sorted(set(searchRelation.mergeSearchRecords(r, "0 AND NOT 1")["file_id"].tolist())), [0])
+		self.assertEqual(len(searchRelation.mergeSearchRecords(r, "OR")), 8)
+		# Sort-merge joins, two results of 100k files each join in milliseconds
+		r = [records([(i, i) for i in range(0, 200000, 2)]), records([(i, i+8) for i in range(0, 200000, 3)])]
+		time_start = time.time()
+		merged = searchRelation.mergeSearchRecords(r, "0 AND 1")
+		self.assertEqual(len(np.unique(merged["file_id"])), len(range(0, 200000, 6)))
+		merged = searchRelation.mergeSearchRecords(r, "0 NEAR/8 1")
+		self.assertEqual(len(merged), 2*len(range(0, 200000, 6)))
+		self.assertTrue(time.time()-time_start<0.5)
+
+class FileBlockTestCase(TestCase):
+	"""
+		Test Name: FileBlockTest
+	"""
+	def setUp(self):
+		fd, self.path = tempfile.mkstemp()
+		self.content = "".join([chr(i%256) for i in range(3*65536+100)])
+		with os.fdopen(fd, "wb") as f:
+			f.write(self.content)
+		self.addCleanup(os.remove, self.path)
+
+	def test_ReadBlockWindow(self):
+		self.assertEqual(plugins.readFileBlock(self.path, 65536+10, 20), (len(self.content), 65536+10, self.content[65536+10:65536+30]))
+		self.assertEqual(plugins.readFileBlock(self.path, len(self.content)-5, 20)[2], self.content[-5:])
+		self.assertEqual(plugins.readFileBlock(self.path, len(self.content)+5, 20)[1:], (len(self.content), b""))
+		matches = [{"offset":9, "offset_bit":4, "length":12}, {"offset":11, "offset_bit":0, "length":8}, {"offset":30, "offset_bit":0, "length":32}]
+		self.assertEqual(plugins.getMatchIntervals(matches, 10, 8), [[0, 16]])
+		self.assertEqual(plugins.getMatchIntervals(matches, 8, 24), [[12, 32], [176, 192]])
+
+	def test_BinaryBlockResponse(self):
+		client = Client()
+		response = client.post("/api_getBlockBytes/", {"_uri":self.path, "_start":100, "_length":16, "_matches":json.dumps([{"offset":104, "offset_bit":2, "length":8}])})
+		self.assertEqual((response.status_code, response["Content-Type"]), (200, "application/octet-stream"))
+		self.assertEqual(response.content, self.content[100:116])
+		self.assertEqual((response["X-Block-Offset"], json.loads(response["X-Match-Intervals"])), ("100", [[34, 42]]))
+		response = client.get("/api_getBlockBytes/", {"_uri":self.path}, HTTP_RANGE="bytes=65530-65545")
+		self.assertEqual((response.status_code, response["Content-Range"]), (206, "bytes 65530-65545/{}".format(len(self.content))))
+		self.assertEqual(response.content, self.content[65530:65546])
+		for byte_range in ["bytes={}-".format(len(self.content)), "bytes=20-10"]:
+			response = client.get("/api_getBlockBytes/", {"_uri":self.path}, HTTP_RANGE=byte_range)
+			self.assertEqual((response.status_code, response["Content-Range"], response.content), (416, "bytes */{}".format(len(self.content)), b""))
+		# However many matches are sent, the header stays bounded
+		matches = [{"offset":i, "offset_bit":0, "length":4} for i in range(20000)]
+		response = client.post("/api_getBlockBytes/", {"_uri":self.path, "_start":0, "_length":4096, "_matches":json.dumps(matches)})
+		intervals = json.loads(response["X-Match-Intervals"])
+		self.assertEqual((len(intervals), intervals[-1], response["X-Match-Intervals-Truncated"]), (plugins.FILE_BLOCK_MAX_HEADER_INTERVALS, [2040, 2044], str(plugins.FILE_MATCH_MAX_PAGE_SIZE)))
+		self.assertEqual(client.post("/api_getBlockBytes/", {"_uri":self.path, "_matches":"{}"}).status_code, 400)
+		self.assertEqual(client.get("/api_getBlockBytes/", {"_uri":self.path+".missing"}).status_code, 404)
+		result = json.loads(client.post("/api_getBlockContent/", {"_uri":self.path, "_start":0, "_length":4}).content)
+		self.assertEqual((result["encoding"], result["data"].decode("base64")), ("base64", self.content[:4]))
+
+	def test_DetailMatchInfo(self):
+		match = {"offset":17, "offset_bit":4, "length_bit":12}
+		row = plugins.getDetailMatchInfo(self.path, [match])
+		self.assertEqual(row.count("<tr"), 1)
+		self.assertIn("0<br>8<br>16<br>24</td>", row)
+		self.assertIn("10 <font color='red'>11 12 </font>13 14 15 16 17 ", row)
+		self.assertIn("00010000 0001<font color='red'>0001 00010010 </font>00010011 ", row)
+		# A match at the end of the file shows the lines that exist, one past the file is left out
+		end = len(self.content)
+		rows = plugins.getDetailMatchInfo(self.path, [{"offset":end-1, "offset_bit":0, "length_bit":8}, {"offset":end, "offset_bit":0, "length_bit":8}])
+		self.assertEqual(rows.count("<tr"), 1)
+		self.assertIn("<font color='red'>63 </font></td>", rows)
+		pool = ThreadPool(4)
+		self.assertEqual(set(pool.map(lambda i: plugins.getDetailMatchInfo(self.path, [match]), range(16))), set([row]))
+		pool.close()
+		response = Client().post("/getDetailMatchInfo/", {"name":self.path, "matches":json.dumps([{"offset":17, "offset_bit":4, "length":12}]), "pageNum":1})
+		self.assertEqual(response.content, row)
+
+class SlowNodeHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+	# Paths of the requests served, the "/busy" ones are answered by a 503
+	posts = []
+
+	def do_POST(self):
+		self.rfile.read(int(self.headers.getheader('content-length', 0)))
+		SlowNodeHandler.posts.append(self.path)
+		if self.path.startswith("/busy"):
+			self.send_response(503)
+			self.end_headers()
+			return
+		time.sleep(0.5)
+		self.send_response(200)
+		self.send_header('Content-Type', 'application/json')
+		self.end_headers()
+		self.wfile.write(json.dumps({'code':0, 'path':self.path}))
+
+	def log_message(self, *args):
+		pass
+
+class SlowNodeServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+	daemon_threads = True
+
+class ClusterClientTestCase(TestCase):
+	"""
+		Test Name: ClusterClientTest
+	"""
+	def setUp(self):
+		self.server = SlowNodeServer(("127.0.0.1", 0), SlowNodeHandler)
+		threading.Thread(target=self.server.serve_forever).start()
+		self.client = clusterClient.ClusterClient(timeout=(1, 2), retries=1, backoff=0, port=self.server.server_address[1])
+
+	def tearDown(self):
+		self.client.close()
+		self.server.shutdown()
+		self.server.server_close()
+
+	def test_PostAllInParallel(self):
+		time_start = time.time()
+		r_list = self.client.postAll(["127.0.0.1"]*4+["127.0.0.2"], "/api_indexSearchStatus/", {'scale':2}, {'code':1, 'data':{}})
+		self.assertTrue(time.time()-time_start<1.5)
+		self.assertEqual([r['code'] for r in r_list], [0, 0, 0, 0, 1])
+		self.assertEqual(r_list[0]['path'], "/api_indexSearchStatus/")
+		self.assertEqual(r_list[4]['node_ip'], "127.0.0.2")
+		self.assertTrue('node_error' in r_list[4] and 'node_error' not in r_list[0])
+		self.assertEqual(plugins.splitRemoteResults(r_list)[1], ["127.0.0.2"])
+
+	def test_OnlyIdempotentPostsAreRetried(self):
+		del SlowNodeHandler.posts[:]
+		r = self.client.post("127.0.0.1", "/busy/status/", {}, {'code':1})
+		self.assertEqual(r['node_error'], "HTTP 503")
+		self.assertEqual(SlowNodeHandler.posts, ["/busy/status/"]*2)
+		del SlowNodeHandler.posts[:]
+		r = self.client.postAll(["127.0.0.1"]*2, "/busy/search/", {}, {'code':1}, idempotent=False)
+		self.assertEqual([x['node_error'] for x in r], ["HTTP 503"]*2)
+		self.assertEqual(SlowNodeHandler.posts, ["/busy/search/"]*2)
+
+class SearchResultCacheTestCase(ChannelTestCase):
+	"""
+		Test Name: SearchResultCacheTest
+	"""
+	def setUp(self):
+		directory = DirectoryInfo.objects.create(dir_name="/data")
+		self.files = [FileInfo.objects.create(dir_name="/data", directory_info=directory, filefullpathname="/data/f{}".format(i), filename="f{}".format(i), filesize=1<<20) for i in range(3)]
+		self.configs = [AlgorithmConfigInfo.objects.create(dir_name="/data", directory_info=directory, config_name="c{}.config".format(i), config_content="", config_content_size=1<<20, config_flag=1) for i in range(2)]
+		plugins.FILE_INFO_CACHE.clear()
+		plugins.cache.delete(plugins.INDEXED_DIRECTORY_SIZE_KEY)
+
+	def test_PackedMatchesHaveNoSizeCap(self):
+		search_string = "0100000101000010"*2
+		matches = [{"name":"/data/f{}".format(i%3), "offset":(1<<33)+i, "offset_bit":i%8, "length":32} for i in range(20000)]
+		self.assertTrue(len(json.dumps(matches))>65535)
+		plugins.saveIndexSearchResult(search_string, "c0.config", {"code":0, "matches":matches})
+		plugins.saveIndexSearchResult(search_string, "c1.config", {"code":0, "matches":[{"name":"/data/unknown", "offset":1, "offset_bit":0, "length":32}]})
+		plugins.saveIndexSearchResult(search_string, "c1.config", {"code":0, "matches":matches[:1]})
+		cache_query_set = plugins.getSearchResultCacheQuerySet(search_string)
+		self.assertEqual(sorted([c.num_match for c in cache_query_set]), [0, 20000])
+		self.assertEqual(cache_query_set[0].search_hash, hashSearchString(search_string))
+		cache_result, _, _ = plugins.getIndexCacheSearchResult(search_string)
+		self.assertEqual(sorted(plugins.unpackMatches(cache_result)), sorted(matches))
+		self.assertEqual(plugins.indexCacheExistJudge(search_string)["code"], 0)
+		self.assertEqual(plugins.indexCacheExistJudge(search_string[:-1])["data"][0], 0)
+
+	def test_EvictWholeSearchStrings(self):
+		matches = [{"name":"/data/f0", "offset":i, "offset_bit":0, "length":32} for i in range(100)]
+		record_size = plugins.MATCH_RECORD_DTYPE.itemsize
+		search_string_list = ["0101010101010101{:04b}".format(i) for i in range(4)]
+		for search_string in search_string_list:
+			for config in self.configs:
+				plugins.saveIndexSearchResult(search_string, config.config_name, {"code":0, "matches":matches})
+		self.assertEqual(plugins.getSearchCacheStatus()["size"], 4*2*100*record_size)
+		plugins.api_indexSearch(search_string_list[0], 2)
+		plugins.api_indexSearch(search_string_list[0], 2)
+		status = plugins.getSearchCacheStatus()
+		self.assertEqual((status["hits"], status["misses"]), (2, 0))
+		# A miss on a search string with nothing cached leaves no entry behind
+		plugins.recordSearchCacheAccess("0101", False)
+		self.assertEqual((plugins.getSearchCacheStatus()["entries"], plugins.getSearchCacheStatus()["misses"]), (4, 0))
+		self.assertEqual(plugins.getSearchCacheEntry(search_string_list[0]).id, plugins.getSearchCacheEntry(search_string_list[0]).id)
+		with self.assertRaises(IntegrityError):
+			with transaction.atomic():
+				SearchCacheEntry.objects.create(search_string=search_string_list[0])
+
+		budget, policy = plugins.SEARCH_CACHE_BUDGET, plugins.SEARCH_CACHE_POLICY
+		try:
+			plugins.SEARCH_CACHE_BUDGET = 2*2*100*record_size
+			plugins.evictSearchCache()
+			self.assertEqual(sorted(plugins.getHistorySearchList()), [search_string_list[0], search_string_list[3]])
+			self.assertEqual(plugins.indexCacheExistJudge(search_string_list[1])["data"][0], 0)
+			self.assertEqual(plugins.indexCacheExistJudge(search_string_list[3])["code"], 0)
+			plugins.SEARCH_CACHE_BUDGET = 2*100*record_size
+			plugins.SEARCH_CACHE_POLICY = "LFU"
+			plugins.evictSearchCache()
+			self.assertEqual(plugins.getHistorySearchList(), [search_string_list[0]])
+		finally:
+			plugins.SEARCH_CACHE_BUDGET, plugins.SEARCH_CACHE_POLICY = budget, policy
+
+		SearchCacheEntry.objects.update(createtime=timezone.now()-timedelta(seconds=plugins.SEARCH_CACHE_TTL+1))
+		# A SearchJob of another process holds the lease of the search string
+		lease = plugins.getSearchRunningKey(search_string_list[0])
+		plugins.cache.set(lease, "otherhost:1:1")
+		self.addCleanup(plugins.cache.delete, lease)
+		self.assertFalse(plugins.expireSearchCacheEntry(search_string_list[0]))
+		self.assertEqual(plugins.evictSearchCache(), 0)
+		job = searchExecutor.SearchJob(("0101", ""), [])
+		plugins.releaseSearchStrings(job, [search_string_list[0]])
+		self.assertEqual(plugins.getRunningSearchStrings(search_string_list), set([search_string_list[0]]))
+		plugins.cache.delete(lease)
+		self.assertTrue(plugins.expireSearchCacheEntry(search_string_list[0]))
+		self.assertEqual(SearchResultCache.objects.count(), 0)
+
+	def test_OnlyChangedBlocksAreSearchedAgain(self):
+		search_string = "0100000101000010"*2
+		for config in self.configs:
+			plugins.saveIndexSearchResult(search_string, config.config_name, {"code":0, "matches":[{"name":"/data/f0", "offset":config.id, "offset_bit":0, "length":32}]})
+		self.assertEqual(plugins.indexCacheExistJudge(search_string)["code"], 0)
+		self.assertTrue(plugins.submitIndexSearchPrograms(search_string, AlgorithmConfigInfo.objects.filter(config_flag=1)) is None)
+
+		AlgorithmConfigInfo.objects.filter(id=self.configs[1].id).update(config_generation=plugins.makeConfigGeneration('{"raw_files":[]}'))
+		AlgorithmConfigInfo.objects.create(dir_name="/new", config_name="c2.config", config_content="", config_content_size=1<<30, config_flag=1)
+		AlgorithmConfigInfo.objects.create(dir_name="/new", config_name="c3.config", config_content="", config_flag=0)
+		self.assertEqual(plugins.indexCacheExistJudge(search_string)["data"], [1, 3])
+		uncached = plugins.getUncachedConfigs(search_string, AlgorithmConfigInfo.objects.filter(config_flag=1))
+		self.assertEqual(sorted([c.config_name for c in uncached]), ["c1.config", "c2.config"])
+		cache_result, _, _ = plugins.getIndexCacheSearchResult(search_string)
+		self.assertEqual(cache_result["offset"].tolist(), [self.configs[0].id])
+
+		plugins.saveIndexSearchResult(search_string, "c1.config", {"code":0, "matches":[]})
+		plugins.saveIndexSearchResult(search_string, "c2.config", {"code":0, "matches":[]})
+		self.assertEqual(plugins.indexCacheExistJudge(search_string)["code"], 0)
+		self.assertEqual(plugins.getSearchResultCacheQuerySet(search_string).count(), 3)
+		self.assertEqual(plugins.getSearchCacheStatus()["size"], plugins.MATCH_RECORD_DTYPE.itemsize)
+
+	def test_FormatGroupsMatchesByFile(self):
+		matches = [{"name":"/data/f{}".format(i%4), "offset":i, "offset_bit":i%8, "length":32} for i in range(1000)]
+		records = plugins.packMatches(matches)
+		self.assertEqual(len(records), 750)
+		for result_list in [matches, records]:
+			format_result = plugins.formatIndexSearchResult(time.time(), None, result_list, 1)
+			detail = dict([(d["name"], d) for d in format_result["detail"]])
+			self.assertEqual(sorted(detail.keys()), ["/data/f0", "/data/f1", "/data/f2"])
+			self.assertEqual(detail["/data/f1"]["match_list"], [{"offset":i, "offset_bit":i%8, "length":32} for i in range(1, 1000, 4)])
+			self.assertEqual((detail["/data/f2"]["num_match"], detail["/data/f2"]["MPM"]), (250, 250))
+			self.assertEqual((format_result["summary"]["num_match"], format_result["summary"]["num_directory"]), (750, 1))
+			self.assertEqual(format_result["summary"]["size_total_file"], 2<<20)
+
+	def test_FileInfoCacheFollowsGeneration(self):
+		self.addCleanup(setattr, plugins, "FILE_INFO_CACHE_TTL", plugins.FILE_INFO_CACHE_TTL)
+		self.addCleanup(plugins.cache.delete, plugins.FILE_INFO_GENERATION_KEY)
+		self.assertEqual(plugins.getFileInfo(["/data/f0"])["/data/f0"][3], 1<<20)
+		FileInfo.objects.filter(filefullpathname="/data/f0").update(filesize=10)
+		self.assertEqual(plugins.getFileInfo(["/data/f0"])["/data/f0"][3], 1<<20)
+		# Another process bumps the shared generation, this one only sees the counter move
+		generation = plugins.cache.get(plugins.FILE_INFO_GENERATION_KEY, 0)
+		plugins.cache.set(plugins.FILE_INFO_GENERATION_KEY, generation+1, None)
+		self.assertEqual(plugins.getFileInfo(["/data/f0"])["/data/f0"][3], 10)
+		FileInfo.objects.filter(filefullpathname="/data/f0").delete()
+		plugins.FILE_INFO_CACHE_TTL = 0
+		time.sleep(0.01)
+		self.assertEqual(plugins.getFileInfo(["/data/f0", "/data/f1"]).keys(), ["/data/f1"])
+		plugins.FILE_INFO_CACHE_TTL = 60
+
+		AlgorithmConfigInfo.objects.update(config_content=json.dumps({"raw_files":[]}))
+		self.assertEqual(plugins.getIndexedDirectorySize(), {"/data":2<<20})
+		AlgorithmConfigInfo.objects.filter(id=self.configs[0].id).update(config_flag=0)
+		self.assertEqual(plugins.getIndexedDirectorySize(), {"/data":2<<20})
+		plugins.markIndexCreated("c1.config")
+		self.assertEqual(plugins.getIndexedDirectorySize(), {"/data":1<<20})
+		plugins.dropAlgorithmConfigs(list(AlgorithmConfigInfo.objects.filter(id=self.configs[1].id)))
+		self.assertEqual(plugins.getIndexedDirectorySize(), {})
+
+	def test_PushSearchProgress(self):
+		search_string = "0100000101000010"*2
+		plugins.saveIndexSearchResult(search_string, "c0.config", {"code":0, "matches":[{"name":"/data/f0", "offset":8, "offset_bit":0, "length":32}]})
+		configs = AlgorithmConfigInfo.objects.filter(config_name="c1.config")
+		job = plugins.SEARCH_JOBS.attach(plugins.searchJobKey(search_string, configs), search_string, [("c1.config", 1<<20)], [("c1.config", "")])[0]
+		client = ChannelClient()
+		client.send_and_consume(u"websocket.receive", {"path":"/indexSearchStatus/", "text":json.dumps({"type":"indexSearchStatus", "searchString":search_string, "scale":2})})
+		snapshot = json.loads(client.receive()["text"])["summary"]
+		self.assertEqual((snapshot["delta"], snapshot["finished"], snapshot["blocks"], snapshot["num_match"]), (0, 0, ["c0.config"], 1))
+		self.assertTrue(client.receive() is None)
+		self.addCleanup(plugins.cache.delete, plugins.getSearchEventCountKey(search_string))
+		with self.assertNumQueries(0):
+			counts = plugins.getIndexSearchCounts([search_string])
+		self.assertEqual(counts, [(0, 0)])
+
+		future = searchExecutor.SearchFuture()
+		future._finish(result={"code":0, "matches":[{"name":"/data/f1", "offset":16, "offset_bit":2, "length":32}]})
+		plugins.onIndexSearchFinished(job, "c1.config", future)
+		# The published delta wakes the followers of several patterns too, in every process
+		self.assertEqual(plugins.waitIndexSearchProgress([search_string], counts, 0), [(1, -1)])
+		delta = json.loads(client.receive()["text"])
+		self.assertEqual((delta["summary"]["delta"], delta["summary"]["finished"], delta["summary"]["block"]), (1, 1, "c1.config"))
+		self.assertEqual([d["name"] for d in delta["detail"]], ["/data/f1"])
+		self.assertEqual(delta["summary"]["size_searched_file"], 1<<20)
+		self.assertEqual(client.receive()["text"], "over")
+		self.assertEqual(len(plugins.SEARCH_JOBS), 0)
+		self.assertEqual(plugins.getRunningSearchStrings([search_string]), set())
+		self.assertEqual(plugins.indexCacheExistJudge(search_string)["code"], 0)
+
+	def test_SearchQueueFullIsNotFollowed(self):
+		search_string = "0100000101000010"*2
+		def submit(*args):
+			raise searchExecutor.SearchQueueFull("4096 jobs queued")
+		self.addCleanup(setattr, plugins, "submitIndexSearchPrograms", plugins.submitIndexSearchPrograms)
+		plugins.submitIndexSearchPrograms = submit
+		client = ChannelClient()
+		client.send_and_consume(u"websocket.receive", {"path":"/indexSearch/", "text":json.dumps({"type":"searchInformation", "searchString":search_string})})
+		result = json.loads(client.receive()["text"])
+		self.assertEqual(result["code"], 1)
+		self.assertTrue("queue is full" in result["message"])
+		self.assertEqual(client.receive()["text"], "over")
+		self.assertTrue(client.receive() is None)
+		plugins.publishIndexSearchBlock(searchExecutor.SearchJob((search_string, ""), [("c0.config", 1<<20)]), "c0.config", [])
+		self.assertTrue(client.receive() is None)
+		plugins.cache.delete(plugins.getSearchEventCountKey(search_string))
+
+	def test_HistoryStatisticIsIncremental(self):
+		def search(search_string, matches, config_generation=""):
+			for config in self.configs:
+				block_matches = [{"name":"/data/f{}".format(f), "offset":o, "offset_bit":0, "length":32} for name, f, o in matches if name==config.config_name]
+				plugins.saveIndexSearchResult(search_string, config.config_name, {"code":0, "matches":block_matches}, config_generation)
+		a, b, c = "0100000101000010"*2, "0110000101100010"*2, "0111000101110010"*2
+		search(a, [("c0.config", 0, 8)])
+		search(b, [("c0.config", 0, 8), ("c0.config", 1, 16), ("c1.config", 2, 24)])
+		plugins.summarizeSearchHistory(a)
+		plugins.summarizeSearchHistory(b)
+		statistic = plugins.getHistoryStatistic()
+		self.assertEqual(statistic["maximum"]["num_file"], 3)
+		self.assertEqual(statistic["average"]["num_match"], 2.0)
+		self.assertEqual(statistic["average"]["coverage"], 1.0)
+		# The same as recomputing every search string from its matches
+		self.assertEqual(plugins.historySearchStatisticUpdateProgram()["code"], 0)
+		self.assertEqual(plugins.getHistoryStatistic(), statistic)
+		with self.assertNumQueries(2):
+			plugins.getHistoryStatistic()
+		# A search summarized again replaces its old summary, an evicted one leaves the statistic
+		search(a, [("c0.config", 0, 8), ("c1.config", 1, 8)], "rebuilt")
+		plugins.summarizeSearchHistory(a)
+		self.assertEqual(plugins.getHistoryStatistic()["average"]["num_match"], 2.5)
+		plugins.dropSearchCacheEntry(b)
+		statistic = plugins.getHistoryStatistic()
+		self.assertEqual((statistic["maximum"]["num_file"], statistic["average"]["num_match"]), (2, 2.0))
+		# The detail of a search cached without a summary summarizes it
+		search(c, [("c1.config", 2, 8)])
+		detail = plugins.getHistorySearchDetail(c)
+		self.assertEqual(detail["struct_info"]["searchString"]["num_match"], 1)
+		self.assertEqual(plugins.getHistoryStatistic()["average"]["num_match"], 1.5)
+
+	def test_MultiPatternCacheJoin(self):
+		a, b = "0100000101000010"*2, "0110000101100010"*2
+		for search_string, files in [(a, [0, 1]), (b, [1, 2])]:
+			for config in self.configs:
+				matches = [{"name":"/data/f{}".format(f), "offset":config.id*8, "offset_bit":0, "length":32} for f in files]
+				plugins.saveIndexSearchResult(search_string, config.config_name, {"code":0, "matches":matches})
+		result = plugins.getMultiIndexCacheSearchResult([a, b], "AND")
+		self.assertEqual([(d["name"], d["num_match"]) for d in result["detail"]], [("/data/f1", 4)])
+		self.assertEqual(result["summary"]["size_searched_file"], 2<<20)
+		result = plugins.api_multiIndexSearchStatus([a.decode('utf-8'), b.decode('utf-8')], "0 AND NOT 1")
+		self.assertEqual((result["code"], [d["name"] for d in result["data"]["detail"]]), (0, ["/data/f0"]))
+
+	def test_HistoryDetailPages(self):
+		search_string = "0100000101000010"*2
+		block_matches = {"c0.config":[(0, 8), (0, 16), (1, 24), (0, 32)], "c1.config":[(1, 8), (2, 16), (1, 40)]}
+		for config in self.configs:
+			matches = [{"name":"/data/f{}".format(f), "offset":o, "offset_bit":0, "length":32} for f, o in block_matches[config.config_name]]
+			matches.append({"name":"/data/unknown", "offset":1, "offset_bit":0, "length":32})
+			plugins.saveIndexSearchResult(search_string, config.config_name, {"code":0, "matches":matches})
+		self.addCleanup(setattr, plugins, "HISTORY_PIE_TOP", plugins.HISTORY_PIE_TOP)
+		plugins.HISTORY_PIE_TOP = 2
+		first = plugins.getHistorySearchDetail(search_string, "num_match", limit=2)
+		self.assertEqual(first["struct_info"]["searchString"]["num_file"], 3)
+		self.assertEqual([(p["label"], p["value"]) for p in first["pie_info"]], [("/data/f2", 1<<20), ("/data/f1", 1<<20), ("other", 1<<20)])
+		items = list(first["table_info"])
+		# Ties in num_match come newest summary row first
+		self.assertEqual([(d["name"], d["num_match"]) for d in items], [("/data/f1", 3), ("/data/f0", 3)])
+		self.assertEqual((items[0]["file_id"], "match_list" in items[0]), (self.files[1].id, False))
+		page = plugins.getFileMatchPage(first["entry_id"], items[0]["file_id"], 1, 2)
+		self.assertEqual(([m["offset"] for m in page["matches"]], page["pageNum"]), ([8, 24], 2))
+		second = plugins.getHistorySearchDetail(search_string, "num_match", first["next_cursor"], limit=2)
+		self.assertTrue("pie_info" not in second)
+		self.assertEqual(([d["name"] for d in second["table_info"]], second["next_cursor"]), (["/data/f2"], None))
+		jumped = plugins.getHistorySearchDetail(search_string, "num_match", offset=2, limit=2)
+		self.assertEqual([d["name"] for d in jumped["table_info"]], ["/data/f2"])
+
+		response = Client().post("/getHistoryDetail/", {"searchString":search_string, "limit":2, "cursor":first["next_cursor"]})
+		self.assertTrue(response.streaming)
+		page = json.loads("".join(response.streaming_content))
+		self.assertEqual(([d["name"] for d in page["table_info"]], page["num_file"]), (["/data/f2"], 3))
+		response = Client().post("/getHistoryDetail/", {"searchString":search_string, "cursor":"not a cursor"})
+		self.assertEqual(json.loads(response.content)["code"], 1)
+
+	def test_FileMatchIndex(self):
+		search_string = "0100000101000010"*2
+		# c1 finds again the matches of c0 in the block margin
+		block_matches = {"c0.config":[(o, 0) for o in range(0, 800, 10)], "c1.config":[(o, 0) for o in range(1000, 600, -20)]+[(700, 4)]}
+		for config in self.configs:
+			matches = [{"name":"/data/f0", "offset":o, "offset_bit":b, "length":32} for o, b in block_matches[config.config_name]]
+			plugins.saveIndexSearchResult(search_string, config.config_name, {"code":0, "matches":matches})
+		entry_id = plugins.getHistorySearchDetail(search_string)["entry_id"]
+		summary = SearchFileSummary.objects.get(search_entry_id=entry_id, file_info=self.files[0])
+		offsets = sorted(set([o for o, b in block_matches["c0.config"]+block_matches["c1.config"]]))
+		self.assertEqual(summary.num_match, len(offsets)+1)
+		first = plugins.getFileMatchPage(entry_id, self.files[0].id, 1, 20)
+		self.assertEqual(([m["offset"] for m in first["matches"]], first["pageNum"]), (offsets[:20], 5))
+		second = plugins.getFileMatchPage(entry_id, self.files[0].id, item_num=20, cursor=first["next_cursor"])
+		self.assertEqual((second["page"], [m["offset"] for m in second["matches"]]), (2, offsets[20:40]))
+		# Jumping to an offset lands on the page of the first match at or after it
+		jumped = plugins.getFileMatchPage(entry_id, self.files[0].id, item_num=20, offset=705)
+		self.assertEqual((jumped["page"], jumped["start"]), (4, 60))
+		self.assertEqual([(m["offset"], m["offset_bit"]) for m in jumped["matches"][10:13]], [(700, 0), (700, 4), (710, 0)])
+		self.assertEqual([m["offset"] for m in plugins.getFileMatchRange(entry_id, self.files[0].id, 698, 4)], [700, 700])
+		self.assertEqual([m["offset"] for m in plugins.getFileMatchRange(entry_id, self.files[0].id, 983, 20)], [980, 1000])
+		# The index counts in the cache size along with the cached blocks, once however often it is summarized
+		records_size = (len(block_matches["c0.config"])+len(block_matches["c1.config"]))*plugins.MATCH_RECORD_DTYPE.itemsize
+		index_size = summary.num_match*plugins.MATCH_INDEX_DTYPE.itemsize
+		self.assertEqual(plugins.getSearchCacheStatus()["size"], records_size+index_size)
+		plugins.summarizeSearchHistory(search_string)
+		self.assertEqual(plugins.getSearchCacheStatus()["size"], records_size+index_size)
+		# Rows summarized before the index existed are rebuilt from their blocks on first use
+		SearchFileSummary.objects.filter(search_entry_id=entry_id).update(matches=b"")
+		SearchCacheEntry.objects.filter(id=entry_id).update(size=records_size)
+		self.assertEqual(plugins.getFileMatchPage(entry_id, self.files[0].id, 4, 20)["matches"], jumped["matches"])
+		self.assertNotEqual(bytes(SearchFileSummary.objects.get(search_entry_id=entry_id, file_info=self.files[0]).matches), b"")
+		self.assertEqual(plugins.getSearchCacheStatus()["size"], records_size+index_size)
+
+		client = Client()
+		result = json.loads(client.get("/api_getFileMatches/", {"entryId":entry_id, "fileId":self.files[0].id, "itemNum":20, "cursor":first["next_cursor"]}).content)
+		self.assertEqual((result["code"], result["message"]["matches"]), (0, second["matches"]))
+		result = json.loads(client.post("/api_getFileMatches/", {"entryId":entry_id, "fileId":self.files[0].id, "_start":698, "_length":4}).content)
+		self.assertEqual(len(result["message"]["matches"]), 2)
+		self.assertEqual(json.loads(client.get("/api_getFileMatches/", {"entryId":entry_id, "fileId":self.files[1].id}).content)["code"], 1)
+		response = client.post("/fileContentReader/", {"_uri":"", "entryId":entry_id, "fileId":self.files[1].id})
+		self.assertEqual(json.loads(response.content)["code"], 1)
+
+
+class DirectoryStatusTestCase(ChannelTestCase):
+	"""
+		Test Name: DirectoryStatusTest
+	"""
+	def setUp(self):
+		directory = DirectoryInfo.objects.create(dir_name="/data")
+		for i in range(3):
+			FileInfo.objects.create(dir_name="/data", directory_info=directory, filefullpathname="/data/f{}".format(i), filename="f{}".format(i), filesize=1<<20)
+		for name, value in [("DASHBOARD_STATUS_INTERVAL", 0.05), ("DASHBOARD_STATUS_TTL", 60)]:
+			self.addCleanup(setattr, plugins, name, getattr(plugins, name))
+			setattr(plugins, name, value)
+		self.addCleanup(plugins.cache.clear)
+		plugins.cache.clear()
+
+	def test_BroadcastToEveryDashboard(self):
+		clients = [ChannelClient() for i in range(2)]
+		for client in clients:
+			client.send_and_consume(u"websocket.receive", {"path":"/indexCreate/", "text":"createInformation"})
+			snapshot = json.loads(client.receive()["text"])
+			self.assertEqual(snapshot["summary"]["fileNumTotal"], 3)
+		# Served from the cache, however many dashboards poll
+		with self.assertNumQueries(0):
+			plugins.getCachedDirectoryStatusList()
+		self.assertEqual(len(plugins.updateDirectoryStatusFollowers()), 2)
+		for client in clients:
+			deadline = time.time()+5
+			message = client.receive()
+			while message is None and time.time()<deadline:
+				time.sleep(0.01)
+				message = client.receive()
+			self.assertEqual(json.loads(message["text"])["summary"]["fileNumTotal"], 3)
+		for client in clients:
+			client.send_and_consume(u"websocket.disconnect", {"path":"/indexCreate/"})
+		self.assertEqual(plugins.updateDirectoryStatusFollowers(), [])
+		plugins._DASHBOARD_BROADCASTER.join(5)
+		self.assertFalse(plugins._DASHBOARD_BROADCASTER.is_alive())
+		self.assertTrue(plugins.cache.get(plugins.DASHBOARD_BROADCASTER_KEY) is None)
+
+	def test_SilentDashboardExpires(self):
+		self.addCleanup(setattr, plugins, "DASHBOARD_FOLLOWER_TTL", plugins.DASHBOARD_FOLLOWER_TTL)
+		plugins.DASHBOARD_FOLLOWER_TTL = 0.3
+		client = ChannelClient()
+		client.send_and_consume(u"websocket.receive", {"path":"/indexCreate/", "text":"createInformation"})
+		# Kept followed by its messages
+		for i in range(6):
+			time.sleep(0.1)
+			client.send_and_consume(u"websocket.receive", {"path":"/indexCreate/", "text":"createInformationAlive"})
+		self.assertTrue(plugins._DASHBOARD_BROADCASTER.is_alive())
+		self.assertEqual(len(plugins.updateDirectoryStatusFollowers()), 1)
+		# Its disconnect never arrives, the broadcaster stops once it went silent
+		plugins._DASHBOARD_BROADCASTER.join(5)
+		self.assertFalse(plugins._DASHBOARD_BROADCASTER.is_alive())
+		self.assertEqual(plugins.updateDirectoryStatusFollowers(), [])
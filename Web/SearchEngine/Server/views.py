@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 from django.shortcuts import render, render_to_response
-from django.http import HttpResponse, HttpResponseRedirect
+from django.http import HttpResponse, HttpResponseRedirect, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_protect, csrf_exempt
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User as AuthUser
@@ -13,6 +13,7 @@ from plugins import getFileFromDirectory, getDirectoryStatusList, importFileInfo
 # Create your views here.
 import subprocess
 import json
+import re
 import math
 import time
 import os
@@ -121,7 +122,6 @@ def directoryAddition(request):
 		return HttpResponseRedirect('/dashboard/')
 
 def history(request):
-	plugins.runHistorySearchStatisticUpdateProgram()
 	search_string = request.GET.get("searchString", "")
 	if search_string:
 		return render_to_response("historyDetail.html", {"request": request, "search_string": search_string})
@@ -133,10 +133,16 @@ def history(request):
 def getHistoryDetail(request):
 	search_string = request.POST.get("searchString", "")
 	if search_string:
-		result = plugins.getHistorySearchDetail(search_string)
-		return HttpResponse(json.dumps(result))
+		try:
+			cursor = request.POST.get("cursor") or None
+			offset = int(request.POST.get("offset", 0))
+			limit = int(request.POST.get("limit", plugins.HISTORY_DETAIL_PAGE_SIZE))
+			detail = plugins.getHistorySearchDetail(search_string, request.POST.get("orderBy", "num_match"), cursor, offset, limit)
+		except (ValueError, TypeError), e:
+			return HttpResponse(json.dumps({"code":1, "message":"Invalid history detail page! {}".format(e)}))
+		return StreamingHttpResponse(plugins.streamHistorySearchDetail(detail))
 	else:
-		HttpResponseRedirect('/history/')
+		return HttpResponseRedirect('/history/')
 
 @csrf_exempt
 def addDirectorytoDatabase(request):
@@ -232,14 +238,21 @@ def getDirectoryBrowserInfo(request):
 def getDetailMatchInfo(request):
 
 	file_name = request.POST.get("name", "")
-	matches = json.loads(request.POST.get("matches", ""))
 	pageNum = int(request.POST.get("pageNum", ""))
 
-	match_list = matches[(pageNum-1)*5:pageNum*5]
-	for i in match_list:
-		i["length_bit"] = i["length"]
-
-	result = plugins.getDetailMatchInfo(file_name, match_list)
+	try:
+		if request.POST.get("entryId") and request.POST.get("fileId"):
+			# The page comes from the server side match index, the client sends only the ids
+			page = plugins.getFileMatchPage(int(request.POST["entryId"]), int(request.POST["fileId"]), pageNum, plugins.DETAIL_MATCH_PAGE_SIZE)
+			file_name, match_list = page["fileName"], page["matches"]
+		else:
+			matches = json.loads(request.POST.get("matches", ""))
+			match_list = matches[(pageNum-1)*plugins.DETAIL_MATCH_PAGE_SIZE:pageNum*plugins.DETAIL_MATCH_PAGE_SIZE]
+		for i in match_list:
+			i["length_bit"] = i["length"]
+		result = plugins.getDetailMatchInfo(file_name, match_list)
+	except (IOError, OSError, ValueError), e:
+		return HttpResponse("{}".format(e), status=404, content_type='text/plain')
 	#result = unicode(result, errors="ignore")
 	#print result
 	#return HttpResponse(json.dumps(result), content_type="application/json")
@@ -318,14 +331,18 @@ def api_indexCreateStatus(request):
 	else:
 		return HttpResponse(json.dumps(result), content_type='application/json')
 
+def getSearchStringList(request):
+	"""The patterns of a multi-pattern search, a JSON searchStringList or the First/SecondSearchString pair"""
+	if "searchStringList" in request.POST:
+		return [searchString.encode("utf-8") for searchString in json.loads(request.POST["searchStringList"])]
+	return [request.POST.get("FirstSearchString", "").encode("utf-8"), request.POST.get("SecondSearchString", "").encode("utf-8")]
+
 @csrf_exempt
 def api_multiIndexSearch(request):
 	result = {'code':1, 'message':'Only Support POST Method'}
 	if request.method=='POST':
-		searchString1 = request.POST.get("FirstSearchString", "").encode("utf-8")
-		searchString2 = request.POST.get("SecondSearchString", "").encode("utf-8")
+		searchStringList = getSearchStringList(request)
 		relation = request.POST.get('relation', 'AND')
-		searchStringList = [searchString1, searchString2]
 		result = plugins.multiIndexSearch(searchStringList, relation)
 		return HttpResponse(json.dumps(result), content_type='application/json')
 	else:
@@ -340,7 +357,10 @@ def api_multiIndexSearchStatus(request):
 		if len(searchStringList)==0 or relation=="":
 			result['message'] = 'Wrong Relation or SearchString Input'
 		else:
-			result = plugins.api_multiIndexSearchStatus(searchStringList, relation)
+			try:
+				result = plugins.api_multiIndexSearchStatus(searchStringList, relation)
+			except ValueError, e:
+				result['message'] = 'Wrong Relation! {}'.format(e)
 		return HttpResponse(json.dumps(result), content_type='application/json')
 	else:
 		return HttpResponse(json.dumps(result), content_type='application/json')
@@ -350,25 +370,89 @@ def api_initFileContent(request):
 	result = {'code':1, 'message':'Only Support POST Method'}
 	if request.method=='POST':
 		_uri = request.POST.get('_uri', '')
-		_matches = json.loads(request.POST.get('_matches', ''))
 		_node_ip = request.POST.get('_node_ip', '')
-		result = plugins.api_initFileContent(_uri, _matches)
+		if request.POST.get('entryId') and request.POST.get('fileId'):
+			result = plugins.api_initFileContent(_uri, None, int(request.POST['entryId']), int(request.POST['fileId']))
+		else:
+			result = plugins.api_initFileContent(_uri, json.loads(request.POST.get('_matches', '')))
 		return HttpResponse(json.dumps(result), content_type='application/json')
 	else:
 		return HttpResponse(json.dumps(result), content_type='application/json')
 
+@csrf_exempt
+def api_getFileMatches(request):
+	"""
+		GET or POST entryId and fileId of a search and a file, with pageNum and itemNum, a cursor or a jump offset
+		_start and _length instead return every match covering those bytes
+	"""
+	params = request.POST if request.method=='POST' else request.GET
+	result = {'code':1, 'message':''}
+	try:
+		entry_id, file_id = int(params.get('entryId', '')), int(params.get('fileId', ''))
+		if params.get('_start', '')!='':
+			result['message'] = {"matches":plugins.getFileMatchRange(entry_id, file_id, int(params['_start']), int(params.get('_length', 0)))}
+		else:
+			offset = int(params['offset']) if params.get('offset', '')!='' else None
+			result['message'] = plugins.getFileMatchPage(entry_id, file_id, int(params.get('pageNum', 1)),
+				int(params.get('itemNum', plugins.FILE_MATCH_PAGE_SIZE)), params.get('cursor') or None, offset)
+		result['code'] = 0
+	except (ValueError, TypeError), e:
+		result['message'] = "{}".format(e)
+	return HttpResponse(json.dumps(result), content_type='application/json')
+
 @csrf_exempt
 def api_getBlockContent(request):
-	result = {'offset':0, 'data':[], 'match_array':[], 'bytemap':[]}
+	result = {'offset':0, 'length':0, 'data':'', 'intervals':[]}
 	if request.method=='POST':
 		_uri = request.POST.get('_uri', '')
 		_start = int(request.POST.get('_start', 0))
 		_length = int(request.POST.get('_length', 0))
-		result = plugins.api_getBlockContent(_uri, _start, _length)
+		_matches = json.loads(request.POST.get('_matches', '[]'))
+		result = plugins.api_getBlockContent(_uri, _start, _length, _matches)
 		return HttpResponse(json.dumps(result), content_type='application/json')
 	else:
 		return HttpResponse(json.dumps(result), content_type='application/json')
 
+@csrf_exempt
+def api_getBlockBytes(request):
+	"""
+		The raw bytes of a block as application/octet-stream, GET or POST _uri, _start and _length or an HTTP Range
+		X-Block-Offset and X-File-Length locate the block, X-Match-Intervals holds the bits _matches cover in it
+		A Range past the end of the file is answered 416; _matches is read up to a page of matches and
+		X-Match-Intervals holds at most FILE_BLOCK_MAX_HEADER_INTERVALS, X-Match-Intervals-Truncated counts them all
+	"""
+	params = request.POST if request.method=='POST' else request.GET
+	_uri = params.get('_uri', '')
+	byte_range = re.match(r"^bytes=(\d+)-(\d*)$", request.META.get('HTTP_RANGE', ''))
+	try:
+		if byte_range:
+			_start = int(byte_range.group(1))
+			_length = int(byte_range.group(2))-_start+1 if byte_range.group(2) else plugins.FILE_BLOCK_MAX_SIZE
+		else:
+			_start = int(params.get('_start', 0))
+			_length = int(params.get('_length', 0))
+		_matches = json.loads(params.get('_matches', '[]'))
+		if not isinstance(_matches, list):
+			raise ValueError("_matches is not a list")
+		fileLength, offset, data = plugins.readFileBlock(_uri, _start, _length)
+	except (IOError, OSError, ValueError), e:
+		return HttpResponse("{}".format(e), status=404 if isinstance(e, EnvironmentError) else 400, content_type='text/plain')
+	if byte_range and not data:
+		response = HttpResponse(status=416)
+		response['Content-Range'] = 'bytes */{}'.format(fileLength)
+		return response
+	response = HttpResponse(data, content_type='application/octet-stream', status=206 if byte_range else 200)
+	if byte_range:
+		response['Content-Range'] = 'bytes {}-{}/{}'.format(offset, offset+len(data)-1, fileLength)
+	response['Accept-Ranges'] = 'bytes'
+	response['X-Block-Offset'] = offset
+	response['X-File-Length'] = fileLength
+	intervals = plugins.getMatchIntervals(_matches[:plugins.FILE_MATCH_MAX_PAGE_SIZE], offset, len(data))
+	if len(intervals)>plugins.FILE_BLOCK_MAX_HEADER_INTERVALS:
+		response['X-Match-Intervals-Truncated'] = len(intervals)
+	response['X-Match-Intervals'] = json.dumps(intervals[:plugins.FILE_BLOCK_MAX_HEADER_INTERVALS])
+	return response
+
 @csrf_exempt
 def api_addNodeInfo(request):
 	result = {'code':1, 'message':'Only Support POST Method'}
@@ -426,10 +510,8 @@ def indexSearch(request):
 def multiIndexSearch(request):
 	result = {'code':1, 'message':'Only Support POST Method'}
 	if request.method=='POST':
-		searchString1 = request.POST.get("FirstSearchString", "").encode("utf-8")
-		searchString2 = request.POST.get("SecondSearchString", "").encode("utf-8")
+		searchStringList = getSearchStringList(request)
 		relation = request.POST.get('relation', 'AND')
-		searchStringList = [searchString1, searchString2]
 		result = plugins.multiIndexSearch(searchStringList, relation)
 		# return HttpResponse(json.dumps(result), content_type='application/json')
 		return render_to_response('multiSearchResult.html',{"searchStringList":searchStringList, "relation":relation})
@@ -443,7 +525,8 @@ def getBlockInfo(request):
 		_uri = request.POST.get('_uri', '')
 		_start = int(request.POST.get('_start', 0))
 		_length = int(request.POST.get('_length', 0))
-		result = plugins.getBlockInfo(_uri, _start, _length)
+		_matches = json.loads(request.POST.get('_matches', '[]'))
+		result = plugins.getBlockInfo(_uri, _start, _length, _matches)
 		# print "------------------------------"
 		# print "Server Result:{}".format(result)
 		# print "------------------------------"
@@ -477,10 +560,20 @@ def fileContentReader(request):
 	result = {'code':1, 'message':'Only Support POST Method'}
 	if request.method=='POST':
 		_uri = request.POST.get('_uri', '')
+		itemNum = plugins.FILE_MATCH_PAGE_SIZE
+		if request.POST.get('entryId') and request.POST.get('fileId'):
+			# The reader pages through the server side match index by /api_getFileMatches/
+			try:
+				page = plugins.getFileMatchPage(int(request.POST['entryId']), int(request.POST['fileId']), 1, itemNum)
+			except ValueError, e:
+				return HttpResponse(json.dumps({'code':1, 'message':"{}".format(e)}), content_type='application/json')
+			_uri = page["fileName"]
+			params = {"fileName":_uri, "matches":"", "pageNum":page["pageNum"], "itemNum":itemNum, "fileLength":plugins.getFileLength(_uri),
+				"entryId":page["entryId"], "fileId":page["fileId"]}
+			return render_to_response('fileContentReader.html', params)
 		_matches = json.loads(request.POST.get('_matches', ''))
 		fileLength = plugins.getFileLength(_uri)
 		theMatches = plugins.getFileMatchesInfo(_uri, _matches)
-		itemNum = 20
 		pageNum = int(math.ceil(len(theMatches)/float(itemNum)))
 		params = {"fileName":_uri, "matches":json.dumps(theMatches, ensure_ascii=False), "pageNum":pageNum, "itemNum":itemNum, "fileLength":fileLength}
 		# print json.dumps(params)